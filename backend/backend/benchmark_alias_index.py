@@ -0,0 +1,71 @@
+"""
+Alias Index Benchmark
+Compares the alias index (services/alias_index.py) with the previous loop of
+medicine detail lookups, which compared the name with every medicine ID and
+alias, on synthetic catalogs of growing size, and how often each finds the
+medicine that was looked up (the loop returns the first medicine with an
+alias containing the name, which need not be that one)
+
+Names are looked up as the scanner does (a matched medicine's name), as a
+name with extra words (the partial-match fallback) and as an unknown name.
+
+Usage:
+    python benchmark_alias_index.py
+    python benchmark_alias_index.py --sizes 10 1000 100000 --names 500
+"""
+
+import argparse
+import random
+import time
+
+from benchmark_name_matching import make_catalog, time_per_text
+from services.alias_index import AliasIndex
+
+
+def linear_details(catalog, medicine_name):
+    """The previous loop: a substring check against every ID and alias"""
+    medicine_lower = medicine_name.lower()
+    for med_id, med_data in catalog.items():
+        if medicine_lower in med_id.lower() or any(
+            medicine_lower in name.lower() for name in med_data.get('common_names', [])
+        ):
+            return med_data
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Alias index vs linear name lookup")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000],
+                        help="Catalog sizes (medicines)")
+    parser.add_argument("--names", type=int, default=200, help="Lookups of each kind per size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'medicines':>10}{'build ms':>10}{'loop us':>10}{'exact us':>10}"
+          f"{'partial us':>12}{'unknown us':>12}{'loop right':>12}{'index right':>13}")
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        catalog = make_catalog(size, rng)
+        records = list(catalog.values())
+        expected = [rng.choice(records) for _ in range(args.names)]
+        names = [record["name"] for record in expected]
+        partial = [f"{rng.choice(records)['name']} 500mg" for _ in range(args.names)]
+        unknown = [f"unknown{index}" for index in range(args.names)]
+
+        started = time.perf_counter()
+        index = AliasIndex(([medicine_id, *data["common_names"]], data) for medicine_id, data in catalog.items())
+        build_ms = (time.perf_counter() - started) * 1000.0
+
+        loop_right = sum(linear_details(catalog, name) is record for name, record in zip(names, expected))
+        index_right = sum(index.lookup(name) is record for name, record in zip(names, expected))
+        loop_us = time_per_text(lambda name: linear_details(catalog, name), names)
+        exact_us = time_per_text(index.lookup, names)
+        partial_us = time_per_text(index.lookup, partial)
+        unknown_us = time_per_text(index.lookup, unknown)
+        print(f"{size:>10}{build_ms:>10.1f}{loop_us:>10.1f}{exact_us:>10.2f}"
+              f"{partial_us:>12.1f}{unknown_us:>12.1f}"
+              f"{loop_right / len(names):>12.2f}{index_right / len(names):>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
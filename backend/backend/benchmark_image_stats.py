@@ -0,0 +1,109 @@
+"""
+Image Statistics Benchmark
+Time and peak temporary memory of the fused statistics pass
+(ml_models/image_stats.py) against the float64 reductions each rule-based
+analyzer used to compute, on preprocessed 224x224 images, and the largest
+difference between the fused statistics and the float64 ones
+
+Usage:
+    python benchmark_image_stats.py
+    python benchmark_image_stats.py --images 50 --repeat 500
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from ml_models.image_stats import image_stats
+from ml_models.preprocessing import IMAGE_SIZE
+
+
+# The reductions of the previous analyzers, one function per analyzer
+def previous_skin(image):
+    red = np.mean(image[:, :, 0])
+    gray = np.mean(image, axis=2)
+    return red, np.std(gray)
+
+
+def previous_eye(image):
+    return np.mean(image[:, :, 1]) - np.mean(image[:, :, 0]), np.mean(image[:, :, 0])
+
+
+def previous_tongue(image):
+    gray = np.mean(image, axis=2)
+    return np.mean(gray), np.mean(image[:, :, 1]), np.mean(image[:, :, 0])
+
+
+def previous_nail(image):
+    color_variance = np.std(image, axis=2)
+    gray = np.mean(image, axis=2)
+    return np.mean(color_variance), np.std(gray)
+
+
+def reference_stats(image):
+    """Every statistic in float64, as the previous analyzers computed them"""
+    gray = np.mean(image, axis=2)
+    return (np.mean(image[:, :, 0]), np.mean(image[:, :, 1]), np.mean(image[:, :, 2]),
+            np.mean(gray), np.std(gray), np.mean(np.std(image, axis=2)))
+
+
+def make_images(count, rng):
+    """Smooth color gradients with noise, roughly like photos of skin or nails"""
+    rows, cols = np.mgrid[0:IMAGE_SIZE, 0:IMAGE_SIZE] / IMAGE_SIZE
+    images = []
+    for _ in range(count):
+        base = rng.uniform(40, 220, 3)
+        slope = rng.uniform(-60, 60, (2, 3))
+        image = base + rows[..., None] * slope[0] + cols[..., None] * slope[1]
+        image += rng.normal(0, rng.uniform(2, 30), image.shape)
+        images.append(np.clip(image, 0, 255).astype(np.uint8))
+    return images
+
+
+def time_us(fn, images, repeat):
+    started = time.perf_counter()
+    for index in range(repeat):
+        fn(images[index % len(images)])
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def peak_kb(fn, image):
+    tracemalloc.start()
+    fn(image)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fused image statistics vs per-analyzer reductions")
+    parser.add_argument("--images", type=int, default=20, help="Synthetic images")
+    parser.add_argument("--repeat", type=int, default=300, help="Calls timed per variant")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    images = make_images(args.images, np.random.default_rng(args.seed))
+    variants = {
+        "skin (before)": previous_skin,
+        "eye (before)": previous_eye,
+        "tongue (before)": previous_tongue,
+        "nail (before)": previous_nail,
+        "fused (all)": image_stats,
+    }
+    print(f"{'reductions':<18}{'time us':>10}{'peak KB':>10}")
+    for name, fn in variants.items():
+        fn(images[0])
+        print(f"{name:<18}{time_us(fn, images, args.repeat):>10.0f}{peak_kb(fn, images[0]):>10.0f}")
+
+    error = max(
+        abs(fused - reference)
+        for image in images
+        for fused, reference in zip(image_stats(image), reference_stats(image))
+    )
+    print(f"\nLargest difference from the float64 statistics: {error:.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Base64 Ingestion Benchmark
+Compares peak Python memory of the old analyze-base64 path (json.loads, split,
+b64decode, BytesIO) with the buffer-based path (preallocated body, base64
+field located in place, chunked decode into one buffer) and with raw
+application/octet-stream bodies
+
+Usage:
+    python benchmark_ingestion.py
+    python benchmark_ingestion.py --image photo.jpg --runs 5
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from ml_models.decoding import CLASSIFIER_DECODE_SIZE, decode_image
+from services.ingestion import decode_base64, find_base64_field, ingest_buffer, read_body
+
+CHUNK_BYTES = 64 * 1024
+
+
+def make_photo(width, height):
+    """Noisy synthetic JPEG roughly the size of a phone photo"""
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(height // 8, width // 8, 3), dtype=np.uint8)
+    image = Image.fromarray(pixels).resize((width, height), Image.Resampling.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def body_chunks(body):
+    """The body split the way the ASGI server delivers it (built outside the measurement)"""
+    return [body[start:start + CHUNK_BYTES] for start in range(0, len(body), CHUNK_BYTES)]
+
+
+async def body_stream(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def old_path(loop, chunks):
+    """What the endpoint did before: joined body -> dict -> split copy -> decoded bytes"""
+    image_data = json.loads(b"".join(chunks))
+    base64_str = image_data.get('image')
+    if ',' in base64_str:
+        base64_str = base64_str.split(',')[1]
+    image_bytes = base64.b64decode(base64_str)
+    return decode_image(io.BytesIO(image_bytes), CLASSIFIER_DECODE_SIZE)
+
+
+def new_json_path(loop, chunks):
+    buffer = loop.run_until_complete(read_body(body_stream(chunks), sum(map(len, chunks))))
+    upload = ingest_buffer(decode_base64(find_base64_field(buffer)), min_size=None)
+    return decode_image(upload.file, CLASSIFIER_DECODE_SIZE)
+
+
+def new_raw_path(loop, chunks):
+    buffer = loop.run_until_complete(read_body(body_stream(chunks), sum(map(len, chunks))))
+    upload = ingest_buffer(buffer, min_size=None)
+    return decode_image(upload.file, CLASSIFIER_DECODE_SIZE)
+
+
+def measure(fn, body, runs):
+    """Peak traced memory (bytes) and median time (ms) of one request"""
+    loop = asyncio.new_event_loop()
+    chunks = body_chunks(body)
+    fn(loop, chunks)  # warm-up (imports, decoder tables)
+    peaks, timings = [], []
+    for _ in range(runs):
+        tracemalloc.start()
+        started = time.perf_counter()
+        fn(loop, chunks)
+        timings.append((time.perf_counter() - started) * 1000.0)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    loop.close()
+    return max(peaks), float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory of base64 vs buffered ingestion")
+    parser.add_argument("--image", help="JPEG to send (default: synthetic 4000x3000 photo)")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    raw = open(args.image, 'rb').read() if args.image else make_photo(4000, 3000)
+    json_body = json.dumps({"image": "data:image/jpeg;base64," + base64.b64encode(raw).decode()}).encode()
+    print(f"Image: {len(raw) / 1e6:.2f} MB, JSON body: {len(json_body) / 1e6:.2f} MB")
+
+    rows = [
+        ("json (old)", old_path, json_body),
+        ("json (buffered)", new_json_path, json_body),
+        ("octet-stream", new_raw_path, raw),
+    ]
+    print(f"\n{'path':<18}{'peak MB':>10}{'x image':>10}{'ms':>10}")
+    for name, fn, body in rows:
+        peak, ms = measure(fn, body, args.runs)
+        print(f"{name:<18}{peak / 1e6:>10.2f}{peak / len(raw):>10.2f}{ms:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+JSON Encoding Benchmark
+Serialization time per endpoint of the response payloads: Starlette's
+``JSONResponse`` (stdlib encoder, as before) against ``FastJSONResponse``
+(services/json_encoding.py) with the stdlib encoder and with orjson, each
+with and without spliced remedy fragments, and checks that every variant
+decodes to the same JSON
+
+Payloads have the shape of real responses, with remedies and recommendations
+from the remedy data file (``REMEDY_DATA_PATH``).
+
+Usage:
+    python benchmark_json_encoding.py
+    python benchmark_json_encoding.py --repeat 20000
+"""
+
+import argparse
+import json
+import random
+import time
+
+from fastapi.responses import JSONResponse
+
+from services import json_encoding
+from services.ayurvedic_remedies import AyurvedicRemedyService
+from services.json_encoding import FragmentCache
+
+CONDITIONS = {
+    "skin": ["acne", "eczema", "dryness", "psoriasis"],
+    "eye": ["redness", "dark circles", "puffiness"],
+    "tongue": ["white coating", "yellow coating"],
+    "nail": ["brittle nails", "discoloration"],
+}
+OCR_TEXT = ("PARACETAMOL TABLETS IP 500 mg Each uncoated tablet contains Paracetamol IP 500 mg "
+            "Dosage: As directed by the physician. Store below 30C. Batch No. PX2231 Mfg 01/2026 Exp 12/2028")
+
+
+def diagnosis_result(remedies, rng, diagnosis_type):
+    conditions = [
+        {"name": name, "severity": rng.choice(["mild", "moderate", "severe"]),
+         "confidence": rng.random(), "description": f"Signs of {name}"}
+        for name in rng.sample(CONDITIONS[diagnosis_type], 2)
+    ]
+    resolved = remedies.diagnosis_remedies(conditions, diagnosis_type)
+    return {
+        "conditions": conditions,
+        "confidence": max(condition["confidence"] for condition in conditions),
+        "analysis_type": diagnosis_type,
+        "method": "ml",
+        "ayurvedic_remedies": resolved.remedies,
+        "recommendations": resolved.recommendations,
+    }
+
+
+def scan_result(remedies, rng):
+    return {
+        "medicine_name": "Paracetamol",
+        "confidence": rng.random(),
+        "category": "Pain Reliever",
+        "uses": "Fever, pain relief",
+        "extracted_text": OCR_TEXT,
+        "method": "ocr",
+        "error": None,
+        "ayurvedic_remedies": remedies.get_medicine_remedies("Paracetamol"),
+    }
+
+
+def batch_result(results):
+    return {
+        "count": len(results),
+        "failed": 0,
+        "results": [
+            {"index": index, "filename": f"photo_{index}.jpg", "status": 200, "cached": False, "result": result}
+            for index, result in enumerate(results)
+        ],
+    }
+
+
+def health_body():
+    return {
+        "status": "healthy",
+        "models": {"medicine_scanner": True, "visual_diagnosis": True},
+        "cache": {"entries": 50, "max_entries": 256, "hits": 10, "misses": 70, "hit_rate": 0.125},
+        "inference": {"skin": {"queue_depth": 0, "batches": 3, "batch_size_counts": {"6": 1, "16": 1}}},
+    }
+
+
+def time_us(fn, payloads, repeat):
+    started = time.perf_counter()
+    for index in range(repeat):
+        fn(payloads[index % len(payloads)])
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Response serialization per endpoint")
+    parser.add_argument("--repeat", type=int, default=5000, help="Responses encoded per variant")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    remedies = AyurvedicRemedyService()
+    endpoints = {
+        "scan": [scan_result(remedies, rng) for _ in range(32)],
+        "analyze": [diagnosis_result(remedies, rng, rng.choice(list(CONDITIONS))) for _ in range(32)],
+        "analyze-batch": [
+            batch_result([diagnosis_result(remedies, rng, rng.choice(list(CONDITIONS))) for _ in range(16)])
+            for _ in range(8)
+        ],
+        "health": [health_body()],
+    }
+
+    stdlib = JSONResponse(content=None)
+    variants = {"JSONResponse": stdlib.render}
+    encoders = {"json": json_encoding._stdlib_dumps}
+    if json_encoding.orjson is not None:
+        encoders["orjson"] = json_encoding._orjson_dumps
+    for name, encoder in encoders.items():
+        variants[name] = encoder
+        variants[f"{name}+fragments"] = FragmentCache(encoder=encoder, splice=True).render
+
+    print(f"{'endpoint':<15}{'bytes':>8}" + "".join(f"{name:>18}" for name in variants) + "  same")
+    for endpoint, payloads in endpoints.items():
+        expected = [json.loads(stdlib.render(payload)) for payload in payloads]
+        same = all(
+            json.loads(render(payload)) == decoded
+            for render in variants.values()
+            for payload, decoded in zip(payloads, expected)
+        )
+        size = sum(len(stdlib.render(payload)) for payload in payloads) // len(payloads)
+        timings = [time_us(render, payloads, args.repeat) for render in variants.values()]
+        print(f"{endpoint:<15}{size:>8}" + "".join(f"{us:>16.1f}us" for us in timings)
+              + f"  {'yes' if same else 'NO'}")
+
+
+if __name__ == '__main__':
+    main()
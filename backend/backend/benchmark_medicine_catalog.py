@@ -0,0 +1,119 @@
+"""
+Medicine Catalog Benchmark
+Startup time, resident memory and lookup latency of the catalog file
+(SqliteCatalog) against holding the same catalog in Python dicts
+(InMemoryCatalog), for synthetic catalogs of growing size
+
+Each measurement runs in a fresh interpreter, so memory figures are not
+mixed up between runs.
+
+Usage:
+    python benchmark_medicine_catalog.py
+    python benchmark_medicine_catalog.py --sizes 1000 100000 300000 --texts 500
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmark_name_matching import make_catalog, make_misread_texts, make_texts
+
+
+def rss_mb():
+    """Resident memory of this process (peak so far where /proc is not available)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def measure(kind, catalog_path, texts_path):
+    """Child process: load one catalog, time lookups, print the results as JSON"""
+    from services.medicine_catalog import InMemoryCatalog, SqliteCatalog
+
+    with open(texts_path) as f:
+        texts = json.load(f)
+    baseline = rss_mb()
+    started = time.perf_counter()
+    if kind == "sqlite":
+        catalog = SqliteCatalog(catalog_path)
+    else:
+        with open(catalog_path) as f:
+            catalog = InMemoryCatalog(json.load(f))
+    startup_ms = (time.perf_counter() - started) * 1000.0
+    loaded = rss_mb()
+
+    def median_us(fn, inputs):
+        timings = []
+        for value in inputs:
+            started = time.perf_counter()
+            fn(value)
+            timings.append((time.perf_counter() - started) * 1e6)
+        return statistics.median(timings)
+
+    result = {
+        "startup_ms": startup_ms,
+        "startup_mb": loaded - baseline,
+        "exact_us": median_us(lambda text: catalog.exact_matches(text.lower()), texts["exact"]),
+        "fuzzy_us": median_us(catalog.fuzzy_matches, texts["fuzzy"]),
+        "details_us": median_us(catalog.details, texts["names"]),
+    }
+    result["total_mb"] = rss_mb() - baseline
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite catalog vs in-memory catalog")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Medicines")
+    parser.add_argument("--texts", type=int, default=200, help="Lookups of each kind per size")
+    parser.add_argument("--measure", nargs=3, metavar=("KIND", "CATALOG", "TEXTS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        measure(*args.measure)
+        return
+
+    from build_medicine_catalog import build_catalog
+
+    print(f"{'medicines':>10} {'store':<7}{'build s':>8}{'startup ms':>12}{'startup MB':>12}"
+          f"{'total MB':>10}{'exact us':>10}{'fuzzy us':>10}{'details us':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            rng = random.Random(0)
+            catalog = make_catalog(size, rng)
+            texts = {
+                "exact": make_texts(catalog, args.texts, rng),
+                "fuzzy": [text for text, _ in make_misread_texts(catalog, args.texts, rng)],
+                "names": [rng.choice(list(catalog.values()))["name"] for _ in range(args.texts)],
+            }
+            json_path = os.path.join(directory, f"catalog_{size}.json")
+            sqlite_path = os.path.join(directory, f"catalog_{size}.sqlite")
+            texts_path = os.path.join(directory, f"texts_{size}.json")
+            with open(json_path, "w") as f:
+                json.dump({key: dict(record, category="Unknown", uses="Unknown") for key, record in catalog.items()}, f)
+            with open(texts_path, "w") as f:
+                json.dump(texts, f)
+            started = time.perf_counter()
+            build_catalog(({**record, "id": key} for key, record in catalog.items()), sqlite_path)
+            build_s = time.perf_counter() - started
+
+            for kind, path in (("memory", json_path), ("sqlite", sqlite_path)):
+                output = subprocess.run(
+                    [sys.executable, __file__, "--measure", kind, path, texts_path],
+                    capture_output=True, text=True, check=True,
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"{size:>10} {kind:<7}{build_s if kind == 'sqlite' else 0.0:>8.1f}"
+                      f"{result['startup_ms']:>12.1f}{result['startup_mb']:>12.1f}{result['total_mb']:>10.1f}"
+                      f"{result['exact_us']:>10.1f}{result['fuzzy_us']:>10.1f}{result['details_us']:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Medicine Name Matching Benchmark
+Compares the alias automaton (ml_models/alias_matcher.py) with the previous
+per-alias substring loop of ``_match_medicine`` on synthetic catalogs of
+growing size, and checks that both find the same aliases. Then times the
+fuzzy index (ml_models/fuzzy_names.py) on texts whose alias has
+OCR-style misreadings, and how often it ranks the right alias first
+
+Usage:
+    python benchmark_name_matching.py
+    python benchmark_name_matching.py --sizes 10 1000 100000 --texts 500
+"""
+
+import argparse
+import random
+import statistics
+import time
+import tracemalloc
+
+from ml_models.alias_matcher import AliasMatcher
+from ml_models.fuzzy_names import FuzzyNameIndex
+
+SYLLABLES = ["pa", "ra", "ce", "ta", "mol", "ibu", "pro", "fen", "amo", "xi", "cil", "lin",
+             "met", "for", "min", "az", "ith", "ro", "my", "cin", "lo", "sar", "tan", "dol"]
+FILLER = ["tablets", "500", "mg", "ip", "each", "film", "coated", "tablet", "contains",
+          "store", "below", "30c", "batch", "no", "mfg", "exp", "dosage", "as", "directed"]
+ALIASES_PER_MEDICINE = 3
+# Typical Tesseract misreadings
+MISREADINGS = {"o": "0", "l": "1", "i": "l", "s": "5", "m": "rn", "e": "c", "b": "8"}
+
+
+def make_catalog(size, rng):
+    """Synthetic catalog in the shape of ``_load_medicine_database``"""
+    catalog = {}
+    while len(catalog) < size:
+        names = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(3, 5)))
+                 for _ in range(ALIASES_PER_MEDICINE)]
+        catalog[names[0]] = {"name": names[0].title(), "common_names": names}
+    return catalog
+
+
+def make_texts(catalog, count, rng):
+    """OCR-like texts: filler words with a catalog alias in most of them"""
+    aliases = [name for data in catalog.values() for name in data["common_names"]]
+    texts = []
+    for index in range(count):
+        words = [rng.choice(FILLER) for _ in range(rng.randint(10, 30))]
+        if index % 4:
+            words.insert(rng.randrange(len(words)), rng.choice(aliases).upper())
+        texts.append(" ".join(words))
+    return texts
+
+
+def misread(alias, rng):
+    """One or two OCR-style character errors"""
+    chars = list(alias)
+    positions = [index for index, char in enumerate(chars) if char in MISREADINGS]
+    for index in rng.sample(positions, min(len(positions), rng.randint(1, 2))):
+        chars[index] = MISREADINGS[chars[index]]
+    return "".join(chars)
+
+
+def make_misread_texts(catalog, count, rng):
+    """(text, alias) pairs: filler words around one misread alias"""
+    aliases = [name for data in catalog.values() for name in data["common_names"]]
+    texts = []
+    for _ in range(count):
+        alias = rng.choice(aliases)
+        words = [rng.choice(FILLER) for _ in range(rng.randint(10, 30))]
+        words.insert(rng.randrange(len(words)), misread(alias, rng).title())
+        texts.append((" ".join(words), alias))
+    return texts
+
+
+def linear_matches(catalog, text):
+    """The previous loop: one substring search per alias"""
+    text_lower = text.lower()
+    return [
+        (name.lower(), medicine_id)
+        for medicine_id, data in catalog.items()
+        for name in data["common_names"]
+        if name.lower() in text_lower
+    ]
+
+
+def time_per_text(fn, texts):
+    timings = []
+    for text in texts:
+        started = time.perf_counter()
+        fn(text)
+        timings.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Alias automaton vs substring loop")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000],
+                        help="Catalog sizes (medicines, %d aliases each)" % ALIASES_PER_MEDICINE)
+    parser.add_argument("--texts", type=int, default=200, help="OCR texts matched per size")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'medicines':>10}{'aliases':>9}{'build ms':>10}{'memory MB':>11}"
+          f"{'loop us':>11}{'automaton us':>14}{'speed-up':>10}  same")
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        catalog = make_catalog(size, rng)
+        texts = make_texts(catalog, args.texts, rng)
+        pairs = [(name, medicine_id) for medicine_id, data in catalog.items() for name in data["common_names"]]
+
+        started = time.perf_counter()
+        matcher = AliasMatcher(pairs)
+        build_ms = (time.perf_counter() - started) * 1000.0
+        # Built again for the memory figure (tracing slows the build down)
+        tracemalloc.start()
+        traced = AliasMatcher(pairs)
+        memory_mb = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+        del traced
+
+        same = all(matcher.matches(text) == linear_matches(catalog, text) for text in texts)
+        loop_us = time_per_text(lambda text: linear_matches(catalog, text), texts)
+        automaton_us = time_per_text(matcher.matches, texts)
+        print(f"{size:>10}{len(pairs):>9}{build_ms:>10.1f}{memory_mb:>11.1f}"
+              f"{loop_us:>11.1f}{automaton_us:>14.1f}{loop_us / automaton_us:>9.1f}x  {'yes' if same else 'NO'}")
+
+    print(f"\nFuzzy index (one misread alias per text)")
+    print(f"{'medicines':>10}{'build ms':>10}{'memory MB':>11}{'search us':>11}{'top-1':>8}{'found':>8}")
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        catalog = make_catalog(size, rng)
+        texts = make_misread_texts(catalog, args.texts, rng)
+        pairs = [(name, medicine_id) for medicine_id, data in catalog.items() for name in data["common_names"]]
+
+        started = time.perf_counter()
+        index = FuzzyNameIndex(pairs)
+        build_ms = (time.perf_counter() - started) * 1000.0
+        tracemalloc.start()
+        traced = FuzzyNameIndex(pairs)
+        memory_mb = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+        del traced
+        search_us = time_per_text(index.search, [text for text, _ in texts])
+        results = [index.search(text) for text, _ in texts]
+        top1 = sum(1 for found, (_, alias) in zip(results, texts) if found and found[0][0] == alias)
+        anywhere = sum(1 for found, (_, alias) in zip(results, texts) if alias in (name for name, _, _ in found))
+        print(f"{size:>10}{build_ms:>10.1f}{memory_mb:>11.1f}{search_us:>11.1f}{top1 / len(texts):>8.2f}{anywhere / len(texts):>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
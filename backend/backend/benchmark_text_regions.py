@@ -0,0 +1,112 @@
+"""
+Text Region OCR Benchmark
+Compares OCR of the whole package photo with OCR of the detected text regions
+(OCR_TEXT_REGIONS=1): time per image, and text quality as the share of the
+full-image words also found in the region text and whether both texts match
+the same medicine
+
+Usage:
+    python benchmark_text_regions.py
+    python benchmark_text_regions.py --images data/medicines --runs 3 --workers 4
+
+Needs Tesseract (or tesserocr); uses the persistent OCR workers.
+"""
+
+import argparse
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from ml_models.medicine_scanner import MedicineScannerModel
+from ml_models.ocr_pool import OCR_WORKERS, OcrWorkerPool
+from ml_models.text_regions import crop_text_regions
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def words(text):
+    return set(re.findall(r'[a-z0-9]{3,}', text.lower()))
+
+
+def ocr_full(pool, image):
+    text, error = pool.recognize(image)
+    return text, error, 1, 1.0
+
+
+def ocr_regions(pool, executor, image):
+    crops, coverage = crop_text_regions(image)
+    results = list(executor.map(pool.recognize, crops))
+    text = " ".join(part for part, _ in results if part)
+    error = next((error for _, error in results if error), None)
+    return text, error, len(crops), coverage
+
+
+def timed(fn, runs):
+    """Result of the last run and the median time (ms)"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return result, float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-image vs text-region OCR")
+    parser.add_argument("--images", default="data/medicines", help="Folder of package photos")
+    parser.add_argument("--runs", type=int, default=1, help="Timed runs per image and path")
+    parser.add_argument("--workers", type=int, default=OCR_WORKERS, help="OCR worker processes")
+    args = parser.parse_args()
+
+    paths = [p for p in sorted(Path(args.images).rglob('*')) if p.suffix.lower() in IMAGE_EXTENSIONS]
+    if not paths:
+        print(f"No images found in {args.images}")
+        return
+
+    pool = OcrWorkerPool(workers=args.workers)
+    pool.start()
+    print(f"OCR engine: {pool.stats()['engine']}, {args.workers} worker(s), {len(paths)} image(s)")
+    # Only the medicine name matching is used (no model inference)
+    scanner = MedicineScannerModel()
+
+    rows = []
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        for path in paths:
+            image = Image.open(path).convert('RGB')
+            (full_text, full_error, _, _), full_ms = timed(lambda: ocr_full(pool, image), args.runs)
+            (region_text, region_error, regions, coverage), region_ms = timed(
+                lambda: ocr_regions(pool, executor, image), args.runs
+            )
+            full_words = words(full_text)
+            recall = len(full_words & words(region_text)) / len(full_words) if full_words else float('nan')
+            full_match = scanner._match_medicine(full_text)['name']
+            region_match = scanner._match_medicine(region_text)['name']
+            rows.append((path.name, regions, coverage, full_ms, region_ms, recall, full_match, region_match))
+            for error in {full_error, region_error} - {None}:
+                print(f"  {path.name}: OCR error: {error}")
+
+    pool.shutdown()
+
+    print(f"\n{'image':<34}{'crops':>6}{'cover':>7}{'full ms':>9}{'region ms':>11}{'recall':>8}  match (full / regions)")
+    for name, regions, coverage, full_ms, region_ms, recall, full_match, region_match in rows:
+        print(
+            f"{name[:33]:<34}{regions:>6}{coverage:>7.2f}{full_ms:>9.0f}{region_ms:>11.0f}"
+            f"{recall:>8.2f}  {full_match} / {region_match}"
+        )
+
+    full_times = [row[3] for row in rows]
+    region_times = [row[4] for row in rows]
+    recalls = [row[5] for row in rows if not np.isnan(row[5])]
+    agree = sum(1 for row in rows if row[6] == row[7])
+    print(f"\nMedian OCR time: full {np.median(full_times):.0f} ms, regions {np.median(region_times):.0f} ms")
+    print(f"Mean word recall vs full image: {np.mean(recalls):.2f}" if recalls else "No words found on the full images")
+    print(f"Same medicine match: {agree}/{len(rows)}")
+    print(f"Images OCR'd as a whole (regions covered most of the image): {sum(1 for row in rows if row[1] == 1 and row[2] == 1.0)}/{len(rows)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+Medicine Catalog Build Script
+Writes the SQLite catalog file the medicine scanner loads from
+MEDICINE_CATALOG_PATH: medicines, an index of their aliases, and the
+symmetric-delete keys used to match misread names
+
+Sources, merged in order (a later record replaces an earlier one with the same ID):
+- the built-in medicines (unless --no-builtin)
+- JSON files (a list of records) or JSON Lines files (one record per line),
+  with either the backend's keys (id, name, category, uses, common_names) or
+  the frontend's (id, englishName, category, commonUses, aliases)
+- the frontend catalog, src/data/medicineDatabase.ts
+
+Usage:
+    python build_medicine_catalog.py ../../src/data/medicineDatabase.ts
+    python build_medicine_catalog.py products.jsonl --output data/medicine_catalog.sqlite
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+
+from ml_models.fuzzy_names import MIN_NAME_LENGTH, deletion_variants, normalize
+from services.medicine_catalog import BUILTIN_MEDICINES, MEDICINE_CATALOG_PATH, alias_key
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE medicines (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    category TEXT NOT NULL,
+    uses TEXT NOT NULL
+);
+CREATE TABLE aliases (
+    id INTEGER PRIMARY KEY,
+    alias TEXT NOT NULL,
+    normalized TEXT NOT NULL,
+    medicine_id INTEGER NOT NULL
+);
+CREATE TABLE alias_variants (
+    variant TEXT NOT NULL,
+    alias_id INTEGER NOT NULL,
+    PRIMARY KEY (variant, alias_id)
+) WITHOUT ROWID;
+"""
+
+# Created after the bulk insert (faster than maintaining them row by row)
+INDEXES = """
+CREATE INDEX medicines_key ON medicines (key);
+CREATE INDEX medicines_name_key ON medicines (name_key);
+CREATE INDEX aliases_alias ON aliases (alias);
+CREATE INDEX aliases_medicine ON aliases (medicine_id);
+"""
+
+
+def record_from_source(record: Dict) -> Dict:
+    """Backend-shaped record from either key style"""
+    return {
+        "id": str(record["id"]),
+        "name": record.get("name") or record.get("englishName") or str(record["id"]),
+        "category": record.get("category", "Unknown"),
+        "uses": record.get("uses") or record.get("commonUses") or "Unknown",
+        "common_names": list(record.get("common_names") or record.get("aliases") or []),
+    }
+
+
+def js_literal_to_json(source: str) -> str:
+    """
+    Convert a JavaScript object/array literal (single-quoted strings, bare
+    keys, comments, trailing commas) to JSON
+    """
+    out: List[str] = []
+    index = 0
+    while index < len(source):
+        char = source[index]
+        if char in "'\"`":
+            end = index + 1
+            chars = []
+            while source[end] != char:
+                if source[end] == "\\":
+                    end += 1
+                chars.append(source[end])
+                end += 1
+            out.append(json.dumps("".join(chars), ensure_ascii=False))
+            index = end + 1
+        elif source.startswith("//", index):
+            index = source.find("\n", index)
+            index = len(source) if index == -1 else index
+        elif source.startswith("/*", index):
+            index = source.index("*/", index) + 2
+        elif char.isalpha() or char == "_":
+            end = index
+            while end < len(source) and (source[end].isalnum() or source[end] == "_"):
+                end += 1
+            word = source[index:end]
+            rest = source[end:].lstrip()
+            out.append(json.dumps(word) if rest.startswith(":") else word)
+            index = end
+        elif char == ",":
+            # Drop trailing commas
+            rest = source[index + 1:].lstrip()
+            while rest.startswith("//"):
+                rest = rest[rest.find("\n") + 1:].lstrip() if "\n" in rest else ""
+            if not rest.startswith(("]", "}")):
+                out.append(char)
+            index += 1
+        else:
+            out.append(char)
+            index += 1
+    return "".join(out)
+
+
+def read_typescript_catalog(path: Path) -> List[Dict]:
+    """The ``medicineDatabase`` array of the frontend catalog"""
+    source = path.read_text(encoding="utf-8")
+    start = re.search(r"medicineDatabase\s*(:[^=]*)?=\s*\[", source).end() - 1
+    end = source.index("\n];", start) + 2
+    return json.loads(js_literal_to_json(source[start:end]))
+
+
+def read_source(path: Path) -> Iterator[Dict]:
+    if path.suffix == ".ts":
+        yield from read_typescript_catalog(path)
+    elif path.suffix == ".jsonl":
+        with open(path, encoding="utf-8") as lines:
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, encoding="utf-8") as f:
+            yield from json.load(f)
+
+
+def build_catalog(records: Iterable[Dict], output: str) -> Dict:
+    """Write the catalog file (replacing it atomically); returns counts"""
+    merged: Dict[str, Dict] = {}
+    for record in records:
+        record = record_from_source(record)
+        merged[record["id"]] = record
+
+    temporary = f"{output}.tmp"
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    connection = sqlite3.connect(temporary)
+    connection.executescript(SCHEMA)
+    max_alias_words = 1
+    alias_count = 0
+    with connection:
+        for medicine_id, record in enumerate(merged.values(), 1):
+            connection.execute(
+                "INSERT INTO medicines (id, key, name, name_key, category, uses) VALUES (?, ?, ?, ?, ?, ?)",
+                (medicine_id, alias_key(record["id"]), record["name"], alias_key(record["name"]),
+                 record["category"], record["uses"]),
+            )
+            for alias in dict.fromkeys(alias_key(name) for name in record["common_names"]):
+                if not alias:
+                    continue
+                alias_count += 1
+                normalized = normalize(alias)
+                connection.execute(
+                    "INSERT INTO aliases (id, alias, normalized, medicine_id) VALUES (?, ?, ?, ?)",
+                    (alias_count, alias, normalized, medicine_id),
+                )
+                if len(normalized) >= MIN_NAME_LENGTH:
+                    connection.executemany(
+                        "INSERT OR IGNORE INTO alias_variants (variant, alias_id) VALUES (?, ?)",
+                        ((variant, alias_count) for variant in deletion_variants(normalized)),
+                    )
+                max_alias_words = max(max_alias_words, len(alias.split()))
+        connection.executescript(INDEXES)
+        connection.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?)",
+            [("medicines", str(len(merged))), ("aliases", str(alias_count)),
+             ("max_alias_words", str(max_alias_words))],
+        )
+    connection.execute("VACUUM")
+    connection.close()
+    os.replace(temporary, output)
+    return {"medicines": len(merged), "aliases": alias_count, "max_alias_words": max_alias_words}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the SQLite medicine catalog")
+    parser.add_argument("sources", nargs="*", help="JSON, JSON Lines or medicineDatabase.ts files")
+    parser.add_argument("--output", default=MEDICINE_CATALOG_PATH, help="Catalog file to write")
+    parser.add_argument("--no-builtin", action="store_true", help="Leave out the built-in medicines")
+    args = parser.parse_args()
+
+    def records():
+        if not args.no_builtin:
+            for medicine_id, record in BUILTIN_MEDICINES.items():
+                yield dict(record, id=medicine_id)
+        for source in args.sources:
+            yield from read_source(Path(source))
+
+    started = time.perf_counter()
+    counts = build_catalog(records(), args.output)
+    size_mb = os.path.getsize(args.output) / 1e6
+    print(f"✓ Wrote {args.output}: {counts['medicines']} medicines, {counts['aliases']} aliases "
+          f"({size_mb:.1f} MB, {time.perf_counter() - started:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+"""
+Model Export Script
+Exports trained classifiers (models/*_model_best.pth) to TorchScript, int8
+statically quantized TorchScript (post-training, calibrated on the validation
+folder) and ONNX, then reports accuracy vs latency of every variant on it
+
+Usage:
+    python export_models.py
+    python export_models.py --model skin --validation-dir data/skin_images --tolerance 0.01
+
+Pick the fastest variant within tolerance and set INFERENCE_BACKEND accordingly.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+try:
+    import torch
+    _ = torch.device('cpu')
+except (ImportError, OSError, RuntimeError) as e:
+    print(f"ERROR: PyTorch is not available ({type(e).__name__}: {e})")
+    print("Install PyTorch first (see install_pytorch_cpu.sh / install_pytorch_cpu.bat).")
+    sys.exit(1)
+
+from ml_models.backends import BACKENDS, OnnxClassifier, load_resnet18_classifier, variant_path
+from ml_models.preprocessing import IMAGE_SIZE, TensorNormalizer, prepare_image
+
+MODELS = {
+    "skin": ("models/skin_model_best.pth", "models/skin_labels.json", "data/skin_images"),
+    "medicine": ("models/medicine_model_best.pth", "models/medicine_labels.json", "data/medicines"),
+}
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+CALIBRATION_IMAGES = 64
+
+
+def quantize_static(model, example, calibration_images):
+    """
+    Post-training static int8 quantization (FX graph mode).
+    Conv/BatchNorm/ReLU are fused and activations are calibrated on real
+    images, so the whole network runs in int8, not only the final Linear.
+    """
+    import copy
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    engine = "x86" if "x86" in torch.backends.quantized.supported_engines else "qnnpack"
+    torch.backends.quantized.engine = engine
+    prepared = prepare_fx(copy.deepcopy(model).eval(), get_default_qconfig_mapping(engine), (example,))
+    normalizer = TensorNormalizer(8)
+    with torch.no_grad():
+        for start in range(0, len(calibration_images), 8):
+            prepared(normalizer.normalize_batch(calibration_images[start:start + 8]))
+    return convert_fx(prepared)
+
+
+def export_variants(model, model_path, calibration_images):
+    """Write every exported variant next to the checkpoint; returns {backend: path or error}"""
+    example = torch.zeros(1, 3, IMAGE_SIZE, IMAGE_SIZE)
+    exported = {}
+
+    # TorchScript (traced)
+    path = variant_path(model_path, "torchscript")
+    try:
+        with torch.no_grad():
+            traced = torch.jit.freeze(torch.jit.trace(model, example))
+        traced.save(path)
+        exported["torchscript"] = path
+        print(f"✓ TorchScript: {path}")
+    except Exception as e:
+        exported["torchscript"] = f"failed: {e}"
+        print(f"✗ TorchScript export failed: {e}")
+
+    # int8 static quantization (fused conv/bn/relu, calibrated), saved as TorchScript
+    path = variant_path(model_path, "int8")
+    try:
+        if not calibration_images:
+            raise ValueError("no validation images to calibrate on")
+        quantized = quantize_static(model, example, calibration_images)
+        with torch.no_grad():
+            traced = torch.jit.freeze(torch.jit.trace(quantized, example))
+        traced.save(path)
+        exported["int8"] = path
+        print(f"✓ int8 (static, {len(calibration_images)} calibration images): {path}")
+    except Exception as e:
+        exported["int8"] = f"failed: {e}"
+        print(f"✗ int8 export failed: {e}")
+
+    # ONNX with a dynamic batch dimension
+    path = variant_path(model_path, "onnx")
+    try:
+        torch.onnx.export(
+            model, example, path,
+            input_names=["input"], output_names=["logits"],
+            dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+            opset_version=17,
+            dynamo=False,
+        )
+        exported["onnx"] = path
+        print(f"✓ ONNX: {path}")
+    except Exception as e:
+        exported["onnx"] = f"failed: {e}"
+        print(f"✗ ONNX export failed: {e}")
+
+    return exported
+
+
+def load_validation_set(validation_dir, label_mapping):
+    """
+    Load validation images prepared exactly as in serving.
+    Images inside a folder named after a class are labelled with it; loose
+    images are unlabelled (only agreement with eager is measured for them).
+    """
+    class_to_index = {name: int(index) for index, name in label_mapping.items()}
+    images, labels = [], []
+
+    for path in sorted(Path(validation_dir).rglob('*')):
+        if path.suffix.lower() not in IMAGE_EXTENSIONS:
+            continue
+        try:
+            image = Image.open(path)
+            image.draft('RGB', (IMAGE_SIZE, IMAGE_SIZE))
+            images.append(np.array(prepare_image(image)))
+        except Exception as e:
+            print(f"Skipping {path}: {e}")
+            continue
+        labels.append(class_to_index.get(path.parent.name, -1))
+
+    return images, np.array(labels)
+
+
+def predict(model, images, batch_size):
+    """Softmax probabilities for every image, computed in batches"""
+    normalizer = TensorNormalizer(batch_size)
+    outputs = []
+    with torch.no_grad():
+        for start in range(0, len(images), batch_size):
+            batch = normalizer.normalize_batch(images[start:start + batch_size])
+            outputs.append(torch.nn.functional.softmax(model(batch), dim=1).numpy().copy())
+    return np.concatenate(outputs) if outputs else np.zeros((0, 0))
+
+
+def measure_latency(model, batch_size, runs):
+    """Median and p95 latency (ms) of one forward pass at the given batch size"""
+    batch = torch.randn(batch_size, 3, IMAGE_SIZE, IMAGE_SIZE)
+    timings = []
+    with torch.no_grad():
+        for _ in range(3):
+            model(batch)
+        for _ in range(runs):
+            started = time.perf_counter()
+            model(batch)
+            timings.append((time.perf_counter() - started) * 1000.0)
+    return float(np.median(timings)), float(np.percentile(timings, 95))
+
+
+def load_variant(backend, model_path, eager_model):
+    if backend == "eager":
+        return eager_model
+    path = variant_path(model_path, backend)
+    if not os.path.exists(path):
+        return None
+    if backend == "onnx":
+        return OnnxClassifier(path)
+    model = torch.jit.load(path, map_location="cpu")
+    model.eval()
+    return model
+
+
+def report_model(name, model_path, labels_path, validation_dir, args):
+    print("\n" + "=" * 60)
+    print(f"{name}: {model_path}")
+    print("=" * 60)
+
+    if not os.path.exists(model_path):
+        print(f"Checkpoint not found. Run train_{name}_model.py first.")
+        return None
+
+    eager_model, label_mapping, num_classes = load_resnet18_classifier(model_path, labels_path, "cpu")
+
+    images, labels = load_validation_set(validation_dir, label_mapping)
+    labelled = labels >= 0
+    print(f"Validation images: {len(images)} ({int(labelled.sum())} labelled) from {validation_dir}")
+
+    exported = export_variants(eager_model, model_path, images[:CALIBRATION_IMAGES])
+
+    reference = predict(eager_model, images, args.batch_size) if images else None
+    results = {}
+
+    for backend in BACKENDS:
+        model = load_variant(backend, model_path, eager_model)
+        if model is None:
+            continue
+
+        entry = {}
+        for batch_size in sorted({1, args.batch_size}):
+            p50, p95 = measure_latency(model, batch_size, args.runs)
+            entry[f"latency_ms_b{batch_size}_p50"] = p50
+            entry[f"latency_ms_b{batch_size}_p95"] = p95
+
+        if reference is not None:
+            probabilities = predict(model, images, args.batch_size)
+            predictions = probabilities.argmax(axis=1)
+            entry["agreement_with_eager"] = float((predictions == reference.argmax(axis=1)).mean())
+            entry["max_probability_diff"] = float(np.abs(probabilities - reference).max())
+            if labelled.any():
+                entry["accuracy"] = float((predictions[labelled] == labels[labelled]).mean())
+
+        results[backend] = entry
+
+    # Fastest variant whose accuracy (or, without labels, agreement with eager) stays within tolerance
+    metric = "accuracy" if "accuracy" in results["eager"] else "agreement_with_eager"
+    baseline = results["eager"].get(metric, 1.0)
+    latency_key = f"latency_ms_b{args.batch_size}_p50"
+    candidates = [
+        (entry[latency_key], backend)
+        for backend, entry in results.items()
+        if baseline - entry.get(metric, baseline) <= args.tolerance
+    ]
+    recommended = min(candidates)[1] if candidates else "eager"
+
+    print(f"\n{'backend':<12}{'b1 p50 ms':>11}{f'b{args.batch_size} p50 ms':>11}{'agree':>8}{'acc':>8}")
+    for backend, entry in results.items():
+        print(
+            f"{backend:<12}{entry['latency_ms_b1_p50']:>11.1f}{entry[latency_key]:>11.1f}"
+            f"{entry.get('agreement_with_eager', float('nan')):>8.3f}"
+            f"{entry.get('accuracy', float('nan')):>8.3f}"
+        )
+    print(f"\nRecommended ({metric}, tolerance {args.tolerance}): INFERENCE_BACKEND={recommended}")
+
+    return {
+        "checkpoint": model_path,
+        "num_classes": num_classes,
+        "validation_dir": validation_dir,
+        "validation_images": len(images),
+        "exported": exported,
+        "results": results,
+        "recommended_backend": recommended,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export classifiers and compare inference backends")
+    parser.add_argument("--model", choices=["skin", "medicine", "all"], default="all")
+    parser.add_argument("--validation-dir", help="Override the validation folder (default: the training data folder)")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="Maximum accuracy drop allowed vs eager")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--runs", type=int, default=20, help="Timed forward passes per measurement")
+    parser.add_argument("--report", default="models/export_report.json")
+    args = parser.parse_args()
+
+    torch.set_grad_enabled(False)
+    names = list(MODELS) if args.model == "all" else [args.model]
+    report = {}
+    for name in names:
+        model_path, labels_path, default_validation_dir = MODELS[name]
+        result = report_model(name, model_path, labels_path, args.validation_dir or default_validation_dir, args)
+        if result:
+            report[name] = result
+
+    if report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport saved to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,13 +3,16 @@ FastAPI Backend Server for Aura Vitality Guide
 Handles ML-based medicine scanning and visual diagnosis
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, Form, Header, Request, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import PlainTextResponse
 import uvicorn
-from typing import Optional
-import base64
+from typing import List, Optional, Tuple
+from contextlib import asynccontextmanager
+import asyncio
+import hmac
 import io
+import os
 from PIL import Image
 import numpy as np
 
@@ -26,9 +29,104 @@ except Exception as e:
     print(f"Warning: Could not import VisualDiagnosisModel: {e}")
     VisualDiagnosisModel = None
 
+from ml_models.decoding import CLASSIFIER_DECODE_SIZE, OCR_DECODE_SIZE, decode_image
+from ml_models.ocr_pool import get_ocr_pool
+from ml_models.registry import ModelRegistry
 from services.ayurvedic_remedies import AyurvedicRemedyService
+from services.execution import get_execution_layer
+from services.ingestion import (
+    BodySizeLimitMiddleware,
+    IngestedUpload,
+    UploadRejected,
+    decode_base64,
+    find_base64_field,
+    ingest_buffer,
+    ingest_file,
+    read_body,
+    request_body_limit,
+)
+from services.json_encoding import FastJSONResponse, fragment_cache
+from services.metrics import CACHE_LOOKUPS, observe_request, render as render_metrics, stage, start_request
+from services.result_cache import ResultCache
+from services.structured_log import (
+    REQUEST_ID_HEADER,
+    RequestIdMiddleware,
+    configure_logging,
+    get_logger,
+    logging_stats,
+    shutdown_logging,
+)
+
+configure_logging()
+logger = get_logger(__name__)
+
+# Maximum number of files accepted by one batch request
+BATCH_MAX_FILES = int(os.environ.get("BATCH_MAX_FILES", "16"))
+VALID_DIAGNOSIS_TYPES = ["skin", "eye", "tongue", "nail"]
+# Token for the /api/v1/admin endpoints (sent as X-Admin-Token); unset disables them
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
 
-app = FastAPI(title="Aura Vitality Guide Backend", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load and warm up models in the background; /health reports not-ready until done"""
+    configure_logging()
+    loop = asyncio.get_running_loop()
+    # Kept on app.state so the future outlives this frame; failures are logged by the callback
+    app.state.model_loading = loop.run_in_executor(None, _load_models)
+    app.state.model_loading.add_done_callback(_models_loaded)
+    remedy_service.start_watching()
+    yield
+    remedy_service.stop_watching()
+    execution.shutdown(wait=False)
+    get_ocr_pool().shutdown()
+    shutdown_logging()
+
+
+def _load_models():
+    """Load the models, then start the persistent OCR workers so the first scan doesn't wait for them"""
+    model_registry.load_all()
+    medicine_scanner = model_registry.get("medicine_scanner")
+    if medicine_scanner and medicine_scanner.ocr_available and execution.ocr_kind == "thread":
+        ocr_pool = get_ocr_pool()
+        if not ocr_pool.keeps_engine_loaded():
+            logger.warning("OCR workers skipped: tesserocr is not installed (or OCR_ENGINE=pytesseract), "
+                           "so OCR threads call pytesseract directly; install tesserocr to keep the engine loaded")
+            return
+        try:
+            ocr_pool.start()
+        except RuntimeError as e:
+            logger.warning("OCR workers not started: %s", e)
+            return
+        if not ocr_pool.keeps_engine_loaded():
+            # tesserocr imported but could not load its engine, so the workers fell back to pytesseract
+            ocr_pool.shutdown()
+            logger.warning("OCR workers stopped: tesserocr could not load the Tesseract engine; "
+                           "OCR threads call pytesseract directly")
+
+
+def _models_loaded(future: "asyncio.Future"):
+    """Log a failed model load and mark the registry failed (/health reports it instead of starting)"""
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is not None:
+        logger.error("Model loading failed", exc_info=error)
+        model_registry.mark_failed(f"{type(error).__name__}: {error}")
+
+
+app = FastAPI(title="Aura Vitality Guide Backend", version="1.0.0", lifespan=lifespan)
+
+# Refuse oversized request bodies while they stream in (added before CORS so
+# that the 413 response still carries CORS headers)
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_bytes=request_body_limit(),
+    path_limits={
+        "/api/v1/medicine/scan-batch": request_body_limit(BATCH_MAX_FILES),
+        "/api/v1/diagnosis/analyze-batch": request_body_limit(BATCH_MAX_FILES),
+    },
+)
 
 # CORS Configuration - Allow frontend to connect
 app.add_middleware(
@@ -39,32 +137,274 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[REQUEST_ID_HEADER],
 )
 
-# Initialize ML Models (with error handling)
+# Correlation ID for every request and its log lines (added last, so it is the
+# outermost middleware and 413 responses carry the ID too)
+app.add_middleware(RequestIdMiddleware)
+
+# ML models are built by the registry when the application starts (see lifespan)
+model_registry = ModelRegistry()
 if MedicineScannerModel:
-    try:
-        medicine_scanner = MedicineScannerModel()
-    except Exception as e:
-        print(f"Warning: Could not initialize MedicineScannerModel: {e}")
-        print("Server will continue but medicine scanning may be limited.")
-        medicine_scanner = None
+    model_registry.register("medicine_scanner", MedicineScannerModel)
 else:
     print("MedicineScannerModel not available. Using fallback methods.")
-    medicine_scanner = None
 
 if VisualDiagnosisModel:
-    try:
-        visual_diagnosis = VisualDiagnosisModel()
-    except Exception as e:
-        print(f"Warning: Could not initialize VisualDiagnosisModel: {e}")
-        print("Server will continue but visual diagnosis may be limited.")
-        visual_diagnosis = None
+    model_registry.register("visual_diagnosis", VisualDiagnosisModel)
 else:
     print("VisualDiagnosisModel not available. Using fallback methods.")
-    visual_diagnosis = None
 
 remedy_service = AyurvedicRemedyService()
+execution = get_execution_layer()
+result_cache = ResultCache()
+
+
+def _get_model(name: str):
+    """Return a loaded model (or None if unavailable); 503 while models are still loading"""
+    if not model_registry.ready:
+        raise HTTPException(status_code=503, detail="Models are still loading. Please retry shortly.")
+    return model_registry.get(name)
+
+
+def _get_medicine_scanner():
+    """The medicine scanner, or 503 when neither OCR nor the classifier is usable"""
+    medicine_scanner = _get_model("medicine_scanner")
+    if not medicine_scanner:
+        raise HTTPException(
+            status_code=503,
+            detail="Medicine scanner model not available. Please check backend logs."
+        )
+    if hasattr(medicine_scanner, "is_loaded") and not medicine_scanner.is_loaded():
+        raise HTTPException(
+            status_code=503,
+            detail=(
+                "Medicine scanning is not available because neither OCR (Tesseract) nor an ML model is configured. "
+                "Install Tesseract and set TESSERACT_CMD in backend .env, or train the medicine model."
+            ),
+        )
+    return medicine_scanner
+
+
+def _get_visual_diagnosis():
+    """The visual diagnosis model, or 503 when it is unavailable"""
+    visual_diagnosis = _get_model("visual_diagnosis")
+    if not visual_diagnosis:
+        raise HTTPException(
+            status_code=503,
+            detail="Visual diagnosis model not available. Please check backend logs."
+        )
+    return visual_diagnosis
+
+
+def _validate_diagnosis_type(diagnosis_type: str):
+    if diagnosis_type not in VALID_DIAGNOSIS_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"diagnosis_type must be one of: {', '.join(VALID_DIAGNOSIS_TYPES)}"
+        )
+
+
+def _medicine_decode_size(medicine_scanner) -> Tuple[int, bool]:
+    """OCR needs more pixels than the classifier; decode for the larger consumer"""
+    if getattr(medicine_scanner, "ocr_available", False):
+        return OCR_DECODE_SIZE, True
+    return CLASSIFIER_DECODE_SIZE, False
+
+
+def _add_medicine_remedies(result: dict):
+    """Attach ayurvedic remedies to an identified medicine"""
+    if result.get('medicine_name') and result.get('medicine_name') != 'Unknown':
+        remedies = remedy_service.get_medicine_remedies(
+            result['medicine_name'],
+            result.get('category', 'general')
+        )
+        result['ayurvedic_remedies'] = remedies
+        logger.debug("Found %d ayurvedic remedies", len(remedies))
+
+
+def _add_diagnosis_remedies(result: dict, diagnosis_type: str):
+    """Attach ayurvedic remedies and recommendations for detected conditions"""
+    if result.get('conditions'):
+        resolved = remedy_service.diagnosis_remedies(result['conditions'], diagnosis_type)
+        # Shared with other responses: serialized as lists, never modified
+        result['ayurvedic_remedies'] = resolved.remedies
+        result['recommendations'] = resolved.recommendations
+        logger.debug("Found %d ayurvedic remedies", len(resolved.remedies))
+
+
+async def _ingest_upload(file: UploadFile) -> IngestedUpload:
+    """
+    Validate a multipart upload straight from its spooled file: size, image
+    header (format, dimensions, 50px minimum) and content hash, without
+    reading it into memory at once.
+    """
+    if not file.content_type or not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    try:
+        with stage("ingest"):
+            return await execution.run_tensor(ingest_file, file.file)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+async def _read_image_body(request: Request) -> Tuple[object, int]:
+    """
+    Receive the image of a raw or base64 JSON request body.
+    
+    The body is received into one buffer sized from Content-Length. Raw
+    bodies (application/octet-stream or image/*) are used as-is; for JSON the
+    base64 field is located in place and decoded chunk by chunk into one
+    preallocated buffer. Returns the image buffer (bytearray or memoryview)
+    and the number of buffer bytes allocated for the request.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    content_length = request.headers.get("content-length", "")
+    body = await read_body(
+        request.stream(),
+        int(content_length) if content_length.isdigit() else None,
+        request_body_limit(),
+    )
+    if not body:
+        raise UploadRejected("Empty request body")
+    
+    if content_type == "application/octet-stream" or content_type.startswith("image/"):
+        image_buffer = body
+        buffer_bytes = len(body)
+        # The same image sent as base64 JSON: body, its str copy, the split() copy, decoded bytes
+        naive_bytes = len(body) * 4 // 3 * 3 + len(body)
+    else:
+        encoded = find_base64_field(body)
+        image_buffer = await execution.run_tensor(decode_base64, encoded)
+        buffer_bytes = len(body) + len(image_buffer)
+        naive_bytes = 2 * len(body) + len(encoded) + len(image_buffer)
+    
+    logger.info(
+        "Received request body",
+        extra={
+            "sample": "request_body",
+            "content_type": content_type or "unknown",
+            "body_bytes": len(body),
+            "image_bytes": len(image_buffer),
+            "buffer_bytes": buffer_bytes,
+            # The same image through json.loads + split + b64decode
+            "naive_buffer_bytes": naive_bytes,
+        }
+    )
+    return image_buffer, buffer_bytes
+
+
+def _decode_image(
+    upload: IngestedUpload,
+    target_size: Optional[int] = None,
+    longest_edge: bool = False
+) -> Tuple[Image.Image, dict]:
+    """
+    Decode a validated upload to RGB near ``target_size``.
+    CPU-bound; called through the execution layer, never on the event loop.
+    """
+    try:
+        image, stats = decode_image(upload.file, target_size, longest_edge=longest_edge)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image format: {str(e)}")
+    
+    width, height = stats["source_size"]
+    logger.info(
+        "Decoded image",
+        extra={
+            "sample": "decode",
+            "format": stats["format"],
+            "source_size": f"{width}x{height}",
+            "decoded_size": f"{image.size[0]}x{image.size[1]}",
+            "decode_ms": round(stats["decode_ms"], 1),
+            "memory_saved_bytes": stats["memory_saved_bytes"],
+        }
+    )
+    return image, stats
+
+
+def _decode_headers(stats: dict) -> dict:
+    """Per-request decode report sent back as response headers"""
+    return {
+        "Server-Timing": f"decode;dur={stats['decode_ms']:.1f}",
+        "X-Decode-Memory-Saved": str(stats["memory_saved_bytes"]),
+        "X-Cache": "MISS",
+    }
+
+
+def _cache_lookup(namespace: str, model, image_hash: str, diagnosis_type: str = "") -> Tuple[str, Optional[dict]]:
+    """
+    Look up a previous result for the same image bytes.
+    Entries are dropped when the model checkpoint on disk or the remedy data changes.
+    """
+    version = f"remedies:{remedy_service.version}"
+    if hasattr(model, "checkpoint_version"):
+        version = f"{model.checkpoint_version()}|{version}"
+    result_cache.ensure_model_version(namespace, version)
+    cache_key = ResultCache.make_key(namespace, image_hash, diagnosis_type)
+    cached = result_cache.get(cache_key)
+    CACHE_LOOKUPS.inc(cache=namespace, result="miss" if cached is None else "hit")
+    if cached is not None and hasattr(model, "replayable"):
+        # e.g. drop a deferred-OCR scan_id that has expired since
+        cached = model.replayable(cached)
+    return cache_key, cached
+
+
+async def _read_batch_item(
+    index: int,
+    file: UploadFile,
+    namespace: str,
+    model,
+    diagnosis_type: str = "",
+    decode_size: int = CLASSIFIER_DECODE_SIZE,
+    longest_edge: bool = False
+) -> dict:
+    """
+    Validate, cache-check and decode one file of a batch request.
+    Failures are recorded on the item instead of failing the whole batch.
+    """
+    item = {"index": index, "filename": file.filename}
+    if diagnosis_type:
+        item["diagnosis_type"] = diagnosis_type
+    try:
+        if diagnosis_type:
+            _validate_diagnosis_type(diagnosis_type)
+        upload = await _ingest_upload(file)
+        
+        item["cache_key"], cached = _cache_lookup(namespace, model, upload.image_hash, diagnosis_type)
+        if cached is not None:
+            item.update(status=200, cached=True, result=cached)
+            return item
+        
+        with stage("decode"):
+            item["image"], _ = await execution.run_tensor(
+                _decode_image, upload, decode_size, longest_edge=longest_edge
+            )
+    except HTTPException as e:
+        item.update(status=e.status_code, error=e.detail)
+    except Exception as e:
+        item.update(status=500, error=f"Error reading image: {str(e)}")
+    return item
+
+
+def _batch_response(items: List[dict]) -> FastJSONResponse:
+    """Strip internal fields and summarize a batch request"""
+    for item in items:
+        item.pop("image", None)
+        item.pop("cache_key", None)
+    failed = sum(1 for item in items if item["status"] != 200)
+    return FastJSONResponse(content={"count": len(items), "failed": failed, "results": items})
+
+
+def _check_batch_size(files: List[UploadFile]):
+    if not files:
+        raise HTTPException(status_code=400, detail="At least one file is required")
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many files: at most {BATCH_MAX_FILES} per batch request"
+        )
 
 
 @app.get("/")
@@ -79,14 +419,91 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Detailed health check"""
-    return {
-        "status": "healthy",
+    """Detailed health check (503 until every model is loaded and warmed up)"""
+    medicine_scanner = model_registry.get("medicine_scanner")
+    visual_diagnosis = model_registry.get("visual_diagnosis")
+    body = {
+        "status": "healthy" if model_registry.ready else ("failed" if model_registry.error else "starting"),
         "models": {
             "medicine_scanner": medicine_scanner.is_loaded() if medicine_scanner else False,
             "visual_diagnosis": visual_diagnosis.is_loaded() if visual_diagnosis else False
-        }
+        },
+        "registry": model_registry.stats(),
+        "inference": _batching_stats(),
+        "execution": execution.stats(),
+        "ocr_workers": get_ocr_pool().stats(),
+        "cache": result_cache.stats(),
+        "scan_index": _scan_index_stats(),
+        "deferred_ocr": _deferred_ocr_stats(),
+        "medicine_catalog": _catalog_stats(),
+        "remedy_data": remedy_service.data_stats(),
+        "remedy_cache": remedy_service.stats(),
+        "json": fragment_cache.stats(),
+        "logging": logging_stats()
     }
+    return FastJSONResponse(content=body, status_code=200 if model_registry.ready else 503)
+
+
+def _batching_stats() -> dict:
+    """Queue depth and batch-size statistics for each classifier batcher"""
+    medicine_scanner = model_registry.get("medicine_scanner")
+    visual_diagnosis = model_registry.get("visual_diagnosis")
+    stats = {}
+    if medicine_scanner and getattr(medicine_scanner, "batcher", None):
+        stats["medicine"] = medicine_scanner.batcher.stats()
+    if visual_diagnosis and getattr(visual_diagnosis, "skin_batcher", None):
+        stats["skin"] = visual_diagnosis.skin_batcher.stats()
+    return stats
+
+
+def _scan_index_stats() -> dict:
+    """Near-duplicate index statistics of the medicine scanner"""
+    medicine_scanner = model_registry.get("medicine_scanner")
+    if medicine_scanner and getattr(medicine_scanner, "scan_index", None):
+        return medicine_scanner.scan_index.stats()
+    return {}
+
+
+def _catalog_stats() -> dict:
+    """Size and kind of the medicine catalog (built-in or catalog file)"""
+    medicine_scanner = model_registry.get("medicine_scanner")
+    if medicine_scanner and getattr(medicine_scanner, "catalog", None):
+        return medicine_scanner.catalog.stats()
+    return {}
+
+
+def _deferred_ocr_stats() -> dict:
+    """Scans whose OCR was skipped for a confident classification"""
+    medicine_scanner = model_registry.get("medicine_scanner")
+    if medicine_scanner and getattr(medicine_scanner, "deferred_text", None):
+        return medicine_scanner.deferred_text.stats()
+    return {}
+
+
+def _require_admin(token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled. Set ADMIN_TOKEN to enable them.")
+    if not token or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Admin-Token")
+
+
+@app.post("/api/v1/admin/remedies/reload")
+async def reload_remedies(x_admin_token: Optional[str] = Header(None)):
+    """
+    Re-read the remedy data file now rather than at the watcher's next check.
+    The current remedies stay in use if the file can't be loaded (422).
+    """
+    _require_admin(x_admin_token)
+    loop = asyncio.get_running_loop()
+    if not await loop.run_in_executor(None, remedy_service.reload):
+        raise HTTPException(status_code=422, detail=f"Remedy data not reloaded: {remedy_service.last_error}")
+    return remedy_service.data_stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    """Per-stage latency histograms and cache/fallback counters (Prometheus text format)"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.post("/api/v1/medicine/scan")
@@ -98,71 +515,113 @@ async def scan_medicine(file: UploadFile = File(...)):
     - Usage & causes
     - Ayurvedic alternatives/remedies
     """
-    if not medicine_scanner:
-        raise HTTPException(
-            status_code=503,
-            detail="Medicine scanner model not available. Please check backend logs."
-        )
-    if hasattr(medicine_scanner, "is_loaded") and not medicine_scanner.is_loaded():
-        raise HTTPException(
-            status_code=503,
-            detail=(
-                "Medicine scanning is not available because neither OCR (Tesseract) nor an ML model is configured. "
-                "Install Tesseract and set TESSERACT_CMD in backend .env, or train the medicine model."
-            ),
-        )
+    medicine_scanner = _get_medicine_scanner()
+    start_request()
     
     try:
-        # Validate file type
-        if not file.content_type or not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        # Read image
-        image_bytes = await file.read()
+        # Validate the spooled upload (type, size, header) without reading it into memory
+        upload = await _ingest_upload(file)
         
-        if len(image_bytes) == 0:
-            raise HTTPException(status_code=400, detail="Empty image file")
+        cache_key, cached = _cache_lookup("medicine", medicine_scanner, upload.image_hash)
+        if cached is not None:
+            observe_request("scan", method="cache")
+            return FastJSONResponse(content=cached, headers={"X-Cache": "HIT"})
         
-        try:
-            image = Image.open(io.BytesIO(image_bytes))
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Invalid image format: {str(e)}")
-        
-        # Convert to RGB if needed
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Validate image size
-        if image.size[0] < 50 or image.size[1] < 50:
-            raise HTTPException(status_code=400, detail="Image too small. Please upload a larger image.")
+        decode_size, longest_edge = _medicine_decode_size(medicine_scanner)
+        with stage("decode"):
+            image, decode_stats = await execution.run_tensor(
+                _decode_image, upload, decode_size, longest_edge=longest_edge
+            )
         
-        print(f"Processing medicine image: {image.size[0]}x{image.size[1]}, mode: {image.mode}")
+        logger.debug("Processing medicine image: %dx%d, mode: %s", image.size[0], image.size[1], image.mode)
         
         # Process with ML model
         result = await medicine_scanner.identify_medicine(image)
         
-        print(f"Medicine identification result: {result.get('medicine_name')}, confidence: {result.get('confidence')}")
+        logger.info(
+            "Medicine identification result",
+            extra={
+                "medicine_name": result.get('medicine_name'),
+                "confidence": result.get('confidence'),
+                "method": result.get('method'),
+            }
+        )
         
         # Get ayurvedic remedies
-        if result.get('medicine_name') and result.get('medicine_name') != 'Unknown':
-            remedies = remedy_service.get_medicine_remedies(
-                result['medicine_name'],
-                result.get('category', 'general')
-            )
-            result['ayurvedic_remedies'] = remedies
-            print(f"Found {len(remedies)} ayurvedic remedies")
+        with stage("remedies"):
+            _add_medicine_remedies(result)
         
-        return JSONResponse(content=result)
+        # Don't cache failed identifications
+        if result.get('medicine_name') is not None:
+            result_cache.put(cache_key, result)
+        
+        observe_request("scan", method=result.get("method", "error"))
+        return FastJSONResponse(content=result, headers=_decode_headers(decode_stats))
     
     except HTTPException:
         raise
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"Error processing medicine image: {error_trace}")
+        # The traceback is formatted by the log writer thread, not here
+        logger.exception("Error processing medicine image")
+        observe_request("scan", method="error")
         raise HTTPException(status_code=500, detail=f"Error processing medicine image: {str(e)}")
 
 
+@app.post("/api/v1/medicine/scan-batch")
+async def scan_medicine_batch(files: List[UploadFile] = File(...)):
+    """
+    Batch Medicine Scanner Endpoint
+    Accepts several medicine package images and returns one result per file,
+    in upload order. The classifier runs once over all images; a bad file
+    only fails its own entry.
+    """
+    medicine_scanner = _get_medicine_scanner()
+    _check_batch_size(files)
+    start_request()
+    
+    decode_size, longest_edge = _medicine_decode_size(medicine_scanner)
+    items = await asyncio.gather(*(
+        _read_batch_item(index, file, "medicine", medicine_scanner,
+                         decode_size=decode_size, longest_edge=longest_edge)
+        for index, file in enumerate(files)
+    ))
+    
+    pending = [item for item in items if "image" in item]
+    logger.info("Processing medicine batch", extra={"files": len(items), "pending": len(pending)})
+    if pending:
+        results = await medicine_scanner.identify_many([item["image"] for item in pending])
+        for item, result in zip(pending, results):
+            with stage("remedies"):
+                _add_medicine_remedies(result)
+            # Don't cache failed identifications
+            if result.get('medicine_name') is not None:
+                result_cache.put(item["cache_key"], result)
+            item.update(status=200, cached=False, result=result)
+    
+    observe_request("scan-batch", method="batch")
+    return _batch_response(items)
+
+
+@app.get("/api/v1/medicine/scan/{scan_id}/text")
+async def get_scan_text(scan_id: str):
+    """
+    Extracted text of a scan whose OCR was skipped because the classifier was
+    confident (the scan response carries a ``scan_id`` then). OCR runs on
+    the first request; 404 once the scan has expired.
+    """
+    medicine_scanner = _get_medicine_scanner()
+    start_request()
+    
+    with stage("ocr"):
+        result = await medicine_scanner.fetch_deferred_text(scan_id)
+    if result is None:
+        observe_request("scan-text", method="error")
+        raise HTTPException(status_code=404, detail="Unknown or expired scan ID")
+    
+    observe_request("scan-text", method="ocr")
+    return result
+
+
 @app.post("/api/v1/diagnosis/analyze")
 async def analyze_visual_diagnosis(
     file: UploadFile = File(...),
@@ -175,151 +634,182 @@ async def analyze_visual_diagnosis(
     - Ayurvedic remedies and natural treatments
     - Recommendations
     """
-    if not visual_diagnosis:
-        raise HTTPException(
-            status_code=503,
-            detail="Visual diagnosis model not available. Please check backend logs."
-        )
+    visual_diagnosis = _get_visual_diagnosis()
+    start_request()
     
     try:
-        # Validate file type
-        if not file.content_type or not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
         # Validate diagnosis type
-        valid_types = ["skin", "eye", "tongue", "nail"]
-        if diagnosis_type not in valid_types:
-            raise HTTPException(
-                status_code=400,
-                detail=f"diagnosis_type must be one of: {', '.join(valid_types)}"
-            )
-        
-        # Read image
-        image_bytes = await file.read()
+        _validate_diagnosis_type(diagnosis_type)
         
-        if len(image_bytes) == 0:
-            raise HTTPException(status_code=400, detail="Empty image file")
+        # Validate the spooled upload (type, size, header) without reading it into memory
+        upload = await _ingest_upload(file)
         
-        try:
-            image = Image.open(io.BytesIO(image_bytes))
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Invalid image format: {str(e)}")
-        
-        # Convert to RGB if needed
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        cache_key, cached = _cache_lookup("diagnosis", visual_diagnosis, upload.image_hash, diagnosis_type)
+        if cached is not None:
+            observe_request("analyze", diagnosis_type, "cache")
+            return FastJSONResponse(content=cached, headers={"X-Cache": "HIT"})
         
-        # Validate image size
-        if image.size[0] < 50 or image.size[1] < 50:
-            raise HTTPException(status_code=400, detail="Image too small. Please upload a larger image.")
+        with stage("decode"):
+            image, decode_stats = await execution.run_tensor(_decode_image, upload, CLASSIFIER_DECODE_SIZE)
         
-        print(f"Processing {diagnosis_type} diagnosis image: {image.size[0]}x{image.size[1]}")
+        logger.debug("Processing %s diagnosis image: %dx%d", diagnosis_type, image.size[0], image.size[1])
         
         # Process with ML model
         result = await visual_diagnosis.analyze(image, diagnosis_type)
         
-        print(f"Diagnosis result: {len(result.get('conditions', []))} conditions detected")
+        logger.info(
+            "Diagnosis result",
+            extra={
+                "diagnosis_type": diagnosis_type,
+                "conditions": len(result.get('conditions', [])),
+                "method": result.get('method'),
+            }
+        )
         
         # Get ayurvedic remedies for detected conditions
-        if result.get('conditions'):
-            remedies = []
-            for condition in result['conditions']:
-                condition_remedies = remedy_service.get_condition_remedies(
-                    condition['name'],
-                    diagnosis_type
-                )
-                remedies.extend(condition_remedies)
-            
-            result['ayurvedic_remedies'] = remedies
-            result['recommendations'] = remedy_service.get_recommendations(
-                result['conditions'],
-                diagnosis_type
-            )
-            print(f"Found {len(remedies)} ayurvedic remedies")
+        with stage("remedies"):
+            _add_diagnosis_remedies(result, diagnosis_type)
+        
+        if 'error' not in result:
+            result_cache.put(cache_key, result)
+        observe_request("analyze", diagnosis_type, result.get("method", "error"))
         
-        return JSONResponse(content=result)
+        return FastJSONResponse(content=result, headers=_decode_headers(decode_stats))
     
     except HTTPException:
         raise
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"Error processing diagnosis image: {error_trace}")
+        logger.exception("Error processing diagnosis image", extra={"diagnosis_type": diagnosis_type})
+        observe_request("analyze", diagnosis_type, "error")
         raise HTTPException(
             status_code=500,
             detail=f"Error processing diagnosis image: {str(e)}"
         )
 
 
-@app.post("/api/v1/diagnosis/analyze-base64")
+@app.post(
+    "/api/v1/diagnosis/analyze-base64",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"image": {"type": "string", "description": "Base64 image or data URL"}},
+                        "required": ["image"],
+                    }
+                },
+                "application/octet-stream": {"schema": {"type": "string", "format": "binary"}},
+            },
+        }
+    },
+)
 async def analyze_visual_diagnosis_base64(
-    image_data: dict,
+    request: Request,
     diagnosis_type: str = "skin"
 ):
     """
     Visual Diagnosis Endpoint (Base64)
-    Accepts base64 encoded image for easier frontend integration
+    Accepts base64 encoded image for easier frontend integration, or the raw
+    image bytes with Content-Type: application/octet-stream
     """
-    if not visual_diagnosis:
-        raise HTTPException(
-            status_code=503,
-            detail="Visual diagnosis model not available. Please check backend logs."
-        )
+    visual_diagnosis = _get_visual_diagnosis()
+    start_request()
     
     try:
-        # Extract base64 data
-        base64_str = image_data.get('image')
-        if not base64_str:
-            raise HTTPException(status_code=400, detail="image field required in base64 format")
-        
-        # Remove data URL prefix if present
-        if ',' in base64_str:
-            base64_str = base64_str.split(',')[1]
+        # Validate diagnosis type
+        _validate_diagnosis_type(diagnosis_type)
         
-        # Decode base64
-        image_bytes = base64.b64decode(base64_str)
-        image = Image.open(io.BytesIO(image_bytes))
+        try:
+            with stage("ingest"):
+                image_buffer, buffer_bytes = await _read_image_body(request)
+                upload = await execution.run_tensor(ingest_buffer, image_buffer, min_size=None)
+        except UploadRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
         
-        # Convert to RGB if needed
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        # Same image bytes share cache entries with the multipart endpoint
+        cache_key, cached = _cache_lookup("diagnosis", visual_diagnosis, upload.image_hash, diagnosis_type)
+        if cached is not None:
+            observe_request("analyze-base64", diagnosis_type, "cache")
+            return FastJSONResponse(content=cached, headers={"X-Cache": "HIT"})
         
-        # Validate diagnosis type
-        valid_types = ["skin", "eye", "tongue", "nail"]
-        if diagnosis_type not in valid_types:
-            raise HTTPException(
-                status_code=400,
-                detail=f"diagnosis_type must be one of: {', '.join(valid_types)}"
-            )
+        with stage("decode"):
+            image, decode_stats = await execution.run_tensor(_decode_image, upload, CLASSIFIER_DECODE_SIZE)
         
         # Process with ML model
         result = await visual_diagnosis.analyze(image, diagnosis_type)
         
         # Get ayurvedic remedies
-        if result.get('conditions'):
-            remedies = []
-            for condition in result['conditions']:
-                condition_remedies = remedy_service.get_condition_remedies(
-                    condition['name'],
-                    diagnosis_type
-                )
-                remedies.extend(condition_remedies)
-            
-            result['ayurvedic_remedies'] = remedies
-            result['recommendations'] = remedy_service.get_recommendations(
-                result['conditions'],
-                diagnosis_type
-            )
+        with stage("remedies"):
+            _add_diagnosis_remedies(result, diagnosis_type)
         
-        return JSONResponse(content=result)
+        if 'error' not in result:
+            result_cache.put(cache_key, result)
+        observe_request("analyze-base64", diagnosis_type, result.get("method", "error"))
+        
+        headers = _decode_headers(decode_stats)
+        headers["X-Upload-Buffer-Bytes"] = str(buffer_bytes)
+        return FastJSONResponse(content=result, headers=headers)
     
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.exception("Error processing diagnosis image", extra={"diagnosis_type": diagnosis_type})
+        observe_request("analyze-base64", diagnosis_type, "error")
         raise HTTPException(
             status_code=500,
             detail=f"Error processing diagnosis image: {str(e)}"
         )
 
 
+@app.post("/api/v1/diagnosis/analyze-batch")
+async def analyze_visual_diagnosis_batch(
+    files: List[UploadFile] = File(...),
+    diagnosis_types: Optional[List[str]] = Form(None)
+):
+    """
+    Batch Visual Diagnosis Endpoint
+    Accepts several images, each with its own diagnosis_type (send one
+    diagnosis_types field per file, in the same order, or a single one for
+    all files; defaults to skin). Skin images share one batched classifier pass; results come
+    back per file, in upload order, with errors isolated to their file.
+    """
+    visual_diagnosis = _get_visual_diagnosis()
+    _check_batch_size(files)
+    start_request()
+    
+    diagnosis_types = diagnosis_types or ["skin"]
+    if len(diagnosis_types) == 1:
+        diagnosis_types = diagnosis_types * len(files)
+    if len(diagnosis_types) != len(files):
+        raise HTTPException(
+            status_code=400,
+            detail="Provide one diagnosis_types value per file, or a single value for all files"
+        )
+    
+    items = await asyncio.gather(*(
+        _read_batch_item(index, file, "diagnosis", visual_diagnosis, diagnosis_type)
+        for index, (file, diagnosis_type) in enumerate(zip(files, diagnosis_types))
+    ))
+    
+    pending = [item for item in items if "image" in item]
+    logger.info("Processing diagnosis batch", extra={"files": len(items), "pending": len(pending)})
+    if pending:
+        results = await visual_diagnosis.analyze_many(
+            [(item["image"], item["diagnosis_type"]) for item in pending]
+        )
+        for item, result in zip(pending, results):
+            with stage("remedies"):
+                _add_diagnosis_remedies(result, item["diagnosis_type"])
+            if 'error' not in result:
+                result_cache.put(item["cache_key"], result)
+            item.update(status=200, cached=False, result=result)
+    
+    observe_request("analyze-batch", method="batch")
+    return _batch_response(items)
+
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
@@ -0,0 +1,82 @@
+"""
+Alias Matcher
+Aho-Corasick automaton over all medicine aliases: finds every alias that occurs
+in an OCR text in one pass over the text, however large the catalog
+"""
+
+from collections import deque
+from typing import Dict, Generic, Iterable, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class AliasMatcher(Generic[T]):
+    """
+    Multi-pattern substring matcher, built once from (alias, value) pairs.
+
+    Matching is case-insensitive and, like ``alias in text``, not limited to
+    word boundaries. The automaton is a trie with failure links; each state
+    stores the aliases ending there, including those reached via its failure
+    links, so a match costs nothing beyond the step that finds it.
+    """
+
+    def __init__(self, aliases: Iterable[Tuple[str, T]]):
+        self._aliases: List[str] = []
+        self._values: List[T] = []
+        # Per state: character -> next state, failure state, aliases ending here
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: Dict[int, Tuple[int, ...]] = {}
+
+        for alias, value in aliases:
+            alias = alias.lower()
+            if not alias:
+                continue
+            state = 0
+            for char in alias:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                state = next_state
+            self._output[state] = self._output.get(state, ()) + (len(self._aliases),)
+            self._aliases.append(alias)
+            self._values.append(value)
+
+        self._link()
+
+    def _link(self):
+        """Set failure links breadth-first and merge the outputs of each state's failure state"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                inherited = self._output.get(self._fail[child])
+                if inherited:
+                    self._output[child] = self._output.get(child, ()) + inherited
+
+    def matches(self, text: str) -> List[Tuple[str, T]]:
+        """
+        Distinct (alias, value) pairs occurring in ``text``, in the order the
+        aliases were given (lowercased aliases)
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set()
+        state = 0
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if state in output:
+                found.update(output[state])
+        return [(self._aliases[index], self._values[index]) for index in sorted(found)]
+
+    def stats(self) -> Dict:
+        return {"aliases": len(self._aliases), "states": len(self._goto)}
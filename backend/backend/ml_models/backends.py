@@ -0,0 +1,136 @@
+"""
+Inference Backends
+Selects between eager PyTorch, TorchScript, int8-quantized TorchScript and ONNX
+Runtime variants of a trained classifier (exported by export_models.py)
+"""
+
+import json
+import os
+from typing import Dict, Tuple
+
+# eager | torchscript | int8 | onnx
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "eager").lower()
+BACKENDS = ("eager", "torchscript", "int8", "onnx")
+
+_VARIANT_SUFFIXES = {
+    "torchscript": ".torchscript.pt",
+    "int8": ".int8.pt",
+    "onnx": ".onnx",
+}
+
+
+def variant_path(model_path: str, backend: str) -> str:
+    """Path of an exported variant, e.g. models/skin_model_best.pth -> models/skin_model_best.int8.pt"""
+    if backend == "eager":
+        return model_path
+    root, _ = os.path.splitext(model_path)
+    return root + _VARIANT_SUFFIXES[backend]
+
+
+class OnnxClassifier:
+    """Callable wrapper giving an ONNX Runtime session the same interface as a torch module"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._open_session()
+
+    def _open_session(self):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self._pid = os.getpid()
+
+    def __call__(self, batch):
+        import torch
+
+        if self._pid != os.getpid():
+            # The session's thread pool does not survive fork() (serve.py workers)
+            self._open_session()
+        outputs = self.session.run(None, {self.input_name: batch.detach().cpu().numpy()})
+        return torch.from_numpy(outputs[0])
+
+    def eval(self):
+        return self
+
+    def to(self, device):
+        return self
+
+
+def load_resnet18_classifier(model_path: str, labels_path: str, device) -> Tuple[object, Dict, int]:
+    """
+    Build a ResNet18 classifier and load a checkpoint saved by the training scripts.
+
+    Returns:
+        (model in eval mode on ``device``, label mapping, number of classes)
+    """
+    import torch
+    from torchvision import models
+
+    label_mapping = {}
+    if os.path.exists(labels_path):
+        with open(labels_path, 'r') as f:
+            label_mapping = json.load(f)
+
+    checkpoint = torch.load(model_path, map_location=device)
+
+    num_classes = len(label_mapping) if label_mapping else checkpoint.get('num_classes', 10)
+    model = models.resnet18(weights=None)
+    model.fc = torch.nn.Linear(model.fc.in_features, num_classes)
+
+    if 'model_state_dict' in checkpoint:
+        model.load_state_dict(checkpoint['model_state_dict'])
+    else:
+        model.load_state_dict(checkpoint)
+
+    model.to(device)
+    model.eval()
+    return model, label_mapping, num_classes
+
+
+def load_classifier(
+    model_path: str,
+    labels_path: str,
+    device,
+    backend: str = INFERENCE_BACKEND,
+) -> Tuple[object, Dict, int, str]:
+    """
+    Load a classifier with the requested backend, falling back to eager mode
+    when the exported variant is missing or cannot be loaded. The int8 and
+    onnx backends run on CPU regardless of ``device``.
+
+    Returns:
+        (callable model, label mapping, number of classes, backend actually used)
+    """
+    if backend not in BACKENDS:
+        print(f"Warning: Unknown INFERENCE_BACKEND {backend!r}; using eager.")
+        backend = "eager"
+
+    if backend != "eager":
+        path = variant_path(model_path, backend)
+        if not os.path.exists(path):
+            print(f"Exported {backend} model not found at {path}; using eager.")
+            print("Run export_models.py to create it.")
+        else:
+            try:
+                import torch
+
+                label_mapping = {}
+                if os.path.exists(labels_path):
+                    with open(labels_path, 'r') as f:
+                        label_mapping = json.load(f)
+
+                if backend == "onnx":
+                    model = OnnxClassifier(path)
+                else:
+                    # Quantized kernels are CPU-only
+                    model = torch.jit.load(path, map_location="cpu" if backend == "int8" else device)
+                    model.eval()
+                return model, label_mapping, len(label_mapping), backend
+            except Exception as e:
+                print(f"Could not load {backend} model from {path}: {e}. Using eager.")
+
+    model, label_mapping, num_classes = load_resnet18_classifier(model_path, labels_path, device)
+    return model, label_mapping, num_classes, "eager"
@@ -0,0 +1,237 @@
+"""
+Dynamic Micro-Batching Scheduler
+Gathers concurrent classifier requests into a single batched forward pass
+"""
+
+import asyncio
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+from ml_models.preprocessing import TensorNormalizer
+from services.execution import get_execution_layer
+from services.metrics import BATCH_SIZE, current_timings
+
+# Batching window and batch cap are tunable per deployment.
+# A longer window gives larger batches at the cost of added latency per request.
+BATCH_WINDOW_MS = float(os.environ.get("INFERENCE_BATCH_WINDOW_MS", "5"))
+MAX_BATCH_SIZE = int(os.environ.get("INFERENCE_MAX_BATCH_SIZE", "16"))
+
+
+class _PendingItem:
+    """One caller waiting for its slice of a batched forward pass"""
+
+    __slots__ = ("image", "future", "enqueued_at", "timings")
+
+    def __init__(self, image, future: asyncio.Future):
+        self.image = image
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+        # Stage timings of the request that submitted the image
+        self.timings = current_timings()
+
+
+class BatchingScheduler:
+    """
+    Shared micro-batching queue in front of a classifier.
+
+    Callers submit a single image prepared by ``prepare_image`` (uint8,
+    shape (H, W, 3)). A background task collects requests for up to
+    ``window_ms`` (or until ``max_batch_size`` is reached), normalizes them
+    into a reusable batch buffer, runs one forward pass and hands each caller
+    back its own row of softmax probabilities.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        forward_fn: Callable,
+        window_ms: float = BATCH_WINDOW_MS,
+        max_batch_size: int = MAX_BATCH_SIZE,
+    ):
+        """
+        Args:
+            name: Label used in statistics output
+            forward_fn: Callable taking a normalized batch tensor (N, C, H, W)
+                and returning softmax probabilities of shape (N, num_classes)
+            window_ms: Maximum time to wait for more requests after the first
+            max_batch_size: Upper bound on the number of images per forward pass
+        """
+        self.name = name
+        self.forward_fn = forward_fn
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch_size = max(1, int(max_batch_size))
+        self._normalizer = TensorNormalizer(self.max_batch_size)
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Statistics
+        self._batches = 0
+        self._items = 0
+        self._max_queue_depth = 0
+        self._batch_size_counts: Dict[int, int] = {}
+        self._forward_time_total = 0.0
+        self._wait_time_total = 0.0
+
+    def _ensure_worker(self):
+        """Start the batching task on the running event loop (lazily)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, image):
+        """
+        Queue one image and wait for its softmax probabilities.
+
+        Args:
+            image: uint8 array of shape (H, W, 3) from ``prepare_image``
+
+        Returns:
+            1-D tensor of class probabilities for this image
+        """
+        self._ensure_worker()
+        future = self._enqueue(image)
+        self._record_queue_depth()
+        return await future
+
+    async def submit_many(self, images: List, return_exceptions: bool = False) -> List:
+        """
+        Queue several images at once and wait for all of their probabilities.
+
+        The images are enqueued together, so they share forward passes
+        (up to ``max_batch_size`` per pass) instead of depending on the
+        batching window to group them.
+
+        Args:
+            images: uint8 arrays of shape (H, W, 3) from ``prepare_image``
+            return_exceptions: Return a failed forward pass as the exception
+                object in that image's slot instead of raising
+
+        Returns:
+            One 1-D probability tensor per image, in input order
+        """
+        if not images:
+            return []
+        self._ensure_worker()
+        futures = [self._enqueue(image) for image in images]
+        self._record_queue_depth()
+        return await asyncio.gather(*futures, return_exceptions=return_exceptions)
+
+    def _enqueue(self, image) -> asyncio.Future:
+        future = self._loop.create_future()
+        self._queue.put_nowait(_PendingItem(image, future))
+        return future
+
+    def _record_queue_depth(self):
+        depth = self._queue.qsize()
+        if depth > self._max_queue_depth:
+            self._max_queue_depth = depth
+
+    async def _collect_batch(self) -> List[_PendingItem]:
+        """Wait for the first request, then gather more until the window closes"""
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.window
+
+        while len(batch) < self.max_batch_size:
+            # Drain whatever is already queued without waiting
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    def _forward_batch(self, images: List):
+        """Normalize the queued images into the batch buffer and run the forward pass (worker thread)"""
+        return self.forward_fn(self._normalizer.normalize_batch(images))
+
+    async def _run(self):
+        """Background loop: collect a batch, run one forward pass, fan results out"""
+        while True:
+            batch = await self._collect_batch()
+            # Skip callers that gave up (e.g. client disconnected)
+            batch = [item for item in batch if not item.future.done()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            try:
+                probabilities = await get_execution_layer().run_tensor(
+                    self._forward_batch, [item.image for item in batch]
+                )
+            except Exception as e:
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                continue
+
+            finished = time.perf_counter()
+            self._record_batch(batch, started, finished)
+
+            for index, item in enumerate(batch):
+                if not item.future.done():
+                    item.future.set_result(probabilities[index])
+
+    def _record_batch(self, batch: List[_PendingItem], started: float, finished: float):
+        """Update batch-size and timing statistics"""
+        size = len(batch)
+        self._batches += 1
+        self._items += size
+        self._batch_size_counts[size] = self._batch_size_counts.get(size, 0) + 1
+        self._forward_time_total += finished - started
+        self._wait_time_total += sum(started - item.enqueued_at for item in batch)
+        BATCH_SIZE.observe(size, model=self.name)
+
+        # Charge the queue wait and the forward pass once to each request in
+        # the batch (a batch request may have several images in one pass)
+        charged = set()
+        for item in batch:
+            if item.timings is None or id(item.timings) in charged:
+                continue
+            charged.add(id(item.timings))
+            item.timings.add("batch_wait", started - item.enqueued_at)
+            item.timings.add("forward", finished - started)
+
+    def warm_up(self, runs: int) -> int:
+        """
+        Run dummy batches synchronously before serving traffic. The last run
+        uses a full batch so the allocator reaches its steady-state size.
+        """
+        import numpy as np
+
+        size = self._normalizer.size
+        blank = np.zeros((size, size, 3), dtype=np.uint8)
+        for index in range(runs):
+            batch_size = self.max_batch_size if index == runs - 1 else 1
+            self._forward_batch([blank] * batch_size)
+        return runs
+
+    def queue_depth(self) -> int:
+        """Number of requests currently waiting to be batched"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> Dict:
+        """Queue depth and batch-size statistics for tuning the window"""
+        return {
+            "name": self.name,
+            "window_ms": self.window * 1000.0,
+            "max_batch_size": self.max_batch_size,
+            "queue_depth": self.queue_depth(),
+            "max_queue_depth": self._max_queue_depth,
+            "batches": self._batches,
+            "items": self._items,
+            "mean_batch_size": (self._items / self._batches) if self._batches else 0.0,
+            "batch_size_counts": {str(k): v for k, v in sorted(self._batch_size_counts.items())},
+            "mean_forward_ms": (self._forward_time_total / self._batches * 1000.0) if self._batches else 0.0,
+            "mean_queue_wait_ms": (self._wait_time_total / self._items * 1000.0) if self._items else 0.0,
+        }
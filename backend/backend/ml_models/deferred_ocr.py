@@ -0,0 +1,135 @@
+"""
+Deferred OCR
+Images of confidently classified scans whose OCR was skipped, kept so the
+extracted text can still be produced if the client asks for it
+(GET /api/v1/medicine/scan/{scan_id}/text)
+
+The store holds the grayscale image OCR runs on (``prepare_ocr_image``:
+at most OCR_MAX_SIZE on the long side, a third of the RGB size) and is
+bounded by both entry count and bytes.
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from PIL import Image
+
+# Skip OCR when the classifier's confidence is at least this (0 = always OCR)
+OCR_SKIP_CONFIDENCE = float(os.environ.get("OCR_SKIP_CONFIDENCE", "0"))
+# Skipped scans kept for a later text request
+OCR_DEFERRED_SIZE = int(os.environ.get("OCR_DEFERRED_SIZE", "64"))
+# Bytes of grayscale images held for those scans (about 3 MB for a 2000x1500 photo)
+OCR_DEFERRED_MAX_BYTES = int(os.environ.get("OCR_DEFERRED_MAX_BYTES", str(32 * 1024 * 1024)))
+OCR_DEFERRED_TTL_SECONDS = float(os.environ.get("OCR_DEFERRED_TTL_SECONDS", "600"))
+
+OcrResult = Tuple[str, Optional[str]]
+
+
+class DeferredTextStore:
+    """
+    LRU store of scans waiting for OCR, keyed by scan ID.
+
+    OCR runs on the first request for a scan's text; concurrent requests for
+    the same scan share that run, and later ones get the stored text. The
+    image is dropped once its text is known, and expired entries are purged
+    whenever a scan is added. Used from the event loop only, so it needs no
+    locking.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = OCR_DEFERRED_SIZE,
+        max_bytes: int = OCR_DEFERRED_MAX_BYTES,
+        ttl_seconds: float = OCR_DEFERRED_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        # scan_id -> [expires_at, image or None, task or None, image bytes]
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self._bytes = 0
+
+        self.deferred = 0
+        self.fetched = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def add(self, image: Image.Image) -> Optional[str]:
+        """
+        Keep an OCR-ready (``prepare_ocr_image``) image for later OCR; returns
+        its scan ID, or None if the store is disabled or the image alone is
+        larger than ``max_bytes`` (the caller runs OCR right away then).
+        """
+        size = image.size[0] * image.size[1] * len(image.getbands())
+        if self.max_entries == 0 or size > self.max_bytes:
+            return None
+        now = self._clock()
+        self._purge_expired(now)
+        scan_id = uuid.uuid4().hex
+        self._entries[scan_id] = [now + self.ttl_seconds, image, None, size]
+        self._bytes += size
+        self.deferred += 1
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, entry = self._entries.popitem(last=False)
+            self._drop_image(entry)
+            self.evictions += 1
+        return scan_id
+
+    def contains(self, scan_id: str) -> bool:
+        """Whether the text of ``scan_id`` can still be requested"""
+        entry = self._entries.get(scan_id)
+        return entry is not None and self._clock() < entry[0]
+
+    def _purge_expired(self, now: float):
+        # At most max_entries entries; their order is by last use, not by expiry
+        for scan_id in [scan_id for scan_id, entry in self._entries.items() if now >= entry[0]]:
+            self._drop_image(self._entries.pop(scan_id))
+            self.expirations += 1
+
+    def _drop_image(self, entry: list):
+        self._bytes -= entry[3]
+        entry[1] = None
+        entry[3] = 0
+
+    async def text(self, scan_id: str, ocr: Callable[[Image.Image], Awaitable[OcrResult]]) -> Optional[OcrResult]:
+        """
+        (text, error) of a stored scan, running ``ocr`` on its image the first
+        time. None if the scan ID is unknown or expired.
+        """
+        entry = self._entries.get(scan_id)
+        if entry is None:
+            return None
+        if self._clock() >= entry[0]:
+            self._drop_image(self._entries.pop(scan_id))
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(scan_id)
+
+        if entry[2] is None:
+            entry[2] = asyncio.ensure_future(ocr(entry[1]))
+            self.fetched += 1
+        task = entry[2]
+        # Shielded: a client disconnecting must not cancel the run other requests wait on
+        result = await asyncio.shield(task)
+        self._drop_image(entry)
+        return result
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "skip_confidence": OCR_SKIP_CONFIDENCE,
+            "deferred": self.deferred,
+            "fetched": self.fetched,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -0,0 +1,148 @@
+"""
+Fuzzy Name Index
+Finds medicine aliases that an OCR text contains with reading errors
+("Paracetam0l", "lbuprofen", "Ibuprofcn")
+
+Aliases and OCR words are first normalized so that characters Tesseract
+commonly confuses compare equal (0/o, 1/l/i, 5/s, rn/m, ...). What remains
+is matched within one edit (substitution, insertion, deletion or swap of
+neighbours) with a symmetric-delete index: every alias is stored under
+itself and each of its one-character deletions, so a word's candidates are
+the aliases sharing one of its own deletions. A search costs a fixed number
+of lookups per word and one vectorized ``searchsorted``, independent of the
+catalog size.
+"""
+
+import os
+import re
+from typing import Dict, Generic, Iterable, List, Tuple, TypeVar
+
+import numpy as np
+
+T = TypeVar("T")
+
+# Smallest similarity (1 - edits / length) for a fuzzy alias match
+MEDICINE_FUZZY_THRESHOLD = float(os.environ.get("MEDICINE_FUZZY_THRESHOLD", "0.8"))
+
+# Shortest normalized word (or alias) considered; shorter ones match too much
+MIN_NAME_LENGTH = 4
+# Characters OCR confuses, mapped to one representative
+_CONFUSABLE = str.maketrans({"0": "o", "1": "l", "i": "l", "|": "l", "!": "l", "5": "s", "8": "b", "2": "z"})
+_CONFUSABLE_PAIRS = (("rn", "m"), ("vv", "w"))
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, merge OCR-confusable characters and drop everything but letters and digits"""
+    text = text.lower().translate(_CONFUSABLE)
+    for pair, replacement in _CONFUSABLE_PAIRS:
+        text = text.replace(pair, replacement)
+    return _NON_ALNUM.sub("", text)
+
+
+def deletion_variants(word: str) -> set:
+    """The word and all its one-character deletions (the symmetric-delete keys)"""
+    return {word} | {word[:index] + word[index + 1:] for index in range(len(word))}
+
+
+def edit_distance(first: str, second: str) -> int:
+    """Levenshtein distance, counting a swap of neighbouring characters as one edit"""
+    previous2, previous = None, list(range(len(second) + 1))
+    for i, char in enumerate(first, 1):
+        current = [i]
+        for j, other in enumerate(second, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != other))
+            if i > 1 and j > 1 and char == second[j - 2] and first[i - 2] == other:
+                cost = min(cost, previous2[j - 2] + 1)
+            current.append(cost)
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def similarity(word: str, alias: str) -> float:
+    """1 - edits / length of two normalized strings"""
+    return 1.0 - edit_distance(word, alias) / max(len(word), len(alias))
+
+
+def rank(best: Dict[int, float], limit: int) -> List[Tuple[int, float]]:
+    """(alias ID, similarity) best first, ties by alias ID (catalog order)"""
+    return sorted(best.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+def candidate_words(text: str) -> List[str]:
+    """
+    Normalized words of an OCR text, plus each pair of neighbouring words
+    joined (OCR splits words, and multi-word aliases are indexed without spaces)
+    """
+    words = [normalize(word) for word in text.split() if re.search(r"[^\W\d_]", word)]
+    joined = [first + second for first, second in zip(words, words[1:])]
+    return [word for word in dict.fromkeys(words + joined) if len(word) >= MIN_NAME_LENGTH]
+
+
+class FuzzyNameIndex(Generic[T]):
+    """
+    Symmetric-delete index over (alias, value) pairs, built once.
+
+    Keys are 64-bit hashes of the normalized aliases and their deletions,
+    kept in one sorted numpy array (12 bytes per key with the owning alias)
+    rather than a dict of strings. ``search`` returns the aliases within
+    one edit of some word of a text, best first.
+    """
+
+    def __init__(self, aliases: Iterable[Tuple[str, T]], threshold: float = MEDICINE_FUZZY_THRESHOLD):
+        self.threshold = threshold
+        self._aliases: List[str] = []
+        self._normalized: List[str] = []
+        self._values: List[T] = []
+        keys: List[int] = []
+        owners: List[int] = []
+        for alias, value in aliases:
+            normalized = normalize(alias)
+            if len(normalized) < MIN_NAME_LENGTH:
+                continue
+            index = len(self._aliases)
+            variants = deletion_variants(normalized)
+            keys.extend(hash(variant) for variant in variants)
+            owners.extend([index] * len(variants))
+            self._aliases.append(alias)
+            self._normalized.append(normalized)
+            self._values.append(value)
+
+        keys = np.array(keys, dtype=np.int64)
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._owners = np.array(owners, dtype=np.int32)[order]
+
+    def search(self, text: str, limit: int = 5) -> List[Tuple[str, T, float]]:
+        """
+        (alias, value, similarity) of the aliases within one edit of a word of
+        ``text`` whose similarity reaches the threshold, best first (ties in
+        the order the aliases were given)
+        """
+        words = candidate_words(text)
+        if not words or not self._aliases:
+            return []
+        variants = [deletion_variants(word) for word in words]
+        query = np.array([hash(variant) for group in variants for variant in group], dtype=np.int64)
+        # Query key -> index of the word it came from
+        word_of = np.repeat(np.arange(len(words)), [len(group) for group in variants])
+
+        starts = np.searchsorted(self._keys, query, side="left")
+        ends = np.searchsorted(self._keys, query, side="right")
+        best: Dict[int, float] = {}
+        checked = set()
+        for hit in np.nonzero(ends > starts)[0].tolist():
+            word = words[word_of[hit]]
+            for alias_id in self._owners[starts[hit]:ends[hit]].tolist():
+                if (word, alias_id) in checked:
+                    continue
+                checked.add((word, alias_id))
+                # Sharing a deletion allows up to two edits (and hashes can collide),
+                # so the distance is measured for every candidate
+                score = similarity(word, self._normalized[alias_id])
+                if score >= self.threshold and score > best.get(alias_id, 0.0):
+                    best[alias_id] = score
+        return [(self._aliases[alias_id], self._values[alias_id], score) for alias_id, score in rank(best, limit)]
+
+    def stats(self) -> Dict:
+        return {"aliases": len(self._aliases), "keys": len(self._keys), "threshold": self.threshold}
@@ -0,0 +1,68 @@
+"""
+Image Statistics
+Color statistics of a preprocessed image, shared by the rule-based analyzers
+(skin, eye, tongue, nail)
+
+Every statistic the rules use is computed in one pass over the image:
+each channel is widened to int32 once, sums and sums of squares are
+accumulated in integers (exact for any image size the analyzers see), and
+only the per-pixel channel spread needs a float32 square root. This
+replaces per-rule float64 reductions that each allocated full-size
+temporaries (``np.mean(image, axis=2)``, ``np.std(image, axis=2)``).
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+
+class ImageStats(NamedTuple):
+    red_mean: float
+    green_mean: float
+    blue_mean: float
+    # Of the grayscale image, gray = (R + G + B) / 3 per pixel
+    gray_mean: float
+    gray_std: float
+    # Mean over pixels of the standard deviation of their R, G and B values
+    color_variance: float
+
+
+def image_stats(image: np.ndarray) -> ImageStats:
+    """
+    Statistics of a uint8 RGB array of shape (height, width, 3), as
+    ``prepare_image`` returns it
+    """
+    count = image.shape[0] * image.shape[1]
+    red = image[:, :, 0].astype(np.int32)
+    green = image[:, :, 1].astype(np.int32)
+    blue = image[:, :, 2].astype(np.int32)
+    red_sum, green_sum, blue_sum = int(red.sum()), int(green.sum()), int(blue.sum())
+
+    # Gray mean and std from sum(R + G + B) and sum((R + G + B)^2)
+    work = red + green
+    work += blue
+    work *= work
+    gray_mean = (red_sum + green_sum + blue_sum) / (3 * count)
+    gray_variance = int(work.sum(dtype=np.int64)) / (9 * count) - gray_mean * gray_mean
+
+    # 9 x the variance of a pixel's channels is (R-G)^2 + (R-B)^2 + (G-B)^2;
+    # the channel planes are overwritten once they are no longer needed
+    np.subtract(red, green, out=work)
+    work *= work
+    np.subtract(red, blue, out=red)
+    red *= red
+    work += red
+    np.subtract(green, blue, out=green)
+    green *= green
+    work += green
+    spread = np.sqrt(work, dtype=np.float32, out=blue.view(np.float32))
+    color_variance = float(spread.sum(dtype=np.float64)) / (3 * count)
+
+    return ImageStats(
+        red_mean=red_sum / count,
+        green_mean=green_sum / count,
+        blue_mean=blue_sum / count,
+        gray_mean=gray_mean,
+        gray_std=float(np.sqrt(max(gray_variance, 0.0))),
+        color_variance=color_variance,
+    )
@@ -3,15 +3,29 @@ Medicine Scanner ML Model
 Identifies medicines from package images using trained CNN model and OCR
 """
 
+import asyncio
 import os
 import numpy as np
 from PIL import Image
 import pytesseract
 from typing import Dict, Optional, List
-import re
-import json
 import shutil
 
+from ml_models.batching import BatchingScheduler
+from ml_models.deferred_ocr import OCR_SKIP_CONFIDENCE, DeferredTextStore
+from ml_models.ocr_pool import OCR_CONFIG, OCR_ENGINE, clean_text, get_ocr_pool, prepare_ocr_image, tesserocr_available
+from ml_models.perceptual_hash import PerceptualHashIndex, dhash
+from ml_models.preprocessing import prepare_image
+from ml_models.text_regions import OCR_TEXT_REGIONS, crop_text_regions
+from ml_models.backends import load_classifier, variant_path
+from services.execution import get_execution_layer
+from services.medicine_catalog import load_medicine_catalog
+from services.metrics import CACHE_LOOKUPS, FALLBACKS, stage
+from services.result_cache import file_fingerprint
+from services.structured_log import get_logger
+
+logger = get_logger(__name__)
+
 # If Tesseract is installed but not on PATH, set it explicitly via env.
 # Example: TESSERACT_CMD=C:/Program Files/Tesseract-OCR/tesseract.exe
 _tesseract_cmd = os.environ.get("TESSERACT_CMD")
@@ -25,8 +39,6 @@ if _tesseract_cmd:
 ML_AVAILABLE = False
 try:
     import torch
-    import torchvision.transforms as transforms
-    from torchvision import models
     # Test if torch actually works (DLL loading issue on Windows)
     _ = torch.device('cpu')
     ML_AVAILABLE = True
@@ -37,17 +49,54 @@ except (ImportError, OSError, RuntimeError) as e:
     print("To fix: Install Visual C++ Redistributables or reinstall PyTorch")
 
 
+def run_tesseract(image: Image.Image):
+    """
+    Extract text from a medicine package image with Tesseract, starting a
+    new tesseract process per image. Used with OCR_POOL_KIND=process, and by
+    the OCR threads when tesserocr is unavailable; otherwise the thread setup
+    sends images to the persistent workers in ``ocr_pool``.
+
+    Module-level so it can run in a thread or process pool.
+
+    Returns:
+        (text, error) - error is None when the configured OCR call succeeded
+    """
+    try:
+        # Resize if too large (keeping aspect ratio) and convert to grayscale
+        image = prepare_ocr_image(image)
+        text = pytesseract.image_to_string(image, lang='eng', config=OCR_CONFIG)
+        return clean_text(text), None
+    
+    except Exception as e:
+        # Try without config if config fails
+        try:
+            text = pytesseract.image_to_string(image, lang='eng')
+            return clean_text(text), str(e)
+        except Exception:
+            return "", str(e)
+
+
 class MedicineScannerModel:
     """Medicine identification model using trained CNN and OCR"""
     
+    MODEL_PATH = 'models/medicine_model_best.pth'
+    LABELS_PATH = 'models/medicine_labels.json'
+    
     def __init__(self):
         self.model_loaded = False
         self.model = None
         self.device = None
+        self.backend = "eager"
+        self.batcher: Optional[BatchingScheduler] = None
         self.label_mapping = {}
-        self.medicine_database = self._load_medicine_database()
+        # Catalog file (MEDICINE_CATALOG_PATH) if present, else the built-in medicines
+        self.catalog = load_medicine_catalog()
         self.ocr_available = self._check_ocr_available()
         self.last_ocr_error: Optional[str] = None
+        # Recent scans by perceptual hash; near-duplicates skip OCR entirely
+        self.scan_index = PerceptualHashIndex()
+        # Confident scans that skipped OCR; their text is produced on request
+        self.deferred_text = DeferredTextStore()
         
         # Try to load ML model if available
         if ML_AVAILABLE:
@@ -61,6 +110,10 @@ class MedicineScannerModel:
 
     def _check_ocr_available(self) -> bool:
         """Check whether Tesseract OCR is available on this machine."""
+        # 0) tesserocr links libtesseract directly and needs no executable
+        if OCR_ENGINE != "pytesseract" and tesserocr_available():
+            return True
+        
         # 1) If user configured a direct path, it must exist
         cmd = getattr(pytesseract.pytesseract, "tesseract_cmd", None)
         if cmd and isinstance(cmd, str) and cmd.strip():
@@ -84,36 +137,10 @@ class MedicineScannerModel:
             print(f"Details: {e}")
             return False
     
-    def _load_medicine_database(self) -> Dict:
-        """Load medicine database for matching"""
-        # This would typically load from a database or JSON file
-        # For now, return a sample database
-        return {
-            "paracetamol": {
-                "name": "Paracetamol",
-                "category": "Pain Reliever",
-                "uses": "Fever, pain relief",
-                "common_names": ["paracetamol", "acetaminophen", "tylenol"]
-            },
-            "ibuprofen": {
-                "name": "Ibuprofen",
-                "category": "NSAID",
-                "uses": "Inflammation, pain, fever",
-                "common_names": ["ibuprofen", "advil", "motrin"]
-            },
-            "amoxicillin": {
-                "name": "Amoxicillin",
-                "category": "Antibiotic",
-                "uses": "Bacterial infections",
-                "common_names": ["amoxicillin", "amoxil"]
-            },
-            # Add more medicines as needed
-        }
-    
     def _load_model(self):
         """Load trained medicine recognition model"""
-        model_path = 'models/medicine_model_best.pth'
-        labels_path = 'models/medicine_labels.json'
+        model_path = self.MODEL_PATH
+        labels_path = self.LABELS_PATH
         
         if not os.path.exists(model_path):
             print(f"Trained model not found at {model_path}. Using OCR-only mode.")
@@ -121,31 +148,15 @@ class MedicineScannerModel:
             return
         
         try:
-            # Load label mapping
-            if os.path.exists(labels_path):
-                with open(labels_path, 'r') as f:
-                    self.label_mapping = json.load(f)
-            
-            # Load model
-            checkpoint = torch.load(model_path, map_location=self.device)
-            
-            # Create model architecture
-            num_classes = len(self.label_mapping) if self.label_mapping else checkpoint.get('num_classes', 10)
-            self.model = models.resnet18(weights=None)
-            num_features = self.model.fc.in_features
-            self.model.fc = torch.nn.Linear(num_features, num_classes)
-            
-            # Load weights
-            if 'model_state_dict' in checkpoint:
-                self.model.load_state_dict(checkpoint['model_state_dict'])
-            else:
-                self.model.load_state_dict(checkpoint)
-            
-            self.model.to(self.device)
-            self.model.eval()
+            self.model, self.label_mapping, num_classes, self.backend = load_classifier(
+                model_path, labels_path, self.device
+            )
+            if self.backend in ("int8", "onnx"):
+                self.device = torch.device('cpu')
+            self.batcher = BatchingScheduler("medicine", self._forward)
             self.model_loaded = True
             
-            print(f"✓ Loaded medicine classification model with {num_classes} classes")
+            print(f"✓ Loaded medicine classification model with {num_classes} classes ({self.backend} backend)")
         except Exception as e:
             print(f"Error loading model: {e}. Using OCR-only mode.")
             self.model_loaded = False
@@ -154,20 +165,85 @@ class MedicineScannerModel:
         """Check if model is loaded"""
         return bool(self.model_loaded) or bool(self.ocr_available)
     
-    async def identify_medicine(self, image: Image.Image) -> Dict:
+    def checkpoint_version(self) -> str:
+        """Fingerprint of the checkpoint files on disk (changes after retraining)"""
+        return file_fingerprint(self.MODEL_PATH, self.LABELS_PATH, variant_path(self.MODEL_PATH, self.backend))
+    
+    def warm_up(self, runs: int) -> int:
+        """Run dummy inferences through the batch pipeline; returns the number run"""
+        if not (self.model_loaded and self.batcher):
+            return 0
+        return self.batcher.warm_up(runs)
+    
+    async def identify_many(self, images: List[Image.Image]) -> List[Dict]:
+        """
+        Identify several medicine images in one call.
+        
+        The classifier runs on all images in shared batched forward passes;
+        OCR and matching then proceed per image, concurrently. A failure only
+        affects its own item.
+        
+        Returns:
+            One result per image, in input order (same shape as ``identify_medicine``)
+        """
+        probabilities = [None] * len(images)
+        if ML_AVAILABLE and self.model_loaded and self.model is not None:
+            execution = get_execution_layer()
+            with stage("preprocess"):
+                prepared = await asyncio.gather(
+                    *(execution.run_tensor(prepare_image, image) for image in images),
+                    return_exceptions=True
+                )
+            ready = [index for index, item in enumerate(prepared) if not isinstance(item, BaseException)]
+            predictions = await self.batcher.submit_many([prepared[index] for index in ready], return_exceptions=True)
+            for index, prediction in zip(ready, predictions):
+                if isinstance(prediction, BaseException):
+                    logger.warning("ML prediction error: %s", prediction)
+                    FALLBACKS.inc(kind="medicine_ml_error")
+                else:
+                    probabilities[index] = prediction
+        
+        return list(await asyncio.gather(*(
+            self.identify_medicine(image, probabilities[index]) for index, image in enumerate(images)
+        )))
+    
+    async def identify_medicine(self, image: Image.Image, probabilities=None) -> Dict:
         """
         Identify medicine from image using trained CNN model
         
+        Args:
+            image: PIL Image
+            probabilities: Classifier output for this image from an earlier
+                batched forward pass (computed here when omitted)
+        
         Returns:
             {
                 "medicine_name": str,
                 "confidence": float,
                 "category": str,
                 "uses": str,
-                "extracted_text": str
+                "extracted_text": str,
+                "scan_id": str  # only when OCR was deferred (OCR_SKIP_CONFIDENCE)
             }
         """
         try:
+            # Step 0: Reuse the result of a recent scan of the same package
+            image_hash = None
+            if self.ocr_available and self.scan_index.capacity:
+                with stage("scan_index"):
+                    # Results of an older checkpoint are not reused
+                    self.scan_index.ensure_version(self.checkpoint_version())
+                    image_hash = await get_execution_layer().run_tensor(dhash, image)
+                    previous = self.scan_index.find(image_hash)
+                CACHE_LOOKUPS.inc(cache="scan_index", result="hit" if previous else "miss")
+                if previous:
+                    result, distance = previous
+                    logger.info(
+                        "Near-duplicate scan, reusing result",
+                        extra={"distance": distance, "medicine_name": result['medicine_name']}
+                    )
+                    return dict(self.replayable(result), near_duplicate=True)
+            
             medicine_name = "Unknown"
             confidence = 0.0
             method = "ocr"
@@ -175,36 +251,44 @@ class MedicineScannerModel:
             
             # Step 1: Use trained ML model if available (primary method)
             if ML_AVAILABLE and self.model_loaded and self.model is not None:
-                ml_result = await self._ml_predict(image)
+                if probabilities is not None:
+                    ml_result = self._prediction(probabilities)
+                else:
+                    ml_result = await self._ml_predict(image)
                 if ml_result:
                     medicine_name = ml_result['name']
                     confidence = ml_result['confidence']
                     method = "ml"
             
-            # Step 2: Fallback to OCR if ML didn't work or for text extraction
+            # Step 2: Fallback to OCR if ML didn't work or for text extraction.
+            # A confident classification doesn't need the text; keep the image
+            # so the text can be fetched later instead (never below 0.5, where
+            # the OCR match below needs the text).
             extracted_text = ""
-            if self.ocr_available:
-                extracted_text = self._extract_text(image)
-            else:
+            scan_id = None
+            if (self.ocr_available and method == "ml" and OCR_SKIP_CONFIDENCE > 0
+                    and confidence >= max(OCR_SKIP_CONFIDENCE, 0.5) and medicine_name != "Unknown"):
+                # Stored as the grayscale image OCR runs on, a third of the RGB size
+                ocr_image = await get_execution_layer().run_tensor(prepare_ocr_image, image)
+                scan_id = self.deferred_text.add(ocr_image)
+            if self.ocr_available and scan_id is None:
+                with stage("ocr"):
+                    extracted_text = await self._extract_text(image)
+                if not extracted_text:
+                    ocr_error = self.last_ocr_error or "OCR failed to extract any text from the image."
+            elif not self.ocr_available:
                 ocr_error = (
                     "Tesseract OCR is not installed/configured on the backend. "
                     "Install Tesseract and set TESSERACT_CMD if needed."
                 )
-            if self.ocr_available and (not extracted_text) and (not ocr_error):
-                ocr_error = self.last_ocr_error or "OCR failed to extract any text from the image."
             
-            # If ML model didn't provide good result, try OCR matching
-            if confidence < 0.5 or medicine_name == "Unknown":
-                medicine_info = self._match_medicine(extracted_text)
-                if medicine_info.get('confidence', 0) > confidence:
-                    medicine_name = medicine_info.get('name', 'Unknown')
-                    confidence = medicine_info.get('confidence', 0.0)
-                    method = "ocr" if method != "ml" else "ml+ocr"
-            
-            # Get medicine details from database
-            medicine_details = self._get_medicine_details(medicine_name)
+            # Catalog lookups (SQLite queries, edit-distance scans) run off the event loop
+            with stage("match"):
+                medicine_name, confidence, method, medicine_details = await get_execution_layer().run_tensor(
+                    self._resolve_medicine, medicine_name, confidence, method, extracted_text
+                )
             
-            return {
+            result = {
                 "medicine_name": medicine_name,
                 "confidence": confidence,
                 "category": medicine_details.get('category', 'Unknown'),
@@ -213,6 +297,13 @@ class MedicineScannerModel:
                 "method": method,
                 "error": ocr_error
             }
+            if scan_id is not None:
+                result["scan_id"] = scan_id
+            
+            if image_hash is not None and medicine_name not in ("Unknown", "Unknown Medicine") and confidence > 0:
+                self.scan_index.add(image_hash, result)
+            
+            return result
         
         except Exception as e:
             return {
@@ -224,45 +315,84 @@ class MedicineScannerModel:
                 "error": str(e)
             }
     
-    def _extract_text(self, image: Image.Image) -> str:
-        """Extract text from medicine package using OCR"""
-        try:
-            self.last_ocr_error = None
-            # Preprocess image for better OCR
-            # Resize if too large (but keep aspect ratio)
-            max_size = 2000
-            if max(image.size) > max_size:
-                ratio = max_size / max(image.size)
-                new_size = (int(image.size[0] * ratio), int(image.size[1] * ratio))
-                image = image.resize(new_size, Image.Resampling.LANCZOS)
-            
-            # Enhance image for better OCR
-            # Convert to grayscale
-            if image.mode != 'L':
-                gray_image = image.convert('L')
-            else:
-                gray_image = image
-            
-            # Extract text using Tesseract with better config
-            config = '--oem 3 --psm 6'  # OCR Engine Mode 3, Page Segmentation Mode 6
-            text = pytesseract.image_to_string(gray_image, lang='eng', config=config)
-            
-            # Clean up text
-            text = re.sub(r'\s+', ' ', text).strip()
-            
-            print(f"OCR extracted text: {text[:100]}...")  # Log first 100 chars
-            
-            return text
+    def replayable(self, result: Dict) -> Dict:
+        """
+        A stored result (result cache, near-duplicate index) as it can be
+        returned again: with its ``scan_id`` only while that scan's text can
+        still be fetched
+        """
+        scan_id = result.get("scan_id")
+        if scan_id is None or self.deferred_text.contains(scan_id):
+            return result
+        return {key: value for key, value in result.items() if key != "scan_id"}
+    
+    async def fetch_deferred_text(self, scan_id: str) -> Optional[Dict]:
+        """
+        Extracted text of a scan whose OCR was skipped (OCR runs now, once).
         
-        except Exception as e:
-            self.last_ocr_error = str(e)
-            print(f"OCR Error: {e}")
-            # Try without config if config fails
-            try:
-                text = pytesseract.image_to_string(image, lang='eng')
-                return re.sub(r'\s+', ' ', text).strip()
-            except:
-                return ""
+        Returns:
+            {"scan_id", "extracted_text", "error"}, or None for an unknown or expired scan ID
+        """
+        ocr_result = await self.deferred_text.text(scan_id, self._ocr)
+        if ocr_result is None:
+            return None
+        text, error = ocr_result
+        if not text and not error:
+            error = "OCR failed to extract any text from the image."
+        return {"scan_id": scan_id, "extracted_text": text, "error": error}
+    
+    async def _extract_text(self, image: Image.Image) -> str:
+        """Extract text from medicine package using OCR (runs in the OCR pool)"""
+        text, self.last_ocr_error = await self._ocr(image)
+        return text
+    
+    async def _ocr(self, image: Image.Image):
+        """
+        OCR an image; returns (text, error).
+        With OCR_TEXT_REGIONS, only the detected text regions are OCR'd, in parallel.
+        """
+        execution = get_execution_layer()
+        # Each OCR thread hands its image to a persistent worker process, unless the
+        # workers could only use pytesseract (which starts a tesseract process anyway)
+        ocr_pool = get_ocr_pool()
+        use_pool = execution.ocr_kind == "thread" and ocr_pool.keeps_engine_loaded()
+        ocr = ocr_pool.recognize if use_pool else run_tesseract
+        if OCR_TEXT_REGIONS:
+            crops, _ = await execution.run_tensor(crop_text_regions, image)
+        else:
+            crops = [image]
+        results = await asyncio.gather(*(execution.run_ocr(ocr, crop) for crop in crops))
+        
+        # Regions come in reading order
+        text = " ".join(part for part, _ in results if part)
+        error = next((error for _, error in results if error), None)
+        if error:
+            logger.warning("OCR error: %s", error)
+        else:
+            # First 100 characters, for one in every LOG_SAMPLE_EVERY scans
+            logger.info("OCR extracted text", extra={"sample": "ocr_text", "ocr_text": text[:100]})
+        return text, error
+    
+    def _resolve_medicine(self, medicine_name: str, confidence: float, method: str, extracted_text: str):
+        """
+        Final identification and its catalog details. Blocking (the catalog
+        may be the SQLite file); called through the execution layer.
+        
+        Returns:
+            (medicine_name, confidence, method, details)
+        """
+        # If ML model didn't provide good result, try OCR matching
+        if confidence < 0.5 or medicine_name == "Unknown":
+            medicine_info = self._match_medicine(extracted_text)
+            if medicine_info.get('confidence', 0) > confidence:
+                if method == "ml":
+                    FALLBACKS.inc(kind="medicine_ocr_match")
+                medicine_name = medicine_info.get('name', 'Unknown')
+                confidence = medicine_info.get('confidence', 0.0)
+                method = "ocr" if method != "ml" else "ml+ocr"
+        
+        # Get medicine details from database
+        return medicine_name, confidence, method, self._get_medicine_details(medicine_name)
     
     def _match_medicine(self, text: str) -> Dict:
         """Match extracted text to medicine database"""
@@ -270,20 +400,31 @@ class MedicineScannerModel:
         best_match = None
         best_confidence = 0.0
         
-        for medicine_id, medicine_data in self.medicine_database.items():
-            # Check if any common name appears in text
-            for name in medicine_data.get('common_names', []):
-                if name.lower() in text_lower:
-                    # Calculate confidence based on match quality
-                    confidence = min(0.9, len(name) / len(text_lower) * 2)
-                    if confidence > best_confidence:
-                        best_confidence = confidence
-                        best_match = {
-                            'name': medicine_data['name'],
-                            'category': medicine_data['category'],
-                            'uses': medicine_data['uses'],
-                            'confidence': confidence
-                        }
+        # Common names appearing in the text, in catalog order
+        for name, medicine_data in self.catalog.exact_matches(text_lower):
+            # Calculate confidence based on match quality
+            confidence = min(0.9, len(name) / len(text_lower) * 2)
+            if confidence > best_confidence:
+                best_confidence = confidence
+                best_match = {
+                    'name': medicine_data['name'],
+                    'category': medicine_data['category'],
+                    'uses': medicine_data['uses'],
+                    'confidence': confidence
+                }
+        
+        # Misread names ("Paracetam0l", "lbuprofen"): closest alias, with the
+        # confidence scaled by its similarity
+        if not best_match:
+            candidates = self.catalog.fuzzy_matches(text)
+            if candidates:
+                name, medicine_data, similarity = candidates[0]
+                best_match = {
+                    'name': medicine_data['name'],
+                    'category': medicine_data['category'],
+                    'uses': medicine_data['uses'],
+                    'confidence': min(0.9, len(name) / len(text_lower) * 2) * similarity
+                }
         
         # If no match found, try to extract medicine name from text
         if not best_match:
@@ -308,53 +449,51 @@ class MedicineScannerModel:
     async def _ml_predict(self, image: Image.Image) -> Optional[Dict]:
         """Use trained ML model to predict medicine"""
         try:
-            # Preprocess image
-            transform = transforms.Compose([
-                transforms.Resize((224, 224)),
-                transforms.ToTensor(),
-                transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-            ])
+            # Resize once; normalization happens in the batcher's buffer
+            with stage("preprocess"):
+                prepared = await get_execution_layer().run_tensor(prepare_image, image)
             
-            # Convert PIL to tensor
-            img_tensor = transform(image).unsqueeze(0).to(self.device)
-            
-            # Predict
-            with torch.no_grad():
-                outputs = self.model(img_tensor)
-                probabilities = torch.nn.functional.softmax(outputs[0], dim=0)
-                confidence, predicted_idx = torch.max(probabilities, 0)
-                
-                confidence = confidence.item()
-                predicted_idx = predicted_idx.item()
-                
-                # Get medicine name from label mapping
-                if self.label_mapping and str(predicted_idx) in self.label_mapping:
-                    medicine_name = self.label_mapping[str(predicted_idx)]
-                elif predicted_idx < len(self.label_mapping):
-                    medicine_name = list(self.label_mapping.values())[predicted_idx]
-                else:
-                    medicine_name = "Unknown"
-                
-                return {
-                    "name": medicine_name,
-                    "confidence": confidence
-                }
+            # Predict (batched with concurrent requests)
+            probabilities = await self.batcher.submit(prepared)
+            return self._prediction(probabilities)
         except Exception as e:
-            print(f"ML prediction error: {e}")
+            logger.warning("ML prediction error: %s", e)
+            FALLBACKS.inc(kind="medicine_ml_error")
             return None
     
-    def _get_medicine_details(self, medicine_name: str) -> Dict:
-        """Get medicine details from database"""
-        medicine_lower = medicine_name.lower()
+    def _prediction(self, probabilities) -> Dict:
+        """Top medicine and its confidence from one row of softmax probabilities"""
+        confidence, predicted_idx = torch.max(probabilities, 0)
         
-        # Search in database
-        for med_id, med_data in self.medicine_database.items():
-            if medicine_lower in med_id.lower() or any(
-                medicine_lower in name.lower() for name in med_data.get('common_names', [])
-            ):
-                return {
-                    "category": med_data.get('category', 'Unknown'),
-                    "uses": med_data.get('uses', 'Unknown')
-                }
+        confidence = confidence.item()
+        predicted_idx = predicted_idx.item()
+        
+        # Get medicine name from label mapping
+        if self.label_mapping and str(predicted_idx) in self.label_mapping:
+            medicine_name = self.label_mapping[str(predicted_idx)]
+        elif predicted_idx < len(self.label_mapping):
+            medicine_name = list(self.label_mapping.values())[predicted_idx]
+        else:
+            medicine_name = "Unknown"
+        
+        return {
+            "name": medicine_name,
+            "confidence": confidence
+        }
+    
+    def _forward(self, batch):
+        """Run one batched forward pass and return per-image softmax probabilities"""
+        with torch.no_grad():
+            outputs = self.model(batch.to(self.device))
+            return torch.nn.functional.softmax(outputs, dim=1).cpu()
+    
+    def _get_medicine_details(self, medicine_name: str) -> Dict:
+        """Get medicine details from the catalog"""
+        med_data = self.catalog.details(medicine_name)
+        if med_data:
+            return {
+                "category": med_data.get('category', 'Unknown'),
+                "uses": med_data.get('uses', 'Unknown')
+            }
         
         return {"category": "Unknown", "uses": "Unknown"}
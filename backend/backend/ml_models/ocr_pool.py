@@ -0,0 +1,392 @@
+"""
+Persistent OCR Worker Pool
+Long-lived OCR worker processes that load the Tesseract engine once, instead
+of starting a new ``tesseract`` process (and reloading its language model)
+for every image
+
+Each worker receives grayscale pixels over a pipe and sends back the text.
+Jobs that exceed the timeout get their worker killed and replaced.
+With ``tesserocr`` installed, the engine stays loaded in the worker between
+jobs. Without it the workers could only call pytesseract, which still starts
+one tesseract process per image, so the app skips the pool (see
+``keeps_engine_loaded``) and OCR threads call pytesseract directly.
+"""
+
+import multiprocessing
+import os
+import queue
+import re
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+# Worker processes; also the number of concurrent OCR jobs
+OCR_WORKERS = int(os.environ.get("OCR_WORKERS", os.environ.get("OCR_POOL_SIZE", "2")))
+# Seconds before a job's worker is killed and replaced
+OCR_TIMEOUT_SECONDS = float(os.environ.get("OCR_TIMEOUT_SECONDS", "30"))
+# "auto" (tesserocr if installed, else pytesseract), "tesserocr" or "pytesseract"
+OCR_ENGINE = os.environ.get("OCR_ENGINE", "auto").lower()
+
+OCR_LANGUAGE = "eng"
+# OCR Engine Mode 3 (default), Page Segmentation Mode 6 (single uniform block)
+OCR_CONFIG = "--oem 3 --psm 6"
+OCR_MAX_SIZE = 2000
+
+# Seconds to wait for a new worker to load its engine
+_START_TIMEOUT_SECONDS = 60.0
+# Extra seconds before a stuck worker is killed, so that pytesseract can first
+# stop its own tesseract process and answer with a timeout error
+_KILL_GRACE_SECONDS = 1.0
+# Workers are started with subprocess where file descriptors can be passed (see _Worker)
+_EXEC_WORKERS = os.name == "posix"
+_WORKER_SCRIPT = "import sys; from ml_models.ocr_pool import _worker_entry; _worker_entry(*sys.argv[1:])"
+# Directory that contains the ml_models package
+_PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def prepare_ocr_image(image: Image.Image) -> Image.Image:
+    """Downscale to at most ``OCR_MAX_SIZE`` (keeping aspect ratio) and convert to grayscale"""
+    if max(image.size) > OCR_MAX_SIZE:
+        ratio = OCR_MAX_SIZE / max(image.size)
+        new_size = (int(image.size[0] * ratio), int(image.size[1] * ratio))
+        image = image.resize(new_size, Image.Resampling.LANCZOS)
+    return image if image.mode == 'L' else image.convert('L')
+
+
+def clean_text(text: str) -> str:
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def tesserocr_available() -> bool:
+    try:
+        import tesserocr  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _load_engine(engine: str, timeout: float):
+    """Load the OCR engine in a worker; returns (name, recognize(image) -> (text, error))"""
+    if engine in ("auto", "tesserocr"):
+        try:
+            import tesserocr
+        except ImportError:
+            if engine == "tesserocr":
+                raise
+        else:
+            try:
+                # Created once per worker: the language model stays loaded between jobs
+                api = tesserocr.PyTessBaseAPI(
+                    lang=OCR_LANGUAGE, psm=tesserocr.PSM.SINGLE_BLOCK, oem=tesserocr.OEM.DEFAULT
+                )
+            except RuntimeError:
+                # e.g. tessdata not found by tesserocr's bundled library
+                if engine == "tesserocr":
+                    raise
+            else:
+                def recognize_tesserocr(image: Image.Image):
+                    api.SetImage(image)
+                    return clean_text(api.GetUTF8Text()), None
+
+                return "tesserocr", recognize_tesserocr
+
+    import pytesseract
+
+    if os.environ.get("TESSERACT_CMD"):
+        pytesseract.pytesseract.tesseract_cmd = os.environ["TESSERACT_CMD"]
+
+    def recognize_pytesseract(image: Image.Image):
+        try:
+            text = pytesseract.image_to_string(image, lang=OCR_LANGUAGE, config=OCR_CONFIG, timeout=timeout)
+            return clean_text(text), None
+        except RuntimeError as e:
+            # pytesseract's own timeout
+            return "", str(e)
+        except Exception as e:
+            # Try without config if config fails
+            try:
+                text = pytesseract.image_to_string(image, lang=OCR_LANGUAGE, timeout=timeout)
+                return clean_text(text), str(e)
+            except Exception:
+                return "", str(e)
+
+    return "pytesseract", recognize_pytesseract
+
+
+def _worker_main(conn, engine: str, timeout: float):
+    """
+    Worker process loop: load the engine, report ready, then answer jobs.
+    A job is a (width, height) header followed by the grayscale pixels.
+    """
+    try:
+        name, recognize = _load_engine(engine, timeout)
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+        return
+    conn.send(("ready", name))
+
+    while True:
+        try:
+            size = conn.recv()
+            pixels = conn.recv_bytes()
+        except (EOFError, OSError):
+            return
+        try:
+            result = recognize(Image.frombytes('L', size, pixels))
+        except Exception as e:
+            result = ("", str(e))
+        conn.send(result)
+
+
+def _worker_entry(fd: str, engine: str, timeout: str):
+    """Entry point of a worker started by ``subprocess``; ``fd`` is its end of the pipe"""
+    from multiprocessing.connection import Connection
+    _worker_main(Connection(int(fd)), engine, float(timeout))
+
+
+class _Worker:
+    """
+    One OCR process and the parent's end of its pipe.
+
+    The app process is multi-threaded (worker pools, log writer, remedy watcher)
+    and has torch loaded, so a forked child could inherit a lock held by another
+    thread. On POSIX the worker is therefore a fresh interpreter started by
+    ``subprocess`` (fork and exec happen in C) that imports only this module.
+    A multiprocessing fork server or spawn would be safe too, but its children
+    re-run the parent's ``__main__``: under ``python main.py`` that imports the
+    whole app and torch into every worker (about 500 MB each instead of 30 MB).
+    Windows has no ``pass_fds`` and uses multiprocessing's spawn.
+    """
+
+    __slots__ = ("process", "conn", "engine", "jobs")
+
+    def __init__(self, engine: str, timeout: float):
+        if _EXEC_WORKERS:
+            self.conn, child_conn = multiprocessing.Pipe()
+            self.process = subprocess.Popen(
+                [sys.executable, "-c", _WORKER_SCRIPT, str(child_conn.fileno()), engine, repr(timeout)],
+                pass_fds=(child_conn.fileno(),),
+                stdin=subprocess.DEVNULL,
+                env=_worker_env(),
+            )
+        else:
+            context = multiprocessing.get_context("spawn")
+            self.conn, child_conn = context.Pipe()
+            self.process = context.Process(target=_worker_main, args=(child_conn, engine, timeout), daemon=True)
+            self.process.start()
+        child_conn.close()
+        self.engine = None
+        self.jobs = 0
+
+    def wait_ready(self, timeout: float):
+        if not self.conn.poll(timeout):
+            self.kill()
+            raise RuntimeError(f"OCR worker did not start within {timeout:.0f}s")
+        try:
+            status, detail = self.conn.recv()
+        except (EOFError, OSError) as e:
+            self.kill()
+            raise RuntimeError(f"OCR worker exited during start-up: {e!r}")
+        if status != "ready":
+            self.kill()
+            raise RuntimeError(f"OCR worker failed to start: {detail}")
+        self.engine = detail
+
+    def alive(self) -> bool:
+        if _EXEC_WORKERS:
+            return self.process.poll() is None
+        return self.process.is_alive()
+
+    def kill(self):
+        try:
+            self.process.kill()
+            if _EXEC_WORKERS:
+                self.process.wait(timeout=5)
+            else:
+                self.process.join(timeout=5)
+        except (OSError, ValueError, AssertionError, subprocess.TimeoutExpired):
+            pass
+        self.conn.close()
+
+
+def _worker_env() -> Dict[str, str]:
+    """The app's environment, with this package importable from any working directory"""
+    paths = [_PACKAGE_ROOT] + [path for path in os.environ.get("PYTHONPATH", "").split(os.pathsep) if path]
+    return dict(os.environ, PYTHONPATH=os.pathsep.join(paths))
+
+
+class OcrWorkerPool:
+    """
+    Fixed number of persistent OCR processes.
+
+    ``recognize`` blocks until a worker is free and its job finishes, so it is
+    meant to be called from the execution layer's OCR threads (one thread per
+    worker keeps every worker busy).
+    """
+
+    def __init__(
+        self,
+        workers: int = OCR_WORKERS,
+        timeout: float = OCR_TIMEOUT_SECONDS,
+        engine: str = OCR_ENGINE,
+    ):
+        if engine not in ("auto", "tesserocr", "pytesseract"):
+            raise ValueError(f"OCR_ENGINE must be 'auto', 'tesserocr' or 'pytesseract', got {engine!r}")
+        self.size = max(1, int(workers))
+        self.timeout = timeout
+        self.engine = engine
+        self._idle: "queue.Queue[Optional[_Worker]]" = queue.Queue()
+        self._started = False
+        self._lock = threading.Lock()
+        self._start_error: Optional[str] = None
+
+        # Statistics
+        self._jobs = 0
+        self._timeouts = 0
+        self._restarts = 0
+        self._busy_time_total = 0.0
+        self._engine_name: Optional[str] = None
+
+    def start(self):
+        """Start every worker and wait until each has loaded its engine (idempotent)"""
+        with self._lock:
+            if self._started:
+                return
+            workers = [_Worker(self.engine, self.timeout) for _ in range(self.size)]
+            try:
+                for worker in workers:
+                    worker.wait_ready(_START_TIMEOUT_SECONDS)
+            except RuntimeError as e:
+                for worker in workers:
+                    worker.kill()
+                self._start_error = str(e)
+                raise
+            self._start_error = None
+            self._engine_name = workers[0].engine
+            for worker in workers:
+                self._idle.put(worker)
+            self._started = True
+
+    def keeps_engine_loaded(self) -> bool:
+        """
+        Whether the workers keep Tesseract loaded between images (tesserocr).
+        Before ``start`` this is predicted from the engine setting; afterwards it
+        reflects the engine the workers actually loaded.
+        """
+        if self._engine_name is not None:
+            return self._engine_name == "tesserocr"
+        return self.engine != "pytesseract" and tesserocr_available()
+
+    def recognize(self, image: Image.Image) -> Tuple[str, Optional[str]]:
+        """
+        OCR one image in a worker process.
+
+        Returns:
+            (text, error) - same contract as ``run_tesseract``
+        """
+        if not self._started:
+            if self._start_error:
+                # Don't spawn a new set of workers for every request
+                return "", self._start_error
+            try:
+                self.start()
+            except RuntimeError as e:
+                return "", str(e)
+
+        gray = prepare_ocr_image(image)
+        worker = self._idle.get()
+        started = time.perf_counter()
+        try:
+            if worker is None or not worker.alive():
+                worker = self._replace(worker)
+            worker.conn.send(gray.size)
+            worker.conn.send_bytes(gray.tobytes())
+            if not worker.conn.poll(self.timeout + _KILL_GRACE_SECONDS):
+                self._timeouts += 1
+                worker = self._replace(worker)
+                return "", f"OCR timed out after {self.timeout:.0f}s"
+            worker.jobs += 1
+            return worker.conn.recv()
+        except (EOFError, OSError, RuntimeError) as e:
+            # The worker died mid-job (or could not be replaced); the next job starts a fresh one
+            if worker is not None:
+                worker.kill()
+            worker = None
+            return "", f"OCR worker failed: {e}"
+        finally:
+            self._jobs += 1
+            self._busy_time_total += time.perf_counter() - started
+            self._idle.put(worker)
+
+    def _replace(self, worker: Optional[_Worker]) -> _Worker:
+        """Kill a stuck or dead worker and start its replacement"""
+        if worker is not None:
+            worker.kill()
+        self._restarts += 1
+        replacement = _Worker(self.engine, self.timeout)
+        replacement.wait_ready(_START_TIMEOUT_SECONDS)
+        return replacement
+
+    def shutdown(self):
+        """Stop every worker; they are started again on next use"""
+        with self._lock:
+            if not self._started:
+                return
+            self._started = False
+            while True:
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if worker is not None:
+                    worker.kill()
+
+    def reset_after_fork(self):
+        """
+        Forget workers inherited from a parent process. Their pipes belong to
+        the parent; this process starts its own workers on next use.
+        """
+        self._idle = queue.Queue()
+        self._started = False
+        self._lock = threading.Lock()
+        self._start_error = None
+
+    def stats(self) -> Dict:
+        return {
+            "engine": self._engine_name or self.engine,
+            "keeps_engine_loaded": self.keeps_engine_loaded(),
+            "workers": self.size,
+            "started": self._started,
+            "start_error": self._start_error,
+            "idle": self._idle.qsize() if self._started else 0,
+            "timeout_seconds": self.timeout,
+            "jobs": self._jobs,
+            "timeouts": self._timeouts,
+            "restarts": self._restarts,
+            "mean_job_ms": (self._busy_time_total / self._jobs * 1000.0) if self._jobs else 0.0,
+        }
+
+
+_ocr_pool: Optional[OcrWorkerPool] = None
+
+
+def get_ocr_pool() -> OcrWorkerPool:
+    """Return the process-wide OCR worker pool (created on first use, workers started lazily)"""
+    global _ocr_pool
+    if _ocr_pool is None:
+        _ocr_pool = OcrWorkerPool()
+    return _ocr_pool
+
+
+def _reset_ocr_pool_after_fork():
+    if _ocr_pool is not None:
+        _ocr_pool.reset_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    # Pre-fork servers (serve.py) fork workers after the models were loaded
+    os.register_at_fork(after_in_child=_reset_ocr_pool_after_fork)
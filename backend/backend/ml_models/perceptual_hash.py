@@ -0,0 +1,109 @@
+"""
+Perceptual Hash Index
+dHash fingerprints of recent medicine scans, so re-photographs of the same
+package (different angle or lighting) reuse the earlier identification
+"""
+
+import os
+import numpy as np
+from PIL import Image
+from typing import Dict, Optional, Tuple
+
+# Maximum Hamming distance (out of 64 bits) for two scans to count as the same
+# package. A hit skips the classifier and OCR, so this stays tight: at 10 or
+# more, different boxes photographed the same way can collide
+PHASH_THRESHOLD = int(os.environ.get("MEDICINE_PHASH_THRESHOLD", "5"))
+# Number of recent scans kept in the index
+PHASH_CAPACITY = int(os.environ.get("MEDICINE_PHASH_CAPACITY", "512"))
+
+_HASH_SIZE = 8
+
+
+def dhash(image: Image.Image) -> int:
+    """
+    64-bit difference hash: compares horizontally adjacent pixels of a 9x8
+    grayscale thumbnail. Robust to scaling, mild crops and brightness changes.
+    """
+    thumbnail = image.convert('L').resize((_HASH_SIZE + 1, _HASH_SIZE), Image.Resampling.BILINEAR)
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+class PerceptualHashIndex:
+    """
+    Fixed-capacity ring buffer of (hash, result) pairs with a vectorized
+    nearest-neighbour lookup by Hamming distance.
+    """
+
+    def __init__(self, capacity: int = PHASH_CAPACITY, threshold: int = PHASH_THRESHOLD):
+        self.capacity = max(0, int(capacity))
+        self.threshold = int(threshold)
+        self._hashes = np.zeros(self.capacity, dtype='>u8')
+        self._results = [None] * self.capacity
+        self._count = 0
+        self._next = 0
+        self._version: Optional[str] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def ensure_version(self, version: str):
+        """
+        Forget every stored scan when the model checkpoint changed since the
+        last call (like ``ResultCache.ensure_model_version``)
+        """
+        if self._version is not None and self._version != version:
+            self.clear()
+        self._version = version
+
+    def clear(self):
+        self._results = [None] * self.capacity
+        self._count = 0
+        self._next = 0
+        self.invalidations += 1
+
+    def find(self, image_hash: int) -> Optional[Tuple[Dict, int]]:
+        """
+        Return (result, distance) of the closest stored scan within the
+        threshold, or None.
+        """
+        if self._count == 0:
+            self.misses += 1
+            return None
+
+        stored = self._hashes[:self._count]
+        xored = np.bitwise_xor(stored, np.array(image_hash, dtype='>u8'))
+        distances = np.unpackbits(xored.view(np.uint8)).reshape(self._count, 64).sum(axis=1)
+        best = int(np.argmin(distances))
+        distance = int(distances[best])
+
+        if distance > self.threshold:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return self._results[best], distance
+
+    def add(self, image_hash: int, result: Dict):
+        """
+        Store a copy of a scan result, overwriting the oldest entry when full.
+        The caller goes on to add per-request fields (remedies) to its own dict.
+        """
+        if self.capacity == 0:
+            return
+        self._hashes[self._next] = image_hash
+        self._results[self._next] = dict(result)
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def stats(self) -> Dict:
+        return {
+            "entries": self._count,
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
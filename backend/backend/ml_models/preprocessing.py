@@ -0,0 +1,84 @@
+"""
+Shared Image Preprocessing
+Single-pass resize and normalization used by both classifiers and the
+rule-based analyzers
+"""
+
+import numpy as np
+from PIL import Image
+from typing import Sequence
+
+try:
+    import torch
+    TORCH_AVAILABLE = True
+except (ImportError, OSError, RuntimeError):
+    TORCH_AVAILABLE = False
+
+# Must match the transforms used in train_skin_model.py / train_medicine_model.py
+IMAGE_SIZE = 224
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+def prepare_image(image: Image.Image, size: int = IMAGE_SIZE) -> np.ndarray:
+    """
+    Resize a decoded image once to ``size`` x ``size`` RGB.
+
+    Uses the same bilinear filter as ``transforms.Resize`` during training.
+
+    Returns:
+        uint8 array of shape (size, size, 3), shared by the classifiers and
+        the rule-based analyzers
+    """
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    if image.size != (size, size):
+        image = image.resize((size, size), Image.Resampling.BILINEAR)
+    return np.asarray(image)
+
+
+class TensorNormalizer:
+    """
+    Normalizes uint8 HWC images straight into a reusable float32 NCHW buffer.
+
+    One normalizer belongs to one batching scheduler, which runs a single
+    forward pass at a time, so the buffers are never shared between batches
+    in flight.
+    """
+
+    def __init__(self, max_batch_size: int, size: int = IMAGE_SIZE):
+        if not TORCH_AVAILABLE:
+            raise RuntimeError("PyTorch is required for tensor normalization")
+
+        self.size = size
+        self._staging = np.empty((max_batch_size, size, size, 3), dtype=np.uint8)
+        self._buffer = torch.empty((max_batch_size, 3, size, size), dtype=torch.float32)
+
+        mean = torch.tensor(IMAGENET_MEAN, dtype=torch.float32).view(3, 1, 1)
+        std = torch.tensor(IMAGENET_STD, dtype=torch.float32).view(3, 1, 1)
+        # (x / 255 - mean) / std  ==  x * scale - offset
+        self._scale = 1.0 / (255.0 * std)
+        self._offset = mean / std
+
+    def normalize_batch(self, images: Sequence[np.ndarray]) -> "torch.Tensor":
+        """
+        Args:
+            images: uint8 arrays of shape (size, size, 3) from ``prepare_image``
+
+        Returns:
+            View of the reusable buffer with shape (N, 3, size, size). It is
+            overwritten by the next call.
+        """
+        count = len(images)
+        if count > self._buffer.shape[0]:
+            raise ValueError(f"Batch of {count} exceeds buffer capacity {self._buffer.shape[0]}")
+
+        staging = self._staging[:count]
+        for index, image in enumerate(images):
+            staging[index] = image
+
+        out = self._buffer[:count]
+        # uint8 NHWC -> float32 NCHW in one copy, then normalize in place
+        out.copy_(torch.from_numpy(staging).permute(0, 3, 1, 2))
+        out.mul_(self._scale).sub_(self._offset)
+        return out
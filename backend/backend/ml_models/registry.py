@@ -0,0 +1,107 @@
+"""
+Model Registry
+Loads the backend's models once (optionally in parallel), warms them up and
+reports readiness, load time and warm-up time per model
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+MODEL_WARMUP_RUNS = int(os.environ.get("MODEL_WARMUP_RUNS", "2"))
+MODEL_PARALLEL_LOAD = os.environ.get("MODEL_PARALLEL_LOAD", "1").lower() in ("1", "true", "yes")
+
+
+class ModelRegistry:
+    """
+    Builds registered models on demand, exactly once.
+
+    Models are registered with a factory (usually the model class). A model
+    may provide ``warm_up(runs)`` to pre-run inference so the first real
+    request does not pay for cold kernels and allocator growth.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable] = {}
+        self._models: Dict[str, object] = {}
+        self._report: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self.ready = False
+        self.loading = False
+        # Set when loading itself failed (not a single model); /health reports it
+        self.error: Optional[str] = None
+
+    def register(self, name: str, factory: Callable):
+        self._factories[name] = factory
+
+    def get(self, name: str) -> Optional[object]:
+        """Return a loaded model, or None if it is unavailable or not loaded yet"""
+        return self._models.get(name)
+
+    def load_all(self, parallel: bool = MODEL_PARALLEL_LOAD, warmup_runs: int = MODEL_WARMUP_RUNS):
+        """
+        Load and warm up every registered model. Safe to call more than once;
+        models are only built the first time.
+        """
+        with self._lock:
+            if self.ready:
+                return
+            self.loading = True
+            self.error = None
+            names = [name for name in self._factories if name not in self._report]
+
+            if parallel and len(names) > 1:
+                with ThreadPoolExecutor(max_workers=len(names), thread_name_prefix="model-load") as pool:
+                    list(pool.map(lambda n: self._load_one(n, warmup_runs), names))
+            else:
+                for name in names:
+                    self._load_one(name, warmup_runs)
+
+            self.loading = False
+            self.ready = True
+
+    def mark_failed(self, error: str):
+        """Record that loading stopped with an error; the registry stays not ready"""
+        self.loading = False
+        self.error = error
+
+    def _load_one(self, name: str, warmup_runs: int):
+        report = {"loaded": False, "load_seconds": 0.0, "warmup_seconds": 0.0, "warmup_runs": 0}
+        started = time.perf_counter()
+        try:
+            model = self._factories[name]()
+        except Exception as e:
+            print(f"Warning: Could not initialize {name}: {e}")
+            print("Server will continue but this feature may be limited.")
+            report["error"] = str(e)
+            self._report[name] = report
+            return
+
+        report["load_seconds"] = time.perf_counter() - started
+        report["loaded"] = True
+
+        if warmup_runs > 0 and hasattr(model, "warm_up"):
+            started = time.perf_counter()
+            try:
+                report["warmup_runs"] = model.warm_up(warmup_runs)
+            except Exception as e:
+                print(f"Warning: Warm-up of {name} failed: {e}")
+                report["warmup_error"] = str(e)
+            report["warmup_seconds"] = time.perf_counter() - started
+
+        self._models[name] = model
+        self._report[name] = report
+        print(
+            f"✓ {name} ready (load {report['load_seconds']:.2f}s, "
+            f"warm-up {report['warmup_seconds']:.2f}s, {report['warmup_runs']} runs)"
+        )
+
+    def stats(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "loading": self.loading,
+            "error": self.error,
+            "models": dict(self._report),
+        }
@@ -3,18 +3,27 @@ Visual Diagnosis ML Model
 Analyzes skin, eyes, tongue, and nails for disease detection
 """
 
+import asyncio
 import os
 import numpy as np
 from PIL import Image
-from typing import Dict, List, Optional
-import json
+from typing import Dict, List, Optional, Tuple
+
+from ml_models.batching import BatchingScheduler
+from ml_models.image_stats import ImageStats, image_stats
+from ml_models.preprocessing import prepare_image
+from ml_models.backends import load_classifier, variant_path
+from services.execution import get_execution_layer
+from services.metrics import FALLBACKS, stage
+from services.result_cache import file_fingerprint
+from services.structured_log import get_logger
+
+logger = get_logger(__name__)
 
 # Try to import ML libraries
 ML_AVAILABLE = False
 try:
     import torch
-    import torchvision.transforms as transforms
-    from torchvision import models
     # Test if torch actually works (DLL loading issue on Windows)
     _ = torch.device('cpu')
     ML_AVAILABLE = True
@@ -28,10 +37,15 @@ except (ImportError, OSError, RuntimeError) as e:
 class VisualDiagnosisModel:
     """Visual diagnosis model for skin, eyes, tongue, and nails"""
     
+    SKIN_MODEL_PATH = 'models/skin_model_best.pth'
+    SKIN_LABELS_PATH = 'models/skin_labels.json'
+    
     def __init__(self):
         self.model_loaded = False
         self.skin_model = None
         self.device = None
+        self.backend = "eager"
+        self.skin_batcher: Optional[BatchingScheduler] = None
         self.skin_label_mapping = {}
         self.condition_database = self._load_condition_database()
         
@@ -146,36 +160,20 @@ class VisualDiagnosisModel:
     def _load_models(self):
         """Load trained diagnosis models"""
         # Load skin model
-        skin_model_path = 'models/skin_model_best.pth'
-        skin_labels_path = 'models/skin_labels.json'
+        skin_model_path = self.SKIN_MODEL_PATH
+        skin_labels_path = self.SKIN_LABELS_PATH
         
         if os.path.exists(skin_model_path):
             try:
-                # Load label mapping
-                if os.path.exists(skin_labels_path):
-                    with open(skin_labels_path, 'r') as f:
-                        self.skin_label_mapping = json.load(f)
-                
-                # Load model
-                checkpoint = torch.load(skin_model_path, map_location=self.device)
-                
-                # Create model architecture
-                num_classes = len(self.skin_label_mapping) if self.skin_label_mapping else checkpoint.get('num_classes', 10)
-                self.skin_model = models.resnet18(weights=None)
-                num_features = self.skin_model.fc.in_features
-                self.skin_model.fc = torch.nn.Linear(num_features, num_classes)
-                
-                # Load weights
-                if 'model_state_dict' in checkpoint:
-                    self.skin_model.load_state_dict(checkpoint['model_state_dict'])
-                else:
-                    self.skin_model.load_state_dict(checkpoint)
-                
-                self.skin_model.to(self.device)
-                self.skin_model.eval()
+                self.skin_model, self.skin_label_mapping, num_classes, self.backend = load_classifier(
+                    skin_model_path, skin_labels_path, self.device
+                )
+                if self.backend in ("int8", "onnx"):
+                    self.device = torch.device('cpu')
+                self.skin_batcher = BatchingScheduler("skin", self._forward_skin)
                 self.model_loaded = True
                 
-                print(f"✓ Loaded skin condition classification model with {num_classes} classes")
+                print(f"✓ Loaded skin condition classification model with {num_classes} classes ({self.backend} backend)")
             except Exception as e:
                 print(f"Error loading skin model: {e}. Using rule-based mode.")
                 self.model_loaded = False
@@ -188,6 +186,16 @@ class VisualDiagnosisModel:
         """Check if models are loaded"""
         return True  # Rule-based analysis is always available
     
+    def checkpoint_version(self) -> str:
+        """Fingerprint of the checkpoint files on disk (changes after retraining)"""
+        return file_fingerprint(self.SKIN_MODEL_PATH, self.SKIN_LABELS_PATH, variant_path(self.SKIN_MODEL_PATH, self.backend))
+    
+    def warm_up(self, runs: int) -> int:
+        """Run dummy inferences through the batch pipeline; returns the number run"""
+        if not (self.model_loaded and self.skin_batcher):
+            return 0
+        return self.skin_batcher.warm_up(runs)
+    
     async def analyze(self, image: Image.Image, diagnosis_type: str) -> Dict:
         """
         Analyze image for conditions
@@ -205,56 +213,113 @@ class VisualDiagnosisModel:
         """
         try:
             # Preprocess image
-            processed_image = self._preprocess_image(image)
-            
-            # Analyze based on type
-            if diagnosis_type == "skin":
-                conditions = await self._analyze_skin(processed_image)
-            elif diagnosis_type == "eye":
-                conditions = await self._analyze_eye(processed_image)
-            elif diagnosis_type == "tongue":
-                conditions = await self._analyze_tongue(processed_image)
-            elif diagnosis_type == "nail":
-                conditions = await self._analyze_nail(processed_image)
-            else:
-                conditions = []
-            
-            return {
-                "conditions": conditions,
-                "confidence": self._calculate_confidence(conditions),
-                "analysis_type": diagnosis_type,
-                "method": "ml" if ML_AVAILABLE and self.model_loaded else "rule_based"
-            }
+            with stage("preprocess"):
+                processed_image = await get_execution_layer().run_tensor(self._preprocess_image, image)
+            conditions = await self._analyze_type(processed_image, diagnosis_type)
+            return self._build_result(conditions, diagnosis_type)
         
         except Exception as e:
-            return {
-                "conditions": [],
-                "confidence": 0.0,
-                "analysis_type": diagnosis_type,
-                "error": str(e)
-            }
+            return self._error_result(diagnosis_type, e)
     
-    def _preprocess_image(self, image: Image.Image) -> np.ndarray:
-        """Preprocess image for analysis"""
-        # Resize to standard size
-        target_size = (224, 224)
-        image = image.resize(target_size, Image.Resampling.LANCZOS)
+    async def analyze_many(self, items: List[Tuple[Image.Image, str]]) -> List[Dict]:
+        """
+        Analyze several (image, diagnosis_type) pairs in one call.
         
-        # Convert to numpy array
-        img_array = np.array(image)
+        All skin images that go to the classifier share batched forward passes;
+        the other types run their rule checks concurrently. A failure only
+        affects its own item, which gets a result with an "error" field.
         
-        return img_array
-    
-    async def _analyze_skin(self, image: np.ndarray) -> List[Dict]:
-        """Analyze skin conditions using trained ML model"""
-        conditions = []
+        Returns:
+            One result per item, in input order (same shape as ``analyze``)
+        """
+        execution = get_execution_layer()
+        with stage("preprocess"):
+            processed = await asyncio.gather(
+                *(execution.run_tensor(self._preprocess_image, image) for image, _ in items),
+                return_exceptions=True
+            )
+        
+        # One submission for every skin image so they are batched together
+        skin_probabilities = {}
+        if self._skin_model_ready():
+            skin_indices = [
+                index for index, (_, diagnosis_type) in enumerate(items)
+                if diagnosis_type == "skin" and not isinstance(processed[index], BaseException)
+            ]
+            predictions = await self.skin_batcher.submit_many(
+                [processed[index] for index in skin_indices], return_exceptions=True
+            )
+            for index, probabilities in zip(skin_indices, predictions):
+                if isinstance(probabilities, BaseException):
+                    logger.warning("ML prediction error: %s, falling back to rule-based", probabilities)
+                    FALLBACKS.inc(kind="skin_ml_error")
+                else:
+                    skin_probabilities[index] = probabilities
+        
+        async def finish(index: int) -> Dict:
+            diagnosis_type = items[index][1]
+            try:
+                if isinstance(processed[index], BaseException):
+                    raise processed[index]
+                conditions = await self._analyze_type(
+                    processed[index], diagnosis_type, skin_probabilities.get(index)
+                )
+                return self._build_result(conditions, diagnosis_type)
+            except Exception as e:
+                return self._error_result(diagnosis_type, e)
         
+        return list(await asyncio.gather(*(finish(index) for index in range(len(items)))))
+    
+    async def _analyze_type(self, image: np.ndarray, diagnosis_type: str, skin_probabilities=None) -> List[Dict]:
+        """Analyze based on type (rule checks run in the tensor pool)"""
+        execution = get_execution_layer()
+        if diagnosis_type == "skin":
+            return await self._analyze_skin(image, skin_probabilities)
+        analyzers = {"eye": self._analyze_eye, "tongue": self._analyze_tongue, "nail": self._analyze_nail}
+        if diagnosis_type not in analyzers:
+            return []
+        with stage("rules"):
+            return await execution.run_tensor(self._run_rules, analyzers[diagnosis_type], image)
+    
+    def _run_rules(self, analyzer, image: np.ndarray) -> List[Dict]:
+        """Compute the image statistics once and apply an analyzer's rules to them"""
+        return analyzer(image_stats(image))
+    
+    def _build_result(self, conditions: List[Dict], diagnosis_type: str) -> Dict:
+        return {
+            "conditions": conditions,
+            "confidence": self._calculate_confidence(conditions),
+            "analysis_type": diagnosis_type,
+            "method": "ml" if ML_AVAILABLE and self.model_loaded else "rule_based"
+        }
+    
+    def _error_result(self, diagnosis_type: str, error: Exception) -> Dict:
+        return {
+            "conditions": [],
+            "confidence": 0.0,
+            "analysis_type": diagnosis_type,
+            "error": str(error)
+        }
+    
+    def _skin_model_ready(self) -> bool:
+        return ML_AVAILABLE and self.model_loaded and self.skin_model is not None
+    
+    def _preprocess_image(self, image: Image.Image) -> np.ndarray:
+        """Preprocess image for analysis (shared by the classifier and the rules)"""
+        return prepare_image(image)
+    
+    async def _analyze_skin(self, image: np.ndarray, probabilities=None) -> List[Dict]:
+        """
+        Analyze skin conditions using trained ML model
+        (``probabilities`` may come from an earlier batched forward pass)
+        """
         # Use trained ML model if available
-        if ML_AVAILABLE and self.model_loaded and self.skin_model is not None:
+        if self._skin_model_ready():
             try:
-                # Convert numpy array to PIL Image
-                pil_image = Image.fromarray(image.astype('uint8'))
-                ml_result = await self._ml_predict_skin(pil_image)
+                if probabilities is not None:
+                    ml_result = self._skin_prediction(probabilities)
+                else:
+                    ml_result = await self._ml_predict_skin(image)
                 
                 if ml_result:
                     condition_name = ml_result['name']
@@ -265,20 +330,25 @@ class VisualDiagnosisModel:
                         condition_name.lower().replace(' ', '_'), {}
                     )
                     
-                    conditions.append({
+                    return [{
                         "name": condition_name,
                         "severity": condition_details.get('severity', 'mild'),
                         "confidence": confidence,
                         "description": condition_details.get('description', f'{condition_name} detected')
-                    })
-                    
-                    return conditions
+                    }]
             except Exception as e:
-                print(f"ML prediction error: {e}, falling back to rule-based")
+                logger.warning("ML prediction error: %s, falling back to rule-based", e)
+            FALLBACKS.inc(kind="skin_rule_based")
         
         # Fallback to rule-based analysis
-        red_channel = image[:, :, 0]
-        if np.mean(red_channel) > 150:
+        with stage("rules"):
+            return await get_execution_layer().run_tensor(self._run_rules, self._rule_based_skin, image)
+    
+    def _rule_based_skin(self, stats: ImageStats) -> List[Dict]:
+        """Rule-based skin analysis on the statistics of the preprocessed image"""
+        conditions = []
+        
+        if stats.red_mean > 150:
             conditions.append({
                 "name": "Skin Inflammation",
                 "severity": "moderate",
@@ -286,8 +356,7 @@ class VisualDiagnosisModel:
                 "description": "Redness detected indicating possible inflammation"
             })
         
-        gray = np.mean(image, axis=2)
-        if np.std(gray) > 30:
+        if stats.gray_std > 30:
             conditions.append({
                 "name": "Hyperpigmentation",
                 "severity": "mild",
@@ -305,51 +374,50 @@ class VisualDiagnosisModel:
         
         return conditions
     
-    async def _ml_predict_skin(self, image: Image.Image) -> Optional[Dict]:
+    async def _ml_predict_skin(self, image: np.ndarray) -> Optional[Dict]:
         """Use trained ML model to predict skin condition"""
         try:
-            # Preprocess image
-            transform = transforms.Compose([
-                transforms.Resize((224, 224)),
-                transforms.ToTensor(),
-                transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-            ])
-            
-            # Convert PIL to tensor
-            img_tensor = transform(image).unsqueeze(0).to(self.device)
-            
-            # Predict
-            with torch.no_grad():
-                outputs = self.skin_model(img_tensor)
-                probabilities = torch.nn.functional.softmax(outputs[0], dim=0)
-                confidence, predicted_idx = torch.max(probabilities, 0)
-                
-                confidence = confidence.item()
-                predicted_idx = predicted_idx.item()
-                
-                # Get condition name from label mapping
-                if self.skin_label_mapping and str(predicted_idx) in self.skin_label_mapping:
-                    condition_name = self.skin_label_mapping[str(predicted_idx)]
-                elif predicted_idx < len(self.skin_label_mapping):
-                    condition_name = list(self.skin_label_mapping.values())[predicted_idx]
-                else:
-                    condition_name = "Unknown Condition"
-                
-                return {
-                    "name": condition_name,
-                    "confidence": confidence
-                }
+            # Predict (batched with concurrent requests; normalized in the batch buffer)
+            probabilities = await self.skin_batcher.submit(image)
+            return self._skin_prediction(probabilities)
         except Exception as e:
-            print(f"ML prediction error: {e}")
+            logger.warning("ML prediction error: %s", e)
+            FALLBACKS.inc(kind="skin_ml_error")
             return None
     
-    async def _analyze_eye(self, image: np.ndarray) -> List[Dict]:
+    def _skin_prediction(self, probabilities) -> Dict:
+        """Top condition and its confidence from one row of softmax probabilities"""
+        confidence, predicted_idx = torch.max(probabilities, 0)
+        
+        confidence = confidence.item()
+        predicted_idx = predicted_idx.item()
+        
+        # Get condition name from label mapping
+        if self.skin_label_mapping and str(predicted_idx) in self.skin_label_mapping:
+            condition_name = self.skin_label_mapping[str(predicted_idx)]
+        elif predicted_idx < len(self.skin_label_mapping):
+            condition_name = list(self.skin_label_mapping.values())[predicted_idx]
+        else:
+            condition_name = "Unknown Condition"
+        
+        return {
+            "name": condition_name,
+            "confidence": confidence
+        }
+    
+    def _forward_skin(self, batch):
+        """Run one batched forward pass and return per-image softmax probabilities"""
+        with torch.no_grad():
+            outputs = self.skin_model(batch.to(self.device))
+            return torch.nn.functional.softmax(outputs, dim=1).cpu()
+    
+    def _analyze_eye(self, stats: ImageStats) -> List[Dict]:
         """Analyze eye conditions"""
         conditions = []
         
         # Rule-based analysis
         # Check for yellowing (jaundice)
-        yellow_intensity = np.mean(image[:, :, 1]) - np.mean(image[:, :, 0])
+        yellow_intensity = stats.green_mean - stats.red_mean
         if yellow_intensity > 20:
             conditions.append({
                 "name": "Possible Jaundice",
@@ -359,8 +427,7 @@ class VisualDiagnosisModel:
             })
         
         # Check for redness
-        red_channel = image[:, :, 0]
-        if np.mean(red_channel) > 140:
+        if stats.red_mean > 140:
             conditions.append({
                 "name": "Eye Redness",
                 "severity": "mild",
@@ -378,14 +445,13 @@ class VisualDiagnosisModel:
         
         return conditions
     
-    async def _analyze_tongue(self, image: np.ndarray) -> List[Dict]:
+    def _analyze_tongue(self, stats: ImageStats) -> List[Dict]:
         """Analyze tongue conditions"""
         conditions = []
         
         # Rule-based analysis
         # Check for white coating
-        gray = np.mean(image, axis=2)
-        if np.mean(gray) > 200:
+        if stats.gray_mean > 200:
             conditions.append({
                 "name": "White Coating",
                 "severity": "mild",
@@ -394,8 +460,7 @@ class VisualDiagnosisModel:
             })
         
         # Check for yellow coating
-        yellow_channel = image[:, :, 1]
-        if np.mean(yellow_channel) > np.mean(image[:, :, 0]) + 10:
+        if stats.green_mean > stats.red_mean + 10:
             conditions.append({
                 "name": "Yellow Coating",
                 "severity": "moderate",
@@ -413,14 +478,13 @@ class VisualDiagnosisModel:
         
         return conditions
     
-    async def _analyze_nail(self, image: np.ndarray) -> List[Dict]:
+    def _analyze_nail(self, stats: ImageStats) -> List[Dict]:
         """Analyze nail conditions"""
         conditions = []
         
         # Rule-based analysis
         # Check for discoloration
-        color_variance = np.std(image, axis=2)
-        if np.mean(color_variance) > 25:
+        if stats.color_variance > 25:
             conditions.append({
                 "name": "Nail Discoloration",
                 "severity": "moderate",
@@ -429,8 +493,7 @@ class VisualDiagnosisModel:
             })
         
         # Check for texture (ridges)
-        gray = np.mean(image, axis=2)
-        if np.std(gray) > 20:
+        if stats.gray_std > 20:
             conditions.append({
                 "name": "Nail Texture Changes",
                 "severity": "mild",
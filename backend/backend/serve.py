@@ -0,0 +1,248 @@
+"""
+Pre-fork Production Server
+Loads and warms up the models once in a parent process, then forks worker
+processes that serve the app from one shared listening socket. The workers
+share the model weights and databases copy-on-write instead of each loading
+its own copy.
+
+Usage:
+    python serve.py --workers 4
+    python serve.py --workers 4 --port 8000 --share-memory --compare-naive
+
+Send SIGUSR1 to the parent process to print a memory report (RSS/PSS per
+worker). Needs os.fork (Linux/macOS); on Windows use `python main.py`.
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+SERVE_WORKERS = int(os.environ.get("SERVE_WORKERS", "2"))
+
+_MEMORY_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def read_memory(pid: int) -> Dict[str, int]:
+    """Resident memory counters (kB) of a process from /proc/<pid>/smaps_rollup"""
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB" and parts[0].rstrip(":") in _MEMORY_FIELDS:
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        pass
+    return fields
+
+
+def share_model_weights(registry) -> int:
+    """
+    Move the weights of every loaded torch model into shared memory, so they
+    stay shared even if a worker writes to them. Returns the number of models.
+    """
+    import torch
+
+    count = 0
+    for name in registry.stats()["models"]:
+        model = registry.get(name)
+        # Model wrappers keep their torch modules as attributes (model, skin_model)
+        for value in vars(model).values() if model is not None else ():
+            if isinstance(value, torch.nn.Module):
+                value.share_memory()
+                count += 1
+    return count
+
+
+def release_free_heap():
+    """
+    Return freed heap pages (e.g. warm-up activations) to the OS before
+    forking. Otherwise workers reuse them, which copies each page.
+    """
+    try:
+        import ctypes
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def measure_naive(workers: int) -> List[Dict[str, int]]:
+    """
+    Start ``workers`` independent processes that each load the models, as a
+    plain multi-worker start would, and return their memory counters.
+    """
+    code = (
+        "import sys, main; main.model_registry.load_all(); "
+        "print('ready', flush=True); sys.stdin.read()"
+    )
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-c", code],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__)), text=True,
+        )
+        for _ in range(workers)
+    ]
+    try:
+        for process in processes:
+            for line in process.stdout:
+                if line.strip() == "ready":
+                    break
+        return [read_memory(process.pid) for process in processes]
+    finally:
+        for process in processes:
+            process.stdin.close()
+            process.wait()
+
+
+def print_report(parent_pid: int, workers: Dict[int, int], parent_before_fork: Dict[str, int], naive: List[Dict[str, int]]):
+    """Per-process RSS/PSS of the pre-fork server compared with a naive multi-worker start"""
+    mb = 1024.0
+    rows = [("parent", parent_pid)] + [(f"worker {index}", pid) for pid, index in sorted(workers.items(), key=lambda w: w[1])]
+    print(f"\n{'process':<12}{'pid':>8}{'RSS MB':>10}{'PSS MB':>10}{'shared MB':>11}{'private MB':>12}")
+    total_pss = total_rss = 0
+    for label, pid in rows:
+        memory = read_memory(pid)
+        if not memory:
+            print(f"{label:<12}{pid:>8}  (memory counters unavailable)")
+            continue
+        shared = memory.get("Shared_Clean", 0) + memory.get("Shared_Dirty", 0)
+        private = memory.get("Private_Clean", 0) + memory.get("Private_Dirty", 0)
+        total_rss += memory["Rss"]
+        total_pss += memory["Pss"]
+        print(f"{label:<12}{pid:>8}{memory['Rss'] / mb:>10.1f}{memory['Pss'] / mb:>10.1f}{shared / mb:>11.1f}{private / mb:>12.1f}")
+
+    print(f"\nPre-fork total (sum of PSS, parent + {len(workers)} workers): {total_pss / mb:.1f} MB")
+    print(f"Sum of RSS (counts shared pages once per process):       {total_rss / mb:.1f} MB")
+    if naive:
+        naive_pss = sum(memory.get("Pss", 0) for memory in naive)
+        print(f"Naive start, measured ({len(naive)} independent processes, sum of PSS): {naive_pss / mb:.1f} MB")
+    elif parent_before_fork:
+        print(
+            f"Naive start, estimated ({len(workers)} x parent RSS before fork): "
+            f"{len(workers) * parent_before_fork.get('Rss', 0) / mb:.1f} MB"
+        )
+
+
+def run_worker(app, sock: socket.socket, args, torch_threads: int):
+    """Serve the app in a forked worker until it is told to stop"""
+    import uvicorn
+
+    # Objects created from here on are collected normally
+    gc.enable()
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except (ImportError, OSError, RuntimeError):
+        pass
+
+    config = uvicorn.Config(app, log_level=args.log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fork server with shared model weights")
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--share-memory", action="store_true",
+                        help="Move torch weights into shared memory before forking")
+    parser.add_argument("--compare-naive", action="store_true",
+                        help="Also start N independent processes once to measure a naive multi-worker start")
+    parser.add_argument("--report-delay", type=float, default=5.0,
+                        help="Seconds after start-up to print the memory report (0 disables)")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        import uvicorn
+        print("serve.py needs os.fork; starting a single process instead.")
+        uvicorn.run("main:app", host=args.host, port=args.port, log_level=args.log_level)
+        return
+
+    workers_wanted = max(1, args.workers)
+    naive = measure_naive(workers_wanted) if args.compare_naive else []
+
+    # Keep the garbage collector from touching (and so un-sharing) pre-fork objects
+    gc.disable()
+    import main as application
+
+    started = time.perf_counter()
+    application.model_registry.load_all()
+    print(f"Models loaded in parent in {time.perf_counter() - started:.2f}s")
+    if args.share_memory:
+        print(f"Moved {share_model_weights(application.model_registry)} model(s) to shared memory")
+
+    sock = socket.socket(socket.AF_INET6 if ":" in args.host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    gc.collect()
+    gc.freeze()
+    release_free_heap()
+    parent_before_fork = read_memory(os.getpid())
+    torch_threads = max(1, (os.cpu_count() or 1) // workers_wanted)
+
+    workers: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGUSR1, signal.SIGALRM):
+                signal.signal(sig, signal.SIG_DFL)
+            try:
+                run_worker(application.app, sock, args, torch_threads)
+            finally:
+                os._exit(0)
+        workers[pid] = index
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def report(signum, frame):
+        print_report(os.getpid(), workers, parent_before_fork, naive)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGUSR1, report)
+    signal.signal(signal.SIGALRM, report)
+
+    for index in range(1, workers_wanted + 1):
+        spawn(index)
+    print(f"Serving on http://{args.host}:{args.port} with {workers_wanted} workers "
+          f"({torch_threads} torch thread(s) each); SIGUSR1 prints a memory report")
+    if args.report_delay > 0:
+        signal.setitimer(signal.ITIMER_REAL, args.report_delay)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = workers.pop(pid, None)
+        if index is not None and not stopping:
+            print(f"Worker {index} (pid {pid}) exited with status {status}; restarting")
+            # Avoid a tight restart loop when workers crash on start-up
+            time.sleep(1.0)
+            spawn(index)
+
+    sock.close()
+
+
+if __name__ == '__main__':
+    main()
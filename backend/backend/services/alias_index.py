@@ -0,0 +1,115 @@
+"""
+Alias Index
+Resolves a medicine name to its record through a dict of normalized names and
+aliases, built once, instead of comparing the name with every key and alias
+
+Names are normalized to lowercase words separated by single spaces, so
+"Paracetamol", "PARACETAMOL" and "paracetamol " are the same key. Names
+that are not a key go to a partial-match fallback: ``find`` scans the keys
+once (small tables), ``lookup`` only looks at keys it can find in a sorted
+index, the same way ``SqliteCatalog.details`` queries its file.
+"""
+
+import re
+from bisect import bisect_left
+from typing import Dict, Generic, Iterable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+_WORD = re.compile(r"\w+")
+
+# A name matches keys it is a prefix of only from this many characters on
+MIN_PREFIX_LENGTH = 3
+# Word n-grams are taken from this many leading words of a name
+MAX_NAME_WORDS = 16
+# Sorts after every character, so key + _LAST_CHAR bounds the keys starting with key
+_LAST_CHAR = "\U0010ffff"
+
+
+def alias_key(text: str) -> str:
+    """Lowercase words separated by single spaces: how names and aliases are compared"""
+    return " ".join(_WORD.findall(text.lower()))
+
+
+def word_ngrams(key: str) -> List[str]:
+    """Runs of whole words in a normalized name (from its first MAX_NAME_WORDS words), except the name itself"""
+    words = key.split()[:MAX_NAME_WORDS]
+    ngrams = dict.fromkeys(
+        " ".join(words[start:start + size])
+        for size in range(1, len(words) + 1)
+        for start in range(len(words) - size + 1)
+    )
+    ngrams.pop(key, None)
+    return list(ngrams)
+
+
+def prefix_range(key: str) -> Optional[Tuple[str, str]]:
+    """[low, high) bounds of the keys starting with a normalized name, None if it is too short"""
+    if len(key) < MIN_PREFIX_LENGTH:
+        return None
+    return key, key + _LAST_CHAR
+
+
+class AliasIndex(Generic[T]):
+    """
+    Normalized name -> record, from (names, record) entries in priority order
+    (a name listed by several records resolves to the first).
+
+    ``find`` answers exact names from the dict; a partial match is a key
+    that contains the name or is contained in it (e.g. "Paracetamol 500mg"
+    finds "paracetamol"), first key in order.
+
+    ``lookup`` is for large catalogs: a partial match is a key that starts
+    with the name ("parace" finds "paracetamol") or is a run of whole words
+    in it ("Paracetamol 500mg" finds "paracetamol"), first key in order.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[Iterable[str], T]]):
+        self._exact: Dict[str, T] = {}
+        for names, record in entries:
+            for name in names:
+                key = alias_key(name)
+                if key:
+                    self._exact.setdefault(key, record)
+        # Fallback scan, in priority order
+        self._keys: List[Tuple[str, T]] = list(self._exact.items())
+        # Priority of every key, and the keys sorted for prefix ranges
+        self._order: Dict[str, int] = {key: position for position, key in enumerate(self._exact)}
+        self._sorted: List[str] = sorted(self._exact)
+
+    def get(self, name: str) -> Optional[T]:
+        """Record of an exact (normalized) name"""
+        return self._exact.get(alias_key(name))
+
+    def find(self, name: str) -> Optional[T]:
+        """Record of an exact name, else of the first partial match"""
+        key = alias_key(name)
+        if not key:
+            return None
+        record = self._exact.get(key)
+        if record is not None:
+            return record
+        for candidate, record in self._keys:
+            if key in candidate or candidate in key:
+                return record
+        return None
+
+    def lookup(self, name: str) -> Optional[T]:
+        """Record of an exact name, else of the first key starting with it or made of its words"""
+        key = alias_key(name)
+        if not key:
+            return None
+        record = self._exact.get(key)
+        if record is not None:
+            return record
+        candidates = [ngram for ngram in word_ngrams(key) if ngram in self._exact]
+        bounds = prefix_range(key)
+        if bounds is not None:
+            low, high = bounds
+            candidates.extend(self._sorted[bisect_left(self._sorted, low):bisect_left(self._sorted, high)])
+        if not candidates:
+            return None
+        return self._exact[min(candidates, key=self._order.__getitem__)]
+
+    def stats(self) -> Dict:
+        return {"keys": len(self._exact)}
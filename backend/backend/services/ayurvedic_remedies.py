@@ -1,345 +1,314 @@
 """
 Ayurvedic Remedy Service
 Provides natural remedies and treatments based on conditions
+
+The remedies are read from a JSON file (REMEDY_DATA_PATH) into a
+``RemedyData`` snapshot: condition tables per diagnosis type, an alias index
+of medicines and the recommendation lists, never modified once built. When
+the file changes, a watcher thread builds a new snapshot next to the current
+one and swaps it in with one assignment, so requests in flight finish with
+the snapshot they started with and nothing waits for the reload.
 """
 
-from typing import Dict, List, Optional
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
+from services.alias_index import AliasIndex
+from services.metrics import CACHE_LOOKUPS
+from services.result_cache import file_fingerprint
+from services.structured_log import get_logger
 
-class AyurvedicRemedyService:
-    """Service for providing Ayurvedic remedies and recommendations"""
-    
-    def __init__(self):
-        self.remedy_database = self._load_remedy_database()
-        self.medicine_remedies = self._load_medicine_remedies()
-    
-    def _load_remedy_database(self) -> Dict:
-        """Load Ayurvedic remedy database"""
-        return {
-            "skin": {
-                "acne": [
-                    {
-                        "name": "Neem (Azadirachta indica)",
-                        "usage": "Apply neem paste or use neem-based face wash daily",
-                        "benefits": "Antibacterial, anti-inflammatory properties",
-                        "preparation": "Mix neem powder with water to make paste"
-                    },
-                    {
-                        "name": "Turmeric (Curcuma longa)",
-                        "usage": "Apply turmeric paste with honey, leave for 15 minutes",
-                        "benefits": "Reduces inflammation and prevents bacterial growth",
-                        "preparation": "Mix 1 tsp turmeric with 1 tsp honey"
-                    },
-                    {
-                        "name": "Aloe Vera",
-                        "usage": "Apply fresh aloe vera gel directly on affected areas",
-                        "benefits": "Soothes inflammation and promotes healing",
-                        "preparation": "Extract gel from fresh aloe vera leaf"
-                    }
-                ],
-                "dryness": [
-                    {
-                        "name": "Coconut Oil",
-                        "usage": "Apply warm coconut oil before bath and at night",
-                        "benefits": "Deep moisturization, maintains skin barrier",
-                        "preparation": "Warm pure coconut oil slightly"
-                    },
-                    {
-                        "name": "Ghee (Clarified Butter)",
-                        "usage": "Massage with ghee, especially in winter",
-                        "benefits": "Nourishes skin deeply, Vata balancing",
-                        "preparation": "Use pure, organic ghee"
-                    },
-                    {
-                        "name": "Sesame Oil",
-                        "usage": "Apply sesame oil during Abhyanga (oil massage)",
-                        "benefits": "Vata pacifying, deeply moisturizing",
-                        "preparation": "Warm sesame oil before application"
-                    }
-                ],
-                "eczema": [
-                    {
-                        "name": "Chandan (Sandalwood)",
-                        "usage": "Apply sandalwood paste on affected areas",
-                        "benefits": "Cooling, anti-inflammatory",
-                        "preparation": "Mix sandalwood powder with rose water"
-                    },
-                    {
-                        "name": "Manjistha (Rubia cordifolia)",
-                        "usage": "Take internally and apply externally",
-                        "benefits": "Blood purifier, reduces inflammation",
-                        "preparation": "Decoction: 1 tsp in 2 cups water, boil"
-                    }
-                ],
-                "hyperpigmentation": [
-                    {
-                        "name": "Kumkumadi Oil",
-                        "usage": "Apply at night, massage gently",
-                        "benefits": "Reduces dark spots, evens skin tone",
-                        "preparation": "Ready-made oil available"
-                    },
-                    {
-                        "name": "Lemon and Honey",
-                        "usage": "Apply mixture, leave for 10 minutes, wash",
-                        "benefits": "Natural bleaching, vitamin C",
-                        "preparation": "Mix lemon juice with honey (1:1)"
-                    }
-                ]
-            },
-            "eye": {
-                "conjunctivitis": [
-                    {
-                        "name": "Triphala Eye Wash",
-                        "usage": "Wash eyes with Triphala decoction 2-3 times daily",
-                        "benefits": "Antibacterial, anti-inflammatory",
-                        "preparation": "1 tsp Triphala in 1 cup water, strain after cooling"
-                    },
-                    {
-                        "name": "Rose Water",
-                        "usage": "Apply 2-3 drops in each eye",
-                        "benefits": "Cooling, soothing, reduces redness",
-                        "preparation": "Use pure, organic rose water"
-                    }
-                ],
-                "dry_eyes": [
-                    {
-                        "name": "Ghee (Nasya)",
-                        "usage": "2 drops of ghee in each nostril (Nasya therapy)",
-                        "benefits": "Lubricates eyes, Vata balancing",
-                        "preparation": "Use medicated ghee or plain ghee"
-                    },
-                    {
-                        "name": "Aloe Vera Eye Drops",
-                        "usage": "Diluted aloe vera gel as eye drops",
-                        "benefits": "Moisturizing, anti-inflammatory",
-                        "preparation": "Dilute fresh aloe gel with distilled water (1:3)"
-                    }
-                ],
-                "jaundice": [
-                    {
-                        "name": "Punarnava (Boerhavia diffusa)",
-                        "usage": "Take decoction 2-3 times daily",
-                        "benefits": "Liver support, diuretic",
-                        "preparation": "1 tsp powder in 2 cups water, boil"
-                    },
-                    {
-                        "name": "Bhumi Amla (Phyllanthus niruri)",
-                        "usage": "Take fresh juice or powder",
-                        "benefits": "Liver detoxification, hepatoprotective",
-                        "preparation": "Fresh juice: 10-20ml, or 1-2g powder"
-                    }
-                ]
-            },
-            "tongue": {
-                "white_coating": [
-                    {
-                        "name": "Tongue Scraping (Jihwa Prakshalana)",
-                        "usage": "Scrape tongue daily with copper scraper",
-                        "benefits": "Removes Ama (toxins), improves digestion",
-                        "preparation": "Use copper tongue scraper, scrape 7-14 times"
-                    },
-                    {
-                        "name": "Triphala",
-                        "usage": "Take Triphala powder with warm water at night",
-                        "benefits": "Detoxifies, improves digestion",
-                        "preparation": "1 tsp Triphala in warm water"
-                    }
-                ],
-                "yellow_coating": [
-                    {
-                        "name": "Amla (Indian Gooseberry)",
-                        "usage": "Take Amla juice or powder",
-                        "benefits": "Pitta pacifying, cooling",
-                        "preparation": "Fresh juice: 20ml, or 1 tsp powder"
-                    },
-                    {
-                        "name": "Coriander Water",
-                        "usage": "Drink coriander seed water throughout day",
-                        "benefits": "Cooling, Pitta balancing",
-                        "preparation": "Soak 1 tsp coriander seeds overnight, drink water"
-                    }
-                ]
-            },
-            "nail": {
-                "brittle_nails": [
-                    {
-                        "name": "Sesame Oil Massage",
-                        "usage": "Massage nails and cuticles with warm sesame oil",
-                        "benefits": "Strengthens nails, Vata balancing",
-                        "preparation": "Warm pure sesame oil"
-                    },
-                    {
-                        "name": "Amla and Bhringraj",
-                        "usage": "Take internally and apply oil",
-                        "benefits": "Nourishes hair and nails",
-                        "preparation": "Amla powder: 1 tsp, Bhringraj oil: apply externally"
-                    }
-                ],
-                "fungal_infection": [
-                    {
-                        "name": "Neem Oil",
-                        "usage": "Apply neem oil on affected nails",
-                        "benefits": "Antifungal, antibacterial",
-                        "preparation": "Apply pure neem oil 2-3 times daily"
-                    },
-                    {
-                        "name": "Turmeric Paste",
-                        "usage": "Apply turmeric paste on nails",
-                        "benefits": "Antifungal, anti-inflammatory",
-                        "preparation": "Mix turmeric powder with water or coconut oil"
-                    }
-                ]
-            }
-        }
-    
-    def _load_medicine_remedies(self) -> Dict:
-        """Load Ayurvedic alternatives for common medicines"""
+logger = get_logger(__name__)
+
+# Remedy content (see data/ayurvedic_remedies.json for the format)
+REMEDY_DATA_PATH = os.environ.get("REMEDY_DATA_PATH", "data/ayurvedic_remedies.json")
+# How often the watcher checks the file for changes (0 disables the watcher)
+REMEDY_RELOAD_INTERVAL_SECONDS = float(os.environ.get("REMEDY_RELOAD_INTERVAL_SECONDS", "2"))
+# Remedies-plus-recommendations payloads kept per (conditions, type, severity) key
+REMEDY_CACHE_SIZE = int(os.environ.get("REMEDY_CACHE_SIZE", "1024"))
+
+Remedies = Tuple[Dict, ...]
+
+
+class DiagnosisRemedies(NamedTuple):
+    """Remedies and recommendations for a diagnosis; shared between responses, so read-only"""
+    remedies: Remedies
+    recommendations: Tuple[str, ...]
+
+
+def _remedy_list(value, where: str) -> Remedies:
+    if not isinstance(value, list) or not all(
+        isinstance(remedy, dict) and isinstance(remedy.get("name"), str) for remedy in value
+    ):
+        raise ValueError(f"{where}: expected a list of remedies, each with a name")
+    return tuple(value)
+
+
+def _section(content: Dict, name: str, kind: type):
+    value = content.get(name, kind())
+    if not isinstance(value, kind):
+        raise ValueError(f"{name}: expected {'an object' if kind is dict else 'a ' + kind.__name__}")
+    return value
+
+
+class RemedyData:
+    """
+    One version of the remedy content, indexed for lookups.
+
+    Built from the parsed data file; raises ``ValueError`` when the content
+    does not have the expected shape.
+    """
+
+    __slots__ = ("version", "source", "conditions", "fallbacks", "medicine_index", "medicine_count",
+                 "general_medicine_remedies", "empty_name_remedies", "recommendations",
+                 "severe_recommendation", "default_recommendation")
+
+    def __init__(self, content: Dict, version: str = "", source: str = ""):
+        if not isinstance(content, dict):
+            raise ValueError("expected an object at the top level")
+        self.version = version
+        self.source = source
+
+        # Diagnosis type -> ((lowercase condition, remedies), ...) in file order
+        self.conditions: Dict[str, Tuple[Tuple[str, Remedies], ...]] = {}
+        # Diagnosis type -> remedies given when no condition matches
+        self.fallbacks: Dict[str, Remedies] = {}
+        for diagnosis_type, table in _section(content, "conditions", dict).items():
+            if not isinstance(table, dict):
+                raise ValueError(f"conditions.{diagnosis_type}: expected an object")
+            self.conditions[diagnosis_type] = tuple(
+                (condition.lower(), _remedy_list(remedies, f"conditions.{diagnosis_type}.{condition}"))
+                for condition, remedies in table.items()
+            )
+            first = self.conditions[diagnosis_type][:1]
+            self.fallbacks[diagnosis_type] = first[0][1][:2] if first else ()
+
+        medicines = [
+            (medicine, _remedy_list(remedies, f"medicines.{medicine}"))
+            for medicine, remedies in _section(content, "medicines", dict).items()
+        ]
+        self.medicine_index = AliasIndex(([medicine], remedies) for medicine, remedies in medicines)
+        self.medicine_count = len(medicines)
+        self.general_medicine_remedies = _remedy_list(
+            _section(content, "general_medicine_remedies", list), "general_medicine_remedies"
+        )
+        # An empty name is contained in every medicine name, so it matches the first one
+        self.empty_name_remedies = medicines[0][1] if medicines else self.general_medicine_remedies
+
+        self.recommendations: Dict[str, Tuple[str, ...]] = {}
+        for diagnosis_type, lines in _section(content, "recommendations", dict).items():
+            if not isinstance(lines, list) or not all(isinstance(line, str) for line in lines):
+                raise ValueError(f"recommendations.{diagnosis_type}: expected a list of strings")
+            self.recommendations[diagnosis_type] = tuple(lines)
+        self.severe_recommendation = _section(content, "severe_recommendation", str)
+        self.default_recommendation = _section(content, "default_recommendation", str)
+
+    @classmethod
+    def load(cls, path: str) -> "RemedyData":
+        # Fingerprint taken before reading: a write racing the read shows up as another change
+        version = file_fingerprint(path)
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), version, path)
+
+    def condition_remedies(self, condition_name: str, diagnosis_type: str) -> List[Dict]:
+        """Remedies of every condition whose name contains, or is contained in, the given one"""
+        condition_lower = condition_name.lower()
+        remedies = []
+        for condition_key, condition_remedies in self.conditions.get(diagnosis_type, ()):
+            if condition_key in condition_lower or condition_lower in condition_key:
+                remedies.extend(condition_remedies)
+        # If no match, general remedies for the type
+        if not remedies:
+            remedies.extend(self.fallbacks.get(diagnosis_type, ()))
+        return remedies
+
+    def medicine_remedies(self, medicine_name: str) -> Remedies:
+        """Alternatives for a medicine (exact, else partial match), else general immune boosters"""
+        if not medicine_name:
+            return self.empty_name_remedies
+        remedies = self.medicine_index.find(medicine_name)
+        return self.general_medicine_remedies if remedies is None else remedies
+
+    def recommendations_for(self, conditions: List[Dict], diagnosis_type: str) -> List[str]:
+        if not conditions:
+            return [self.default_recommendation] if self.default_recommendation else []
+        recommendations = list(self.recommendations.get(diagnosis_type, ()))
+        if self.severe_recommendation and any(c.get('severity') == 'severe' for c in conditions):
+            recommendations.insert(0, self.severe_recommendation)
+        return recommendations
+
+    def stats(self) -> Dict:
         return {
-            "paracetamol": [
-                {
-                    "name": "Guduchi (Tinospora cordifolia)",
-                    "usage": "Take 1-2g powder with warm water for fever",
-                    "benefits": "Natural antipyretic, immune booster",
-                    "preparation": "1-2g powder in warm water, 2-3 times daily"
-                },
-                {
-                    "name": "Tulsi (Holy Basil)",
-                    "usage": "Drink Tulsi tea for fever and pain",
-                    "benefits": "Antipyretic, analgesic properties",
-                    "preparation": "Boil 10-15 leaves in 2 cups water, strain"
-                }
-            ],
-            "ibuprofen": [
-                {
-                    "name": "Shallaki (Boswellia serrata)",
-                    "usage": "Take 500mg-1g powder for inflammation",
-                    "benefits": "Natural anti-inflammatory, pain relief",
-                    "preparation": "500mg-1g powder with warm water, 2 times daily"
-                },
-                {
-                    "name": "Turmeric and Ginger",
-                    "usage": "Take turmeric-ginger decoction",
-                    "benefits": "Anti-inflammatory, pain relief",
-                    "preparation": "1 tsp each in 2 cups water, boil, add honey"
-                }
-            ],
-            "amoxicillin": [
-                {
-                    "name": "Neem and Turmeric",
-                    "usage": "Take neem-turmeric combination",
-                    "benefits": "Natural antibacterial, immune support",
-                    "preparation": "Neem powder 500mg + Turmeric 500mg, 2 times daily"
-                },
-                {
-                    "name": "Garlic",
-                    "usage": "Consume raw garlic or garlic supplements",
-                    "benefits": "Natural antibiotic, antimicrobial",
-                    "preparation": "2-3 cloves raw garlic daily, or supplements"
-                }
-            ]
+            "source": self.source,
+            "version": self.version,
+            "diagnosis_types": len(self.conditions),
+            "conditions": sum(len(table) for table in self.conditions.values()),
+            "medicines": self.medicine_count,
         }
-    
+
+
+class AyurvedicRemedyService:
+    """Service for providing Ayurvedic remedies and recommendations"""
+
+    def __init__(self, path: str = REMEDY_DATA_PATH, cache_size: int = REMEDY_CACHE_SIZE):
+        self.path = path
+        self.data = RemedyData({})
+        self.reloads = 0
+        self.reload_errors = 0
+        self.last_error: Optional[str] = None
+        self.loaded_at: Optional[float] = None
+        self._seen_version = ""
+        self._reload_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_watching = threading.Event()
+        # Resolved diagnoses, least recently used first
+        self.cache_size = max(0, int(cache_size))
+        self._diagnoses: "OrderedDict[tuple, DiagnosisRemedies]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reload()
+
+    @property
+    def version(self) -> str:
+        """Fingerprint of the data file the current remedies were read from"""
+        return self.data.version
+
+    def reload(self) -> bool:
+        """
+        Read the data file into a new snapshot and swap it in. On error the
+        current remedies stay in use and the error is kept in ``last_error``.
+        """
+        with self._reload_lock:
+            try:
+                data = RemedyData.load(self.path)
+            except (OSError, ValueError) as e:
+                # Not retried until the file changes again
+                self._seen_version = file_fingerprint(self.path)
+                self.reload_errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                logger.warning("Remedy data not loaded from %s: %s", self.path, e)
+                return False
+            self.data = data
+            self._seen_version = data.version
+            with self._lock:
+                self._diagnoses.clear()
+            self.reloads += 1
+            self.last_error = None
+            self.loaded_at = time.time()
+            logger.info("Loaded remedy data from %s", self.path, extra=data.stats())
+            return True
+
+    def start_watching(self, interval: float = REMEDY_RELOAD_INTERVAL_SECONDS):
+        """Reload in a background thread whenever the data file changes"""
+        if interval <= 0 or (self._watcher and self._watcher.is_alive()):
+            return
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="remedy-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop_watching.set()
+        if self._watcher:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def _watch(self, interval: float):
+        while not self._stop_watching.wait(interval):
+            if file_fingerprint(self.path) != self._seen_version:
+                self.reload()
+
     def get_condition_remedies(
         self,
         condition_name: str,
         diagnosis_type: str
     ) -> List[Dict]:
         """Get Ayurvedic remedies for a specific condition"""
-        remedies = []
-        
-        condition_lower = condition_name.lower()
-        type_remedies = self.remedy_database.get(diagnosis_type, {})
-        
-        # Try exact match first
-        for condition_key, condition_remedies in type_remedies.items():
-            if condition_key.lower() in condition_lower or condition_lower in condition_key.lower():
-                remedies.extend(condition_remedies)
-        
-        # If no match, return general remedies for the type
-        if not remedies and diagnosis_type in self.remedy_database:
-            # Return first condition's remedies as general guidance
-            first_condition = list(type_remedies.values())[0] if type_remedies else []
-            remedies.extend(first_condition[:2])  # Limit to 2 general remedies
-        
-        return remedies
-    
+        return self.data.condition_remedies(condition_name, diagnosis_type)
+
     def get_medicine_remedies(
         self,
         medicine_name: str,
         category: str = "general"
-    ) -> List[Dict]:
+    ) -> Remedies:
         """Get Ayurvedic alternatives for a medicine"""
-        medicine_lower = medicine_name.lower()
-        
-        # Try exact match
-        if medicine_lower in self.medicine_remedies:
-            return self.medicine_remedies[medicine_lower]
-        
-        # Try partial match
-        for med_key, remedies in self.medicine_remedies.items():
-            if med_key in medicine_lower or medicine_lower in med_key:
-                return remedies
-        
-        # Return general immune boosters if no match
-        return [
-            {
-                "name": "Tulsi (Holy Basil)",
-                "usage": "Daily consumption for overall health",
-                "benefits": "Immune booster, adaptogen",
-                "preparation": "Tea or fresh leaves"
-            },
-            {
-                "name": "Ashwagandha",
-                "usage": "Take 500mg-1g powder with warm milk",
-                "benefits": "Stress relief, immune support",
-                "preparation": "500mg-1g powder in warm milk at night"
-            }
-        ]
-    
+        return self.data.medicine_remedies(medicine_name)
+
     def get_recommendations(
         self,
         conditions: List[Dict],
         diagnosis_type: str
     ) -> List[str]:
         """Get general recommendations based on conditions"""
-        recommendations = []
-        
-        if not conditions:
-            return ["No specific recommendations. Maintain healthy lifestyle."]
-        
-        # General recommendations based on type
-        if diagnosis_type == "skin":
-            recommendations.extend([
-                "Maintain proper hydration - drink 8-10 glasses of water daily",
-                "Follow a Pitta-pacifying diet (cooling foods, avoid spicy)",
-                "Practice daily Abhyanga (oil massage) with suitable oils",
-                "Avoid excessive sun exposure, use natural sun protection"
-            ])
-        elif diagnosis_type == "eye":
-            recommendations.extend([
-                "Practice Trataka (gazing meditation) for eye health",
-                "Reduce screen time, take regular breaks",
-                "Apply cool compress with rose water",
-                "Ensure adequate sleep (7-8 hours)"
-            ])
-        elif diagnosis_type == "tongue":
-            recommendations.extend([
-                "Practice daily tongue scraping (Jihwa Prakshalana)",
-                "Improve digestion with proper meal timing",
-                "Avoid incompatible food combinations",
-                "Consider Panchakarma for deep detoxification"
-            ])
-        elif diagnosis_type == "nail":
-            recommendations.extend([
-                "Maintain proper nail hygiene",
-                "Include calcium and protein in diet",
-                "Massage nails with warm oil regularly",
-                "Avoid harsh chemicals and excessive water exposure"
-            ])
-        
-        # Add severity-based recommendations
-        severe_conditions = [c for c in conditions if c.get('severity') == 'severe']
-        if severe_conditions:
-            recommendations.insert(0, "⚠️ IMPORTANT: Consult a qualified Ayurvedic Vaidya or medical doctor immediately for severe conditions.")
-        
-        return recommendations
+        return self.data.recommendations_for(conditions, diagnosis_type)
+
+    def diagnosis_remedies(self, conditions: List[Dict], diagnosis_type: str) -> DiagnosisRemedies:
+        """
+        Remedies for every condition plus recommendations, as
+        ``get_condition_remedies`` and ``get_recommendations`` give them.
+
+        The result depends only on the condition names, the diagnosis type
+        and whether a condition is severe, so it is resolved once per such
+        key and the same (read-only) result is returned afterwards, until
+        the remedy data is reloaded.
+        """
+        # One snapshot for the whole resolution, even if a reload swaps it meanwhile
+        data = self.data
+        key = (
+            data.version,
+            tuple(condition['name'] for condition in conditions),
+            diagnosis_type,
+            any(condition.get('severity') == 'severe' for condition in conditions),
+        )
+        with self._lock:
+            resolved = self._diagnoses.get(key)
+            if resolved is not None:
+                self._diagnoses.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        CACHE_LOOKUPS.inc(cache="remedies", result="miss" if resolved is None else "hit")
+        if resolved is not None:
+            return resolved
+
+        remedies = []
+        for condition in conditions:
+            remedies.extend(data.condition_remedies(condition['name'], diagnosis_type))
+        resolved = DiagnosisRemedies(
+            tuple(remedies),
+            tuple(data.recommendations_for(conditions, diagnosis_type)),
+        )
+        if self.cache_size:
+            with self._lock:
+                self._diagnoses[key] = resolved
+                while len(self._diagnoses) > self.cache_size:
+                    self._diagnoses.popitem(last=False)
+                    self.evictions += 1
+        return resolved
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._diagnoses),
+            "max_entries": self.cache_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def data_stats(self) -> Dict:
+        """Current remedy data and the reloads so far"""
+        return {
+            **self.data.stats(),
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "last_error": self.last_error,
+            "watching": bool(self._watcher and self._watcher.is_alive()),
+        }
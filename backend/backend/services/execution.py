@@ -0,0 +1,141 @@
+"""
+CPU Execution Layer
+Runs blocking image, tensor and OCR work in bounded worker pools so the
+asyncio event loop only handles I/O
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+# Pool sizes are configured separately: OCR jobs are long and mostly wait on the
+# tesseract subprocess, tensor jobs are short and saturate CPU cores.
+OCR_POOL_SIZE = int(os.environ.get("OCR_POOL_SIZE", "2"))
+TENSOR_POOL_SIZE = int(os.environ.get("TENSOR_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+
+# "thread" or "process". Tensor work always runs in threads because the model
+# weights live in this process (PyTorch and PIL release the GIL for heavy ops).
+OCR_POOL_KIND = os.environ.get("OCR_POOL_KIND", "thread").lower()
+
+
+class ExecutionLayer:
+    """Bounded worker pools for OCR and tensor/image stages"""
+
+    def __init__(
+        self,
+        ocr_workers: int = OCR_POOL_SIZE,
+        tensor_workers: int = TENSOR_POOL_SIZE,
+        ocr_kind: str = OCR_POOL_KIND,
+    ):
+        if ocr_kind not in ("thread", "process"):
+            raise ValueError(f"OCR_POOL_KIND must be 'thread' or 'process', got {ocr_kind!r}")
+
+        self.ocr_workers = max(1, int(ocr_workers))
+        self.tensor_workers = max(1, int(tensor_workers))
+        self.ocr_kind = ocr_kind
+        self._ocr_pool: Optional[Executor] = None
+        self._tensor_pool: Optional[Executor] = None
+        self._in_flight = {"ocr": 0, "tensor": 0}
+        self._completed = {"ocr": 0, "tensor": 0}
+
+    @property
+    def ocr_pool(self) -> Executor:
+        if self._ocr_pool is None:
+            if self.ocr_kind == "process":
+                self._ocr_pool = ProcessPoolExecutor(max_workers=self.ocr_workers)
+            else:
+                self._ocr_pool = ThreadPoolExecutor(
+                    max_workers=self.ocr_workers, thread_name_prefix="ocr"
+                )
+        return self._ocr_pool
+
+    @property
+    def tensor_pool(self) -> Executor:
+        if self._tensor_pool is None:
+            self._tensor_pool = ThreadPoolExecutor(
+                max_workers=self.tensor_workers, thread_name_prefix="tensor"
+            )
+        return self._tensor_pool
+
+    async def _run(self, stage: str, pool: Executor, fn: Callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        call = functools.partial(fn, *args, **kwargs)
+        if isinstance(pool, ThreadPoolExecutor):
+            # Keep request-scoped context variables visible inside the worker thread
+            call = functools.partial(contextvars.copy_context().run, call)
+
+        self._in_flight[stage] += 1
+        try:
+            return await loop.run_in_executor(pool, call)
+        finally:
+            self._in_flight[stage] -= 1
+            self._completed[stage] += 1
+
+    async def run_tensor(self, fn: Callable, *args, **kwargs):
+        """Run image decoding, preprocessing, rule checks or a forward pass"""
+        return await self._run("tensor", self.tensor_pool, fn, *args, **kwargs)
+
+    async def run_ocr(self, fn: Callable, *args, **kwargs):
+        """
+        Run an OCR job. With a process pool, ``fn`` and its arguments must be
+        picklable (module-level function, PIL image).
+        """
+        return await self._run("ocr", self.ocr_pool, fn, *args, **kwargs)
+
+    def shutdown(self, wait: bool = True):
+        """Stop both pools; they are recreated on next use"""
+        for pool in (self._ocr_pool, self._tensor_pool):
+            if pool is not None:
+                pool.shutdown(wait=wait)
+        self._ocr_pool = None
+        self._tensor_pool = None
+
+    def reset_after_fork(self):
+        """
+        Forget pools inherited from a parent process. Their worker threads do
+        not exist after fork(); new pools are created on next use.
+        """
+        self._ocr_pool = None
+        self._tensor_pool = None
+        self._in_flight = {"ocr": 0, "tensor": 0}
+        self._completed = {"ocr": 0, "tensor": 0}
+
+    def stats(self) -> Dict:
+        return {
+            "ocr": {
+                "kind": self.ocr_kind,
+                "workers": self.ocr_workers,
+                "in_flight": self._in_flight["ocr"],
+                "completed": self._completed["ocr"],
+            },
+            "tensor": {
+                "kind": "thread",
+                "workers": self.tensor_workers,
+                "in_flight": self._in_flight["tensor"],
+                "completed": self._completed["tensor"],
+            },
+        }
+
+
+_execution_layer: Optional[ExecutionLayer] = None
+
+
+def get_execution_layer() -> ExecutionLayer:
+    """Return the process-wide execution layer (created on first use)"""
+    global _execution_layer
+    if _execution_layer is None:
+        _execution_layer = ExecutionLayer()
+    return _execution_layer
+
+
+def _reset_execution_layer_after_fork():
+    if _execution_layer is not None:
+        _execution_layer.reset_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    # Pre-fork servers (serve.py) fork workers after the models were loaded
+    os.register_at_fork(after_in_child=_reset_execution_layer_after_fork)
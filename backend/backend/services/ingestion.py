@@ -0,0 +1,319 @@
+"""
+Upload Ingestion
+Size-bounded ingestion of uploaded images: oversized request bodies are refused
+while they stream in, the image header is checked before any full decode, and
+the spooled upload is hashed in chunks and handed to the decoder as a file
+object instead of being read into memory as one bytes object
+"""
+
+import binascii
+import io
+import json
+import os
+import re
+from typing import AsyncIterator, BinaryIO, Dict, Optional, Tuple
+
+from PIL import Image, UnidentifiedImageError
+
+from services.result_cache import image_hasher
+
+# Largest accepted image file
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", str(15 * 1024 * 1024)))
+# Largest accepted image area, checked from the header before decoding
+UPLOAD_MAX_PIXELS = int(os.environ.get("UPLOAD_MAX_PIXELS", "50000000"))
+# Formats accepted from the header (PIL format names). MPO is the multi-picture
+# JPEG that many phone cameras write
+UPLOAD_FORMATS = tuple(
+    name.strip().upper()
+    for name in os.environ.get("UPLOAD_FORMATS", "JPEG,MPO,PNG,WEBP,BMP,GIF,TIFF").split(",")
+    if name.strip()
+)
+
+_CHUNK_BYTES = 256 * 1024
+# Base64 characters decoded per step (a multiple of 4, so chunks split on whole groups)
+_BASE64_CHUNK_CHARS = 64 * 1024
+# Multipart framing and form fields sent along with each file
+_FORM_OVERHEAD_BYTES = 64 * 1024
+
+
+def request_body_limit(files: int = 1) -> int:
+    """
+    Largest request body for ``files`` images of at most ``UPLOAD_MAX_BYTES``
+    each, allowing for base64 expansion (JSON endpoints) and multipart framing.
+    """
+    return files * (UPLOAD_MAX_BYTES * 4 // 3 + _FORM_OVERHEAD_BYTES)
+
+
+class UploadRejected(ValueError):
+    """An upload failed validation; ``status_code`` is the HTTP status to report"""
+
+    def __init__(self, detail: str, status_code: int = 400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+class IngestedUpload:
+    """A validated upload, rewound and ready to be decoded"""
+
+    __slots__ = ("file", "size", "image_hash", "format", "dimensions")
+
+    def __init__(self, file: BinaryIO, size: int, image_hash: str, image_format: str, dimensions: Tuple[int, int]):
+        self.file = file
+        self.size = size
+        self.image_hash = image_hash
+        self.format = image_format
+        self.dimensions = dimensions
+
+
+def inspect_header(file: BinaryIO, min_size: Optional[int] = 50) -> Tuple[str, Tuple[int, int]]:
+    """
+    Read only the image header and check its format and dimensions.
+
+    Returns:
+        (format, (width, height))
+    """
+    try:
+        # Image.open is lazy: it parses the header and does not decode pixels
+        image = Image.open(file)
+    except Image.DecompressionBombError:
+        raise UploadRejected("Image dimensions too large", status_code=413)
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError) as e:
+        raise UploadRejected(f"Invalid image format: {str(e)}")
+
+    image_format, (width, height) = image.format, image.size
+    if image_format not in UPLOAD_FORMATS:
+        raise UploadRejected(
+            f"Unsupported image format {image_format}. Use one of: {', '.join(UPLOAD_FORMATS)}",
+            status_code=415
+        )
+    if width * height > UPLOAD_MAX_PIXELS:
+        raise UploadRejected(
+            f"Image dimensions too large ({width}x{height}); at most {UPLOAD_MAX_PIXELS} pixels",
+            status_code=413
+        )
+    if min_size and (width < min_size or height < min_size):
+        raise UploadRejected("Image too small. Please upload a larger image.")
+    return image_format, (width, height)
+
+
+def ingest_file(file: BinaryIO, max_bytes: int = UPLOAD_MAX_BYTES, min_size: Optional[int] = 50) -> IngestedUpload:
+    """
+    Validate and hash a seekable upload (e.g. the spooled file behind an
+    ``UploadFile``) without reading it into memory at once.
+    Blocking; called through the execution layer, never on the event loop.
+
+    Checks, cheapest first: byte size, image header, then a chunked content
+    hash. The file is left rewound for the decoder.
+
+    Raises:
+        UploadRejected: Empty, too large, not an accepted image, or too small
+    """
+    size = file.seek(0, os.SEEK_END)
+    if size == 0:
+        raise UploadRejected("Empty image file")
+    if size > max_bytes:
+        raise UploadRejected(f"Image file too large; at most {max_bytes} bytes", status_code=413)
+
+    file.seek(0)
+    image_format, dimensions = inspect_header(file, min_size)
+
+    file.seek(0)
+    hasher = image_hasher()
+    for chunk in iter(lambda: file.read(_CHUNK_BYTES), b""):
+        hasher.update(chunk)
+
+    file.seek(0)
+    return IngestedUpload(file, size, hasher.hexdigest(), image_format, dimensions)
+
+
+def ingest_buffer(buffer, max_bytes: int = UPLOAD_MAX_BYTES, min_size: Optional[int] = 50) -> IngestedUpload:
+    """Same as ``ingest_file`` for an upload already in memory (bytes, bytearray or memoryview; not copied)"""
+    return ingest_file(BufferReader(buffer), max_bytes, min_size)
+
+
+async def read_body(
+    chunks: AsyncIterator[bytes],
+    content_length: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+) -> bytearray:
+    """
+    Receive a request body into one buffer preallocated from Content-Length,
+    instead of collecting the chunks and joining them into a second copy.
+    """
+    buffer = bytearray(content_length or 0)
+    size = 0
+    async for chunk in chunks:
+        end = size + len(chunk)
+        if max_bytes is not None and end > max_bytes:
+            raise UploadRejected(f"Request body too large; at most {max_bytes} bytes", status_code=413)
+        if end <= len(buffer):
+            buffer[size:end] = chunk
+        else:
+            # Missing or wrong Content-Length: grow as needed
+            del buffer[size:]
+            buffer += chunk
+        size = end
+    # Body shorter than Content-Length: trim in place
+    del buffer[size:]
+    return buffer
+
+
+def find_base64_field(body, key: str = "image") -> memoryview:
+    """
+    Locate the base64 payload of ``key`` in a JSON body and return it as a
+    view into the body (data URL prefix removed), without parsing the JSON
+    into Python strings. Bodies whose value uses JSON escapes fall back to
+    ``json.loads``.
+
+    Raises:
+        UploadRejected: Invalid JSON or missing field
+    """
+    match = re.search(rb'"' + re.escape(key.encode()) + rb'"\s*:\s*"', body)
+    if match:
+        start = match.end()
+        end = body.find(b'"', start)
+        if end > start and body.find(b'\\', start, end) < 0:
+            # Remove data URL prefix if present (base64 itself has no commas)
+            comma = body.find(b',', start, end)
+            if comma >= 0:
+                start = comma + 1
+            return memoryview(body)[start:end]
+
+    try:
+        value = json.loads(body)
+    except ValueError as e:
+        raise UploadRejected(f"Invalid JSON body: {str(e)}")
+    encoded = value.get(key) if isinstance(value, dict) else None
+    if not encoded or not isinstance(encoded, str):
+        raise UploadRejected(f"{key} field required in base64 format")
+    if ',' in encoded:
+        encoded = encoded.split(',')[1]
+    return memoryview(encoded.encode('ascii', errors='ignore'))
+
+
+def decode_base64(encoded) -> memoryview:
+    """
+    Decode base64 into one preallocated buffer, a fixed-size chunk at a
+    time, so only the decoded image (plus one small chunk) is allocated.
+
+    Raises:
+        UploadRejected: The data is not valid base64
+    """
+    encoded = memoryview(encoded).cast("B")
+    length = len(encoded)
+    output = bytearray(length // 4 * 3 + 3)
+    view = memoryview(output)
+    position = 0
+    try:
+        for start in range(0, length, _BASE64_CHUNK_CHARS):
+            chunk = binascii.a2b_base64(encoded[start:start + _BASE64_CHUNK_CHARS])
+            view[position:position + len(chunk)] = chunk
+            position += len(chunk)
+    except binascii.Error:
+        # Embedded whitespace can split a 4-character group across chunks
+        try:
+            decoded = binascii.a2b_base64(encoded)
+        except binascii.Error as e:
+            raise UploadRejected(f"Invalid base64 image data: {str(e)}")
+        view[:len(decoded)] = decoded
+        position = len(decoded)
+    return view[:position]
+
+
+class BufferReader(io.RawIOBase):
+    """Seekable read-only file over a bytes-like object, without copying it"""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        count = max(0, min(len(target), len(self._view) - self._position))
+        target[:count] = self._view[self._position:self._position + count]
+        self._position += count
+        return count
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_SET:
+            base = 0
+        elif whence == os.SEEK_CUR:
+            base = self._position
+        else:
+            base = len(self._view)
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+class BodySizeLimitMiddleware:
+    """
+    ASGI middleware that refuses request bodies above a byte limit with 413
+    while they stream in: immediately when Content-Length is too large,
+    otherwise as soon as the received bytes cross the limit (chunked uploads).
+    The multipart parser therefore never spools more than the limit.
+    """
+
+    def __init__(self, app, max_bytes: int, path_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.path_limits.get(scope["path"], self.max_bytes)
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                if value.isdigit() and int(value) > limit:
+                    await self._reject(send, limit)
+                    return
+                break
+
+        received = 0
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    rejected = True
+                    await self._reject(send, limit)
+                    # The app sees a client disconnect and stops reading
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            # Drop the app's own error response once 413 has been sent
+            if not rejected:
+                await send(message)
+
+        await self.app(scope, limited_receive, guarded_send)
+
+    @staticmethod
+    async def _reject(send, limit: int):
+        body = f'{{"detail":"Request body too large; at most {limit} bytes"}}'.encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
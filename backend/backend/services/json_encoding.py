@@ -0,0 +1,142 @@
+"""
+JSON Encoding
+Response serialization with orjson when it is installed (the stdlib encoder
+otherwise), and pre-encoded fragments for the remedy payloads
+
+Remedy and recommendation lists are the bulk of a scan or diagnosis
+response and are shared, read-only tuples (see ``AyurvedicRemedyService``).
+With the stdlib encoder, every tuple in a response is therefore encoded
+once, kept in a small cache, and its bytes are spliced into each response
+that carries it; only the rest of the response is encoded per request.
+orjson encodes a whole response faster than the payload can be walked to
+find the tuples, so it encodes responses directly (see
+benchmark_json_encoding.py).
+"""
+
+import json
+import os
+import secrets
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# "auto" (orjson if installed, else the stdlib encoder), "orjson" or "json"
+JSON_ENCODER = os.environ.get("JSON_ENCODER", "auto").lower()
+# Encoded remedy tuples kept for splicing (0 disables splicing)
+JSON_FRAGMENT_CACHE_SIZE = int(os.environ.get("JSON_FRAGMENT_CACHE_SIZE", "1024"))
+
+# Stands in for a fragment while the rest is encoded; the random part keeps
+# strings in the content (e.g. file names) from being mistaken for one
+_PLACEHOLDER = f"\x00{secrets.token_hex(8)}\x00"
+_ENCODED_PLACEHOLDER = json.dumps(_PLACEHOLDER).encode()
+
+
+def _stdlib_dumps(content: Any) -> bytes:
+    # Same output as Starlette's JSONResponse
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def _orjson_dumps(content: Any) -> bytes:
+    return orjson.dumps(content)
+
+
+def select_encoder(name: str = JSON_ENCODER):
+    """The dumps function for JSON_ENCODER"""
+    if name not in ("auto", "orjson", "json"):
+        raise ValueError(f"JSON_ENCODER must be 'auto', 'orjson' or 'json', got {name!r}")
+    if name == "json" or (name == "auto" and orjson is None):
+        return _stdlib_dumps
+    if orjson is None:
+        raise RuntimeError("JSON_ENCODER=orjson but orjson is not installed (pip install orjson)")
+    return _orjson_dumps
+
+
+dumps = select_encoder()
+
+
+class FragmentCache:
+    """
+    Encoded bytes of shared tuples, by identity (LRU, bounded). The tuples are
+    kept referenced while cached, so an ID can't be reused by another object.
+    Used from the event loop only, like the result cache.
+    """
+
+    def __init__(self, max_entries: int = JSON_FRAGMENT_CACHE_SIZE, encoder=None, splice: Optional[bool] = None):
+        self.max_entries = max(0, int(max_entries))
+        self._dumps = encoder or dumps
+        # Splicing only pays off with the stdlib encoder
+        self.splice = (self._dumps is not _orjson_dumps) if splice is None else splice
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def encode(self, value: tuple) -> bytes:
+        entry = self._entries.get(id(value))
+        if entry is not None:
+            self._entries.move_to_end(id(value))
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        encoded = self._dumps(value)
+        self._entries[id(value)] = (value, encoded)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return encoded
+
+    def render(self, content: Any) -> bytes:
+        """Encode ``content``, splicing in the cached bytes of every tuple in it"""
+        if not (self.splice and self.max_entries):
+            return self._dumps(content)
+        fragments: List[bytes] = []
+
+        def replace(value):
+            # Only dicts and lists are rebuilt; other values are encoded as they are
+            if type(value) is dict:
+                return {key: replace(item) for key, item in value.items()}
+            if type(value) is list:
+                return [replace(item) for item in value]
+            if type(value) is tuple and value:
+                fragments.append(self.encode(value))
+                return _PLACEHOLDER
+            return value
+
+        encoded = self._dumps(replace(content))
+        if not fragments:
+            return encoded
+        parts = encoded.split(_ENCODED_PLACEHOLDER)
+        spliced = [parts[0]]
+        for fragment, part in zip(fragments, parts[1:]):
+            spliced += (fragment, part)
+        return b"".join(spliced)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "encoder": "orjson" if self._dumps is _orjson_dumps else "json",
+            "splicing": self.splice and self.max_entries > 0,
+            "fragments": len(self._entries),
+            "max_fragments": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+fragment_cache = FragmentCache()
+
+
+class FastJSONResponse(JSONResponse):
+    """``JSONResponse`` encoded by ``fragment_cache``: the selected encoder plus spliced remedy fragments"""
+
+    def render(self, content: Any) -> bytes:
+        return fragment_cache.render(content)
@@ -0,0 +1,264 @@
+"""
+Medicine Catalog
+Medicines the scanner can identify, with their aliases (``common_names``)
+
+Two stores with the same lookups:
+- ``InMemoryCatalog``: the small built-in dictionary, with an alias automaton
+  and a fuzzy index held in memory
+- ``SqliteCatalog``: a catalog file built by ``build_medicine_catalog.py``,
+  for large catalogs. Opening it reads nothing but its header; every lookup
+  is an indexed query and only the matched records are loaded, so startup
+  time and memory don't grow with the number of medicines.
+
+Records are dicts with ``name``, ``category``, ``uses`` and ``common_names``.
+"""
+
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from ml_models.alias_matcher import AliasMatcher
+from ml_models.fuzzy_names import (
+    MEDICINE_FUZZY_THRESHOLD,
+    FuzzyNameIndex,
+    candidate_words,
+    deletion_variants,
+    rank,
+    similarity,
+)
+from services.alias_index import AliasIndex, alias_key, prefix_range, word_ngrams
+
+# Catalog file built by build_medicine_catalog.py; the built-in medicines are used without it
+MEDICINE_CATALOG_PATH = os.environ.get("MEDICINE_CATALOG_PATH", "data/medicine_catalog.sqlite")
+# Catalog records kept in memory after a lookup
+MEDICINE_CATALOG_CACHE_SIZE = int(os.environ.get("MEDICINE_CATALOG_CACHE_SIZE", "1024"))
+
+# SQLite's limit on bound parameters was 999 before version 3.32
+_MAX_QUERY_PARAMETERS = 900
+
+BUILTIN_MEDICINES = {
+    "paracetamol": {
+        "name": "Paracetamol",
+        "category": "Pain Reliever",
+        "uses": "Fever, pain relief",
+        "common_names": ["paracetamol", "acetaminophen", "tylenol"]
+    },
+    "ibuprofen": {
+        "name": "Ibuprofen",
+        "category": "NSAID",
+        "uses": "Inflammation, pain, fever",
+        "common_names": ["ibuprofen", "advil", "motrin"]
+    },
+    "amoxicillin": {
+        "name": "Amoxicillin",
+        "category": "Antibiotic",
+        "uses": "Bacterial infections",
+        "common_names": ["amoxicillin", "amoxil"]
+    },
+}
+
+Match = Tuple[str, Dict]
+
+# Names the scanner reports when it found no medicine; never looked up
+_UNKNOWN_NAMES = frozenset({"unknown", "unknown medicine"})
+
+# Keys a medicine's details are found by, in priority order: catalog order,
+# then ID, name and aliases (as InMemoryCatalog.detail_index lists them)
+_DETAIL_KEYS = (
+    "SELECT id AS medicine_id, 0 AS rank, key AS candidate FROM medicines "
+    "UNION ALL SELECT id, 1, name_key FROM medicines "
+    "UNION ALL SELECT medicine_id, 1 + id, alias FROM aliases"
+)
+
+
+class InMemoryCatalog:
+    """Catalog held in a dict (medicine ID -> record)"""
+
+    kind = "memory"
+
+    def __init__(self, medicines: Dict[str, Dict]):
+        self.medicines = medicines
+        # Every alias of every medicine, matched against OCR text in one pass,
+        # and indexed for text with OCR misreadings
+        aliases = [
+            (name, medicine_id)
+            for medicine_id, medicine_data in medicines.items()
+            for name in medicine_data.get('common_names', [])
+        ]
+        self.name_matcher = AliasMatcher(aliases)
+        self.fuzzy_names = FuzzyNameIndex(aliases)
+        # Medicine ID, name and aliases -> record, for details by name (the
+        # same keys and priority as SqliteCatalog.details)
+        self.detail_index = AliasIndex(
+            ([medicine_id, medicine_data.get('name', ''), *medicine_data.get('common_names', [])], medicine_data)
+            for medicine_id, medicine_data in medicines.items()
+        )
+
+    def exact_matches(self, text: str) -> List[Match]:
+        """(alias, record) of every alias occurring in the text, in catalog order"""
+        return [(name, self.medicines[medicine_id]) for name, medicine_id in self.name_matcher.matches(text)]
+
+    def fuzzy_matches(self, text: str, limit: int = 5) -> List[Tuple[str, Dict, float]]:
+        """(alias, record, similarity) of aliases the text contains misread, best first"""
+        return [
+            (name, self.medicines[medicine_id], score)
+            for name, medicine_id, score in self.fuzzy_names.search(text, limit)
+        ]
+
+    def details(self, medicine_name: str) -> Optional[Dict]:
+        """Record of the medicine with this ID, name or alias, else of a partial match"""
+        if alias_key(medicine_name) in _UNKNOWN_NAMES:
+            return None
+        return self.detail_index.lookup(medicine_name)
+
+    def stats(self) -> Dict:
+        return {"kind": self.kind, "medicines": len(self.medicines), **self.name_matcher.stats()}
+
+
+class SqliteCatalog:
+    """
+    Read-only catalog file.
+
+    OCR text is matched by looking up its word n-grams (up to the longest
+    alias, in words) in the alias index, rather than by substring search:
+    an alias has to appear as whole words. Misread names are looked up by
+    their symmetric-delete keys, stored in the file by the build script.
+    """
+
+    kind = "sqlite"
+
+    def __init__(self, path: str, cache_size: int = MEDICINE_CATALOG_CACHE_SIZE,
+                 threshold: float = MEDICINE_FUZZY_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._local = threading.local()
+        meta = dict(self._query("SELECT key, value FROM meta"))
+        self.max_alias_words = int(meta.get("max_alias_words", "1"))
+        self.medicine_count = int(meta.get("medicines", "0"))
+        self.alias_count = int(meta.get("aliases", "0"))
+        self.record = lru_cache(maxsize=cache_size)(self._load_record)
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread and process (connections must not cross a fork)
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def _query(self, sql: str, parameters=()) -> List[tuple]:
+        return self._connection().execute(sql, parameters).fetchall()
+
+    def _query_in(self, sql: str, values: List) -> List[tuple]:
+        """Run ``sql`` (with one ``IN ({})`` placeholder) over the values in chunks"""
+        rows = []
+        for start in range(0, len(values), _MAX_QUERY_PARAMETERS):
+            chunk = values[start:start + _MAX_QUERY_PARAMETERS]
+            rows.extend(self._query(sql.format(",".join("?" * len(chunk))), chunk))
+        return rows
+
+    def _load_record(self, medicine_id: int) -> Dict:
+        name, category, uses = self._query(
+            "SELECT name, category, uses FROM medicines WHERE id = ?", (medicine_id,)
+        )[0]
+        aliases = self._query("SELECT alias FROM aliases WHERE medicine_id = ? ORDER BY id", (medicine_id,))
+        return {"name": name, "category": category, "uses": uses, "common_names": [alias for alias, in aliases]}
+
+    def _ngrams(self, text: str) -> List[str]:
+        words = alias_key(text).split()
+        return list(dict.fromkeys(
+            " ".join(words[start:start + size])
+            for size in range(1, self.max_alias_words + 1)
+            for start in range(len(words) - size + 1)
+        ))
+
+    def exact_matches(self, text: str) -> List[Match]:
+        """(alias, record) of every alias occurring in the text as whole words, in catalog order"""
+        ngrams = self._ngrams(text)
+        if not ngrams:
+            return []
+        rows = self._query_in("SELECT id, alias, medicine_id FROM aliases WHERE alias IN ({})", ngrams)
+        return [(alias, self.record(medicine_id)) for _, alias, medicine_id in sorted(rows)]
+
+    def fuzzy_matches(self, text: str, limit: int = 5) -> List[Tuple[str, Dict, float]]:
+        """(alias, record, similarity) of aliases the text contains misread, best first"""
+        words = candidate_words(text)
+        variants = {}
+        for word in words:
+            for variant in deletion_variants(word):
+                variants.setdefault(variant, []).append(word)
+        if not variants:
+            return []
+        rows = self._query_in(
+            "SELECT v.variant, a.id, a.alias, a.normalized, a.medicine_id FROM alias_variants v "
+            "JOIN aliases a ON a.id = v.alias_id WHERE v.variant IN ({})",
+            list(variants),
+        )
+        best, found = {}, {}
+        for variant, alias_id, alias, normalized, medicine_id in rows:
+            for word in variants[variant]:
+                score = similarity(word, normalized)
+                if score >= self.threshold and score > best.get(alias_id, 0.0):
+                    best[alias_id] = score
+                    found[alias_id] = (alias, medicine_id)
+        return [
+            (found[alias_id][0], self.record(found[alias_id][1]), score)
+            for alias_id, score in rank(best, limit)
+        ]
+
+    def details(self, medicine_name: str) -> Optional[Dict]:
+        """
+        Record of a medicine by ID, name or alias; else the first of those
+        keys that starts with the name or is a run of whole words in it.
+        Both are index lookups (a key range and an IN list), with the same
+        rule and priority as ``AliasIndex.lookup`` on ``InMemoryCatalog``.
+        """
+        key = alias_key(medicine_name)
+        if not key or key in _UNKNOWN_NAMES:
+            return None
+        rows = self._query(
+            f"SELECT medicine_id FROM ({_DETAIL_KEYS}) WHERE candidate = ? ORDER BY medicine_id, rank LIMIT 1",
+            (key,),
+        )
+        if not rows:
+            conditions, parameters = [], []
+            ngrams = word_ngrams(key)
+            if ngrams:
+                conditions.append(f"candidate IN ({','.join('?' * len(ngrams))})")
+                parameters.extend(ngrams)
+            bounds = prefix_range(key)
+            if bounds is not None:
+                conditions.append("(candidate >= ? AND candidate < ?)")
+                parameters.extend(bounds)
+            if not conditions:
+                return None
+            rows = self._query(
+                f"SELECT medicine_id FROM ({_DETAIL_KEYS}) WHERE {' OR '.join(conditions)} "
+                "ORDER BY medicine_id, rank LIMIT 1",
+                parameters,
+            )
+        return self.record(rows[0][0]) if rows else None
+
+    def stats(self) -> Dict:
+        cache = self.record.cache_info()
+        return {
+            "kind": self.kind,
+            "path": self.path,
+            "medicines": self.medicine_count,
+            "aliases": self.alias_count,
+            "cached_records": cache.currsize,
+            "record_cache_hits": cache.hits,
+            "record_cache_misses": cache.misses,
+        }
+
+
+def load_medicine_catalog(path: str = MEDICINE_CATALOG_PATH):
+    """The catalog file if it exists, else the built-in medicines"""
+    if path and os.path.exists(path):
+        try:
+            return SqliteCatalog(path)
+        except sqlite3.Error as e:
+            print(f"Warning: could not open medicine catalog {path}: {e}. Using built-in medicines.")
+    return InMemoryCatalog(BUILTIN_MEDICINES)
@@ -0,0 +1,202 @@
+"""
+Request Metrics
+Per-stage latency histograms and event counters, exposed in the Prometheus
+text format by GET /metrics
+
+Stage timings of one request are collected in a context variable, so code
+running in the execution layer's threads and the inference batcher can add to
+the request that is waiting for it.
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; covers everything from a cached lookup to a slow Tesseract run
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{escaped}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names"""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed set of label names"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket (non-cumulative) + overflow, sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = position
+                break
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    le = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                cumulative += counts[-1]
+                le = _format_labels(self.label_names, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    "aura_stage_seconds",
+    "Time spent in each request stage",
+    ("endpoint", "diagnosis_type", "method", "stage"),
+)
+REQUEST_SECONDS = Histogram(
+    "aura_request_seconds",
+    "End-to-end handler time of image requests",
+    ("endpoint", "diagnosis_type", "method"),
+)
+BATCH_SIZE = Histogram(
+    "aura_inference_batch_size",
+    "Images per batched forward pass",
+    ("model",),
+    buckets=BATCH_SIZE_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "aura_cache_lookups_total",
+    "Result cache and near-duplicate index lookups",
+    ("cache", "result"),
+)
+FALLBACKS = Counter(
+    "aura_fallbacks_total",
+    "Times a request fell back from its primary method",
+    ("kind",),
+)
+
+_METRICS = (STAGE_SECONDS, REQUEST_SECONDS, BATCH_SIZE, CACHE_LOOKUPS, FALLBACKS)
+
+
+class StageTimings:
+    """Accumulated seconds per stage for one request"""
+
+    __slots__ = ("started", "stages", "_lock")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+
+_current_timings: contextvars.ContextVar[Optional[StageTimings]] = contextvars.ContextVar(
+    "stage_timings", default=None
+)
+
+
+def start_request() -> StageTimings:
+    """Begin collecting stage timings for the current request"""
+    timings = StageTimings()
+    _current_timings.set(timings)
+    return timings
+
+
+def current_timings() -> Optional[StageTimings]:
+    return _current_timings.get()
+
+
+def record_stage(stage: str, seconds: float):
+    """Add time to a stage of the current request (no-op outside a request)"""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block (sync code or an await) as a stage of the current request"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def observe_request(endpoint: str, diagnosis_type: str = "", method: str = ""):
+    """Publish the current request's stage timings and total time to the histograms"""
+    timings = _current_timings.get()
+    if timings is None:
+        return
+    labels = {"endpoint": endpoint, "diagnosis_type": diagnosis_type, "method": method or "unknown"}
+    for name, seconds in timings.stages.items():
+        STAGE_SECONDS.observe(seconds, stage=name, **labels)
+    REQUEST_SECONDS.observe(time.perf_counter() - timings.started, **labels)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
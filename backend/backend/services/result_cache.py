@@ -0,0 +1,130 @@
+"""
+Content-Addressed Result Cache
+In-process LRU cache with TTL for scan and diagnosis responses, keyed by a hash
+of the uploaded image bytes
+"""
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE_TTL_SECONDS = float(os.environ.get("RESULT_CACHE_TTL_SECONDS", "600"))
+
+
+def file_fingerprint(*paths: str) -> str:
+    """Identify the on-disk version of one or more files by size and mtime"""
+    parts = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            parts.append(f"{path}:{st.st_size}:{st.st_mtime_ns}")
+        except OSError:
+            parts.append(f"{path}:missing")
+    return "|".join(parts)
+
+
+def image_hasher():
+    """Incremental hasher producing the same digest as ``hash_image_bytes``"""
+    return hashlib.blake2b(digest_size=16)
+
+
+def hash_image_bytes(image_bytes) -> str:
+    """Content hash of an upload (hashlib releases the GIL for large inputs)"""
+    hasher = image_hasher()
+    hasher.update(image_bytes)
+    return hasher.hexdigest()
+
+
+class ResultCache:
+    """
+    LRU cache with per-entry TTL and a bounded number of entries.
+
+    Cached values are complete response payloads and are treated as read-only.
+    The cache is used from the event loop only, so it needs no locking.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESULT_CACHE_SIZE,
+        ttl_seconds: float = RESULT_CACHE_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._model_versions: Dict[str, str] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(namespace: str, image_hash: str, diagnosis_type: str = "") -> str:
+        """Build a cache key from the endpoint family, image hash and diagnosis type"""
+        return f"{namespace}:{diagnosis_type}:{image_hash}"
+
+    def get(self, key: str) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if self._clock() >= expires_at:
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Dict):
+        if self.max_entries == 0:
+            return
+        self._entries[key] = (self._clock() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def ensure_model_version(self, namespace: str, version: str):
+        """
+        Drop every entry of ``namespace`` when its model checkpoint changed
+        since the last call.
+        """
+        previous = self._model_versions.get(namespace)
+        self._model_versions[namespace] = version
+        if previous is not None and previous != version:
+            self.invalidate(namespace)
+
+    def invalidate(self, namespace: Optional[str] = None):
+        """Remove all entries, or only those of one endpoint family"""
+        if namespace is None:
+            self._entries.clear()
+        else:
+            prefix = f"{namespace}:"
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+        self.invalidations += 1
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,219 @@
+"""
+Structured Logging
+Queue-backed JSON logging for the request path: handlers only enqueue the
+record, and a background listener thread formats it (including tracebacks)
+and writes it out, so a slow stdout pipe never blocks the event loop.
+
+Records carry the request's correlation ID (X-Request-ID), and high-volume
+lines can be sampled per key:
+
+    logger = get_logger(__name__)
+    logger.info("OCR extracted text", extra={"sample": "ocr_text", "ocr_text": text[:100]})
+"""
+
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# "json" (one object per line) or "text"
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json").lower()
+# Keep one of every N records of a sampled line (records with extra={"sample": key})
+LOG_SAMPLE_EVERY = int(os.environ.get("LOG_SAMPLE_EVERY", "10"))
+# Records waiting for the writer thread; further records are dropped (and counted)
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+
+REQUEST_ID_HEADER = "X-Request-ID"
+_ROOT_LOGGER = "aura"
+
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else on a record came from ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the application's queue-backed root (``aura.<name>``)"""
+    return logging.getLogger(f"{_ROOT_LOGGER}.{name}")
+
+
+def current_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, request ID and extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": f"{time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created))}.{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key != "sample":
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _ContextFilter(logging.Filter):
+    """Stamp the request ID and apply per-key sampling (runs in the calling thread)"""
+
+    def __init__(self, sample_every: int):
+        super().__init__()
+        self.sample_every = max(1, sample_every)
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = _request_id.get()
+        key = getattr(record, "sample", None)
+        if key is None or self.sample_every == 1:
+            return True
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % self.sample_every:
+            return False
+        record.sampled_every = self.sample_every
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue records without formatting them. The stock QueueHandler formats
+    the message and the traceback in the caller; here only the %-arguments
+    are merged, the listener formats everything else.
+    """
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _QueueHandler.dropped += 1
+
+
+_handler: Optional[_QueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+_lock = threading.Lock()
+
+
+def _output_handler() -> logging.Handler:
+    handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "text":
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+    else:
+        handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def _start_listener():
+    global _listener
+    log_queue = queue.Queue(maxsize=max(0, LOG_QUEUE_SIZE))
+    _handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, _output_handler(), respect_handler_level=False)
+    _listener.start()
+
+
+def configure_logging():
+    """Attach the queue handler to the ``aura`` logger and start the writer thread (idempotent)"""
+    global _handler
+    with _lock:
+        if _handler is not None:
+            if _listener is None:
+                # Restarted after shutdown_logging (e.g. a second lifespan in tests)
+                _start_listener()
+            return
+        _handler = _QueueHandler(None)
+        _handler.addFilter(_ContextFilter(LOG_SAMPLE_EVERY))
+        logger = logging.getLogger(_ROOT_LOGGER)
+        logger.setLevel(LOG_LEVEL)
+        logger.addHandler(_handler)
+        logger.propagate = False
+        _start_listener()
+
+
+def shutdown_logging():
+    """Write out every queued record and stop the writer thread"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def logging_stats() -> Dict:
+    return {
+        "queued": _handler.queue.qsize() if _handler is not None else 0,
+        "dropped": _QueueHandler.dropped,
+    }
+
+
+def _restart_listener_after_fork():
+    # The writer thread does not exist in a forked child; start a new one on a fresh queue
+    global _listener
+    if _handler is not None and _listener is not None:
+        _listener = None
+        _start_listener()
+
+
+if hasattr(os, "register_at_fork"):
+    # Pre-fork servers (serve.py) fork workers after logging was configured
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
+
+
+class RequestIdMiddleware:
+    """
+    ASGI middleware that gives every HTTP request a correlation ID: the
+    client's X-Request-ID if it sent a usable one, otherwise a new one. The
+    ID is stamped on every log record of the request and echoed in the
+    response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                candidate = value.decode("latin-1").strip()
+                if 0 < len(candidate) <= 128 and candidate.isprintable():
+                    request_id = candidate
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = _request_id.set(request_id)
+        header = (REQUEST_ID_HEADER.lower().encode(), request_id.encode("latin-1", errors="replace"))
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [header]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            _request_id.reset(token)
@@ -13,6 +13,7 @@ export interface MedicineScanResponse {
   category?: string;
   uses?: string;
   extracted_text?: string;
+  scan_id?: string; // set when OCR was skipped; text via /api/v1/medicine/scan/{scan_id}/text
   method?: string;
   ayurvedic_remedies?: AyurvedicRemedy[];
   error?: string;